@@ -0,0 +1,134 @@
+"""
+K线引擎性能对比
+
+合成一天的tick数据，分别用jitclass版`BarManager`与数组版`MinuteBarManager`/`DayBarManager`转换，
+比较速度并检查输出是否一致。多周期`MultiBarManager`再比较单线程与分片并行。
+1分钟转5分钟(`min_m5`/`min_array`)与信号记录(`signals`/`signals_array`)同样对比
+
+python benchmarks/bench_bars.py --assets 1000 --shards 8
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
+
+from qmt_quote.bars import tick_minute, tick_day, min_m5, min_array, signals, signals_array
+from qmt_quote.bars.labels import get_label_stock_1m, get_label_stock_5m
+from qmt_quote.bars.tick_array import MinuteBarManager, DayBarManager, MultiBarManager
+from qmt_quote.dtypes import DTYPE_STOCK_1m, DTYPE_SIGNAL_1t, DTYPE_SIGNAL_1m
+from qmt_quote.synthetic import generate_ticks
+
+
+def run(cls, ticks: np.ndarray, capacity: int, batch: int, is_day: bool):
+    arr1 = np.zeros(capacity, dtype=DTYPE_STOCK_1m)
+    arr2 = np.zeros(5, dtype=np.uint64)
+    bm = cls(arr1, arr2)
+    # 预热，排除numba编译时间
+    if is_day:
+        bm.extend(ticks[:1], 3600 * 8)
+    else:
+        bm.extend(ticks[:1], get_label_stock_1m, 3600 * 8)
+    bm.reset()
+
+    t1 = time.perf_counter()
+    for i in range(0, len(ticks), batch):
+        if is_day:
+            bm.extend(ticks[i:i + batch], 3600 * 8)
+        else:
+            bm.extend(ticks[i:i + batch], get_label_stock_1m, 3600 * 8)
+    t2 = time.perf_counter()
+    return t2 - t1, arr1[:int(arr2[1])]
+
+
+def run_bars(make, data: np.ndarray, dtype: np.dtype, batch: int, get_label):
+    """短周期K线或信号，按批转换"""
+    arr1 = np.zeros(len(data), dtype=dtype)
+    arr2 = np.zeros(5, dtype=np.uint64)
+    bm = make(arr1, arr2)
+    # 预热，排除numba编译时间
+    bm.extend(data[:1], get_label, 3600 * 8)
+    bm.reset()
+
+    t1 = time.perf_counter()
+    for i in range(0, len(data), batch):
+        bm.extend(data[i:i + batch], get_label, 3600 * 8)
+    t2 = time.perf_counter()
+    return t2 - t1, arr1[:int(arr2[1])]
+
+
+def make_signals(ticks: np.ndarray, n_strategies: int = 3) -> np.ndarray:
+    """每条tick产生一条信号，策略ID轮流取"""
+    sig = np.zeros(len(ticks), dtype=DTYPE_SIGNAL_1t)
+    sig['stock_code'] = ticks['stock_code']
+    sig['time'] = ticks['time']
+    sig['strategy_id'] = np.arange(len(ticks)) % n_strategies
+    sig['float32'] = ticks['lastPrice']
+    sig['int32'] = ticks['volume'] % 1000
+    sig['boolean'] = ticks['lastPrice'] > ticks['lastClose']
+    return sig
+
+
+def run_multi(ticks: np.ndarray, capacity: int, batch: int, n_shards: int, bar_sizes=(86400, 300, 60)):
+    arr1s = [np.zeros(capacity, dtype=DTYPE_STOCK_1m) for _ in bar_sizes]
+    arr2s = [np.zeros(5, dtype=np.uint64) for _ in bar_sizes]
+    bm = MultiBarManager(arr1s, arr2s, bar_sizes)
+    # 预热，排除numba编译时间
+    bm.extend(ticks[:1], 3600 * 8, n_shards)
+    bm.reset()
+
+    t1 = time.perf_counter()
+    for i in range(0, len(ticks), batch):
+        bm.extend(ticks[i:i + batch], 3600 * 8, n_shards)
+    t2 = time.perf_counter()
+    return t2 - t1, [a[:int(b[1])] for a, b in zip(arr1s, arr2s)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=1000, help="股票数量")
+    parser.add_argument("--interval", type=int, default=3, help="推送间隔，秒")
+    parser.add_argument("--shards", type=int, default=os.cpu_count(), help="并行分片数量")
+    args = parser.parse_args()
+
+    ticks = generate_ticks(args.assets, interval=args.interval)
+    batch = int(60 / args.interval * args.assets)  # 1分钟的tick数量
+    capacity = args.assets * 250
+    print(f"ticks: {len(ticks)}, batch: {batch}")
+
+    bars_1m = None
+    for name, old, new, is_day in [
+        ("1m", tick_minute.BarManager, MinuteBarManager, False),
+        ("1d", tick_day.BarManager, DayBarManager, True),
+    ]:
+        t_old, out_old = run(old, ticks, capacity, batch, is_day)
+        t_new, out_new = run(new, ticks, capacity, batch, is_day)
+        same = len(out_old) == len(out_new) and bool((out_old == out_new).all())
+        print(f"{name} jitclass: {t_old:8.3f}s {len(ticks) / t_old:12,.0f} rows/s")
+        print(f"{name} array:    {t_new:8.3f}s {len(ticks) / t_new:12,.0f} rows/s  x{t_old / t_new:.1f} same={same}")
+        if not is_day:
+            bars_1m = out_old.copy()
+
+    sig = make_signals(ticks)
+    for name, old, new, data, dtype, get_label in [
+        ("5m<1m", lambda a, b: min_m5.BarManager(a, b, True), lambda a, b: min_array.BarManager(a, b, True),
+         bars_1m, DTYPE_STOCK_1m, get_label_stock_5m),
+        ("signal", signals.BarManager, signals_array.BarManager, sig, DTYPE_SIGNAL_1m, get_label_stock_1m),
+    ]:
+        # 1分钟K线每分钟一批
+        n = batch if name == "signal" else args.assets
+        t_old, out_old = run_bars(old, data, dtype, n, get_label)
+        t_new, out_new = run_bars(new, data, dtype, n, get_label)
+        same = len(out_old) == len(out_new) and bool((out_old == out_new).all())
+        print(f"{name} jitclass: {t_old:8.3f}s {len(data) / t_old:12,.0f} rows/s")
+        print(f"{name} array:    {t_new:8.3f}s {len(data) / t_new:12,.0f} rows/s  x{t_old / t_new:.1f} same={same}")
+
+    t_old, out_old = run_multi(ticks, capacity, batch, 0)
+    t_new, out_new = run_multi(ticks, capacity, batch, args.shards)
+    same = all(len(a) == len(b) and bool((a == b).all()) for a, b in zip(out_old, out_new))
+    print(f"1d+5m+1m serial:   {t_old:8.3f}s {len(ticks) / t_old:12,.0f} rows/s")
+    print(f"1d+5m+1m shards={args.shards}: {t_new:8.3f}s {len(ticks) / t_new:12,.0f} rows/s  x{t_old / t_new:.1f} same={same}")
@@ -0,0 +1,328 @@
+"""
+热点路径基准测试
+
+合成行情，规模按`config.py`中的`TOTAL_ASSET`/`TICKS_PER_MINUTE`缩放，逐项测速度(rows/s)和峰值内存，
+结果保存到`benchmarks/results/`，并与上一次相同参数的结果对比，方便发现性能回退
+
+1. 每项先运行一次预热(numba编译)，再取`--repeat`次中最快的一次
+2. 准备数据的时间不计入
+3. 峰值内存为tracemalloc统计的Python/numpy分配，numba内部分配不在其中
+4. 依赖xtquant的项目(如send_orders_4)在没有QMT的环境下跳过。运行出错的项目记录错误后继续，
+   全部结束后以非0退出，不会把没测到的热点当成通过
+
+python benchmarks/bench_suite.py --scale 0.1 --minutes 10
+python benchmarks/bench_suite.py --only bars_1m,bars_1d
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
+
+from examples.config import TOTAL_ASSET, TICKS_PER_MINUTE
+from qmt_quote.bars import tick_minute, tick_day, min_m5
+from qmt_quote.bars.agg import ticks_to_minute
+from qmt_quote.bars.labels import get_label_stock_1m, get_label_stock_5m
+from qmt_quote.dtypes import DTYPE_STOCK_1t, DTYPE_STOCK_1m
+from qmt_quote.enums import InstrumentType
+from qmt_quote.fake_xtdata import to_push
+from qmt_quote.ingest import TickEncoder, build_type_map
+from qmt_quote.synthetic import iter_ticks, generate_ticks
+from qmt_quote.utils import ticks_to_dataframe
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# 名字 -> 准备函数。准备函数返回(行数, 只运行一次的函数的工厂)
+CASES: Dict[str, Callable] = {}
+
+
+def case(name: str):
+    def decorator(func):
+        CASES[name] = func
+        return func
+
+    return decorator
+
+
+class Data:
+    """各项共用的输入，按需生成"""
+
+    def __init__(self, n_assets: int, minutes: int, interval: int = 3):
+        self.n_assets = n_assets
+        self.minutes = minutes
+        self.interval = interval
+        self._cache = {}
+
+    def _get(self, key, func):
+        if key not in self._cache:
+            self._cache[key] = func()
+        return self._cache[key]
+
+    @property
+    def pushes(self) -> List[np.ndarray]:
+        """前minutes分钟的推送，每次为所有股票"""
+        n = self.minutes * 60 // self.interval + 1
+        return self._get("pushes", lambda: [a for a, _ in zip(iter_ticks(self.n_assets, interval=self.interval),
+                                                                range(n))])
+
+    @property
+    def ticks(self) -> np.ndarray:
+        return self._get("ticks", lambda: np.concatenate(self.pushes))
+
+    @property
+    def dicts(self) -> List[dict]:
+        """推送还原成全推的嵌套字典"""
+        return self._get("dicts", lambda: [to_push(a) for a in self.pushes])
+
+    @property
+    def bars_1m(self) -> np.ndarray:
+        """全天1分钟K线，tick间隔放大到30秒，只为生成K线"""
+
+        def func():
+            arr1 = np.zeros(self.n_assets * 300, dtype=DTYPE_STOCK_1m)
+            arr2 = np.zeros(5, dtype=np.uint64)
+            bm = tick_minute.BarManager(arr1, arr2)
+            bm.extend(generate_ticks(self.n_assets, interval=30), get_label_stock_1m, 3600 * 8)
+            return arr1[:int(arr2[1])].copy()
+
+        return self._get("bars_1m", func)
+
+
+@case("ingest_dataframe")
+def _(data: Data):
+    """原来的接收方式：ticks_to_dataframe后to_records再append"""
+    from npyt import NPYT
+    dicts = data.dicts
+    columns = list(DTYPE_STOCK_1t.names)[1:]
+    tmp = tempfile.mkdtemp()
+
+    def make():
+        d1t = NPYT(Path(tmp) / "d1t.npy", dtype=DTYPE_STOCK_1t).save(capacity=len(data.ticks)).load(mmap_mode="r+")
+        d1t.clear()
+
+        def run():
+            for i, d in enumerate(dicts):
+                df = ticks_to_dataframe(d, now=i, index_name='stock_code', level=5, type=InstrumentType.Stock)
+                d1t.append(df[columns].to_records(index=True))
+
+        return run
+
+    return len(data.ticks), make
+
+
+@case("ingest_encoder")
+def _(data: Data):
+    """TickEncoder编码后append"""
+    from npyt import NPYT
+    dicts = data.dicts
+    types = build_type_map({InstrumentType.Stock: list(dicts[0].keys())})
+    tmp = tempfile.mkdtemp()
+
+    def make():
+        d1t = NPYT(Path(tmp) / "d1t.npy", dtype=DTYPE_STOCK_1t).save(capacity=len(data.ticks)).load(mmap_mode="r+")
+        d1t.clear()
+        encoder = TickEncoder(DTYPE_STOCK_1t, capacity=data.n_assets, level=5)
+
+        def run():
+            for i, d in enumerate(dicts):
+                d1t.append(encoder.encode_universe(d, now=i, types=types))
+
+        return run
+
+    return len(data.ticks), make
+
+
+def _batches(arr: np.ndarray, n_assets: int) -> List[np.ndarray]:
+    """按实盘的读取方式切成一分钟一批"""
+    batch = max(int(TICKS_PER_MINUTE / TOTAL_ASSET * n_assets), 1)
+    return [arr[i:i + batch] for i in range(0, len(arr), batch)]
+
+
+@case("bars_1m")
+def _(data: Data):
+    """tick_minute.BarManager.extend"""
+    batches = _batches(data.ticks, data.n_assets)
+
+    def make():
+        bm = tick_minute.BarManager(np.zeros(len(data.ticks), dtype=DTYPE_STOCK_1m), np.zeros(5, dtype=np.uint64))
+        return lambda: [bm.extend(b, get_label_stock_1m, 3600 * 8) for b in batches]
+
+    return len(data.ticks), make
+
+
+@case("bars_1d")
+def _(data: Data):
+    """tick_day.BarManager.extend"""
+    batches = _batches(data.ticks, data.n_assets)
+
+    def make():
+        bm = tick_day.BarManager(np.zeros(data.n_assets * 2, dtype=DTYPE_STOCK_1m), np.zeros(5, dtype=np.uint64))
+        return lambda: [bm.extend(b, 3600 * 8) for b in batches]
+
+    return len(data.ticks), make
+
+
+@case("bars_5m_from_1m")
+def _(data: Data):
+    """min_m5.BarManager.extend，1分钟转5分钟"""
+    bars = data.bars_1m
+
+    def make():
+        bm = min_m5.BarManager(np.zeros(len(bars), dtype=DTYPE_STOCK_1m), np.zeros(5, dtype=np.uint64), True)
+        return lambda: bm.extend(bars, get_label_stock_5m, 3600 * 8)
+
+    return len(bars), make
+
+
+@case("agg_ticks_to_minute")
+def _(data: Data):
+    """polars版agg.ticks_to_minute"""
+    df = pl.from_numpy(data.ticks).with_columns(pl.col('time').cast(pl.Datetime('ms')))
+    return len(df), lambda: (lambda: ticks_to_minute(df))
+
+
+@case("last_factor")
+def _(data: Data):
+    """last_factor + factor_calc.main，全量计算一次"""
+    from examples.factor_calc import main as factor_func
+    from qmt_quote.utils_qmt import last_factor
+    bars = data.bars_1m
+    label = int(bars['time'].max())
+    return len(bars), lambda: (lambda: last_factor(bars, factor_func, label, label))
+
+
+@case("send_orders_4")
+def _(data: Data):
+    """下单价格调整"""
+    from qmt_quote.utils_trade import send_orders_4
+    rng = np.random.default_rng(0)
+    last = np.round(rng.uniform(3, 100, data.n_assets), 2)
+    orders = pd.DataFrame({
+        'stock_code': [f"{i:06d}.SZ" for i in range(data.n_assets)],
+        'is_buy': rng.random(data.n_assets) > 0.5,
+        'board_type': 2,
+        'lastPrice': last,
+        'lastClose': last,
+        'bidPrice_1': last - 0.01,
+        'askPrice_1': last + 0.01,
+        'DownStopPrice': np.round(last * 0.9, 2),
+        'UpStopPrice': np.round(last * 1.1, 2),
+    })
+    return len(orders), lambda: (lambda: send_orders_4(orders.copy(), 1, 2, False))
+
+
+@case("objs_to_dataframe")
+def _(data: Data):
+    """委托对象列表转DataFrame，撤单、查持仓时都要用到"""
+    from qmt_quote.xt_records import FakeXtOrder, objs_to_dataframe
+    objs = [FakeXtOrder(stock_code=f"{i:06d}.SZ", order_id=i, order_volume=100, price=10.0)
+            for i in range(data.n_assets)]
+    return len(objs), lambda: (lambda: objs_to_dataframe(objs))
+
+
+def measure(name: str, data: Data, repeat: int) -> dict:
+    """运行一项，返回速度和峰值内存"""
+    try:
+        rows, make = CASES[name](data)
+    except ImportError as e:
+        return {"name": name, "skipped": str(e)}
+    try:
+        # 预热
+        make()()
+    except Exception as e:
+        # 不让一项失败影响其他项，结果中留下记录
+        return {"name": name, "error": f"{type(e).__name__}: {e}"}
+    times = []
+    peak = 0
+    for i in range(repeat):
+        run = make()
+        if i == 0:
+            tracemalloc.start()
+        t1 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t1)
+        if i == 0:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    best = min(times)
+    return {"name": name, "rows": rows, "seconds": best, "rows_per_sec": rows / best, "peak_mb": peak / 2 ** 20}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def previous_result(args: dict) -> Tuple[str, Dict[str, dict]]:
+    """上一次相同参数的结果"""
+    for file in sorted(RESULTS_DIR.glob("*.json"), reverse=True):
+        with open(file, encoding="utf-8") as f:
+            old = json.load(f)
+        if old["args"] == args:
+            return file.name, {r["name"]: r for r in old["results"]}
+    return "", {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=0.1, help="股票数量为TOTAL_ASSET的多少倍")
+    parser.add_argument("--minutes", type=int, default=10, help="tick的分钟数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最快")
+    parser.add_argument("--only", type=str, default="", help="只运行这些项，逗号分隔")
+    parser.add_argument("--no-save", action="store_true", help="不保存结果")
+    args = parser.parse_args()
+
+    n_assets = max(int(TOTAL_ASSET * args.scale), 1)
+    data = Data(n_assets, args.minutes)
+    names = [n for n in args.only.split(",") if n] or list(CASES)
+    key = {"n_assets": n_assets, "minutes": args.minutes}
+    prev_file, prev = previous_result(key)
+    print(f"assets: {n_assets}, minutes: {args.minutes}, compare with: {prev_file or '-'}")
+
+    results = []
+    for name in names:
+        r = measure(name, data, args.repeat)
+        results.append(r)
+        if "skipped" in r or "error" in r:
+            print(f"{name:20s} {'skipped' if 'skipped' in r else 'error'}: {r.get('skipped') or r.get('error')}")
+            continue
+        old = prev.get(name)
+        diff = f"{r['rows_per_sec'] / old['rows_per_sec'] - 1:+7.1%}" if old and "rows_per_sec" in old else ""
+        print(f"{name:20s} {r['rows']:>10,d} rows {r['seconds']:8.3f}s {r['rows_per_sec']:14,.0f} rows/s "
+              f"{r['peak_mb']:8.1f}MB {diff}")
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        commit = git_commit()
+        out = {
+            "commit": commit,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "versions": {m.__name__: m.__version__ for m in (np, pl, pd)},
+            "args": key,
+            "results": results,
+        }
+        file = RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}_{commit}.json"
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2, ensure_ascii=False)
+        print(f"saved to {file}")
+
+    errors = [r["name"] for r in results if "error" in r]
+    if errors:
+        sys.exit(f"failed: {', '.join(errors)}")
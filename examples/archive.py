@@ -10,6 +10,7 @@ sys.path.insert(0, str(Path(__file__).parent))  # 当前目录
 sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
 
 from config import FILE_d1t, BACKUP_DIR
+from qmt_quote.tick_archive import write_archive
 from qmt_quote.utils import generate_code
 
 if __name__ == "__main__":
@@ -25,8 +26,12 @@ if __name__ == "__main__":
         if code1 == code2:
             path = Path(BACKUP_DIR) / datetime.now().strftime("%Y%m%d")
             d1t = NPYT(FILE_d1t).load(mmap_mode="r")
+            # 压缩归档，按股票、时间排序，体积约为原文件的几分之一。subscribe_minute.do可直接回放该目录
+            # 需要原始文件时改用 d1t.backup(path, resize=True)
+            n = write_archive(d1t.data(), path / "d1t")
+            logger.info("归档 {} 行到 {}，共 {} 个文件", d1t.end(), path / "d1t", n)
+            # 释放内存盘空间
             if d1t.resize():
-                d1t.backup(path)
                 break
             else:
                 logger.error("归档失败!!!请关闭其他占用内存映射文件的程序后重试 {}", FILE_d1t)
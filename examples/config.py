@@ -25,6 +25,8 @@ HISTORY_STOCK_5m = r"D:\qmt_data\stock_5m.parquet"
 # TODO：行数，一定每天接收最大数据量上再扩充一些，防止溢出。溢出时会直接崩溃退出
 # 5000多只股票,500多个指数
 TOTAL_ASSET = 7000
+# 是否同时记录基金。1000多只，打开时TOTAL_ASSET要相应扩大
+RECORD_FUND = False
 
 # 1分钟数据量。股票3秒更新一次
 TICKS_PER_MINUTE = int(60 / 3 * TOTAL_ASSET)
@@ -33,22 +35,61 @@ BARS_PER_MINUTE = TOTAL_ASSET  # 1分钟bar数量
 BARS_PER_DAY = TOTAL_ASSET * 60 * 4
 
 # 数据长度
-# 注意：除了tick数据，其他数据转换都是numba实现的，没有边界检查，超范围会崩溃
+# 注意：除了tick数据，其他数据转换都是numba实现的。写入前会检查空间，不够时报错退出
 TOTAL_1t = TICKS_PER_DAY * 1  # 1天
 TOTAL_1m = BARS_PER_DAY * 10  # 1分钟10天
 TOTAL_5m = BARS_PER_DAY // 5 * 10  # 5分钟*10天
 TOTAL_1d = TOTAL_ASSET * 240  # 日线240天
 
+# 启动时(盘前)剩余空间放不下一天时，丢弃最早的整天数据，文件大小不变。整体前移要复制整个文件，盘中不做。
+# False时不丢弃，空间不够直接报错退出
+ROLLING = False
+
 # TODO: 文件名，根据实际情况修改为自己的文件名。可放到内存盘
 # 数据
 FILE_d1t = r"M:\d1t.npy"
 FILE_d1m = r"M:\d1m.npy"
 FILE_d5m = r"M:\d5m.npy"
 FILE_d1d = r"M:\d1d.npy"
+# 列式K线，与d1m/d5m/d1d并存，读取时零拷贝转polars。不需要时设为False
+COLUMNAR = False
+FILE_c1m = r"M:\c1m"
+FILE_c5m = r"M:\c5m"
+FILE_c1d = r"M:\c1d"
+# 行号索引，按时间段、按股票取数时不必猜tail的行数
+FILE_i1t = r"M:\i1t"
+FILE_i1m = r"M:\i1m"
+FILE_i5m = r"M:\i5m"
+FILE_i1d = r"M:\i1d"
+# 最新快照，每只股票一行，下单前直接取
+FILE_snapshot = r"M:\snapshot"
+# 复权因子缓存。prepare_mmap时由历史日线生成
+FILE_factor = r"M:\factor.npy"
+# 因子增量计算，公式见factor_incremental.py。公式不便写成增量版时设为False，每分钟全量计算factor_calc.py
+FACTOR_INCREMENTAL = True
+# K线状态检查点。subscribe_minute.py盘中重启时从这里继续，不必从头重放tick
+FILE_ckpt = r"M:\bars.ckpt.npz"
+CHECKPOINT_INTERVAL = 60  # 保存间隔，秒
+# 延时记录，每个进程一个文件。examples/latency_report.py按分钟统计各阶段耗时
+FILE_latency = r"M:\latency"
+# 代码表。使用整数编号格式(DTYPE_STOCK_1t_ID等)时才用到，与数据文件一起清空
+FILE_symbols = r"M:\symbols.npy"
 
 # 备份目录
 BACKUP_DIR = r"D:\backup"
 
+# 盘前参考数据(涨跌停价、板块等)，每天一个文件。不要放在每天清空的内存盘中
+REF_DIR = r"D:\ref"
+# TODO 早于此时刻(HHMM)生成的参考数据可能还是昨天的涨跌停价，视为过期。按QMT更新合约详情的时间设置
+REF_BUILD_AFTER = "0900"
+# 强制重新生成参考数据。发现涨跌停价不对时改为True重启
+REF_FORCE_REBUILD = False
+
+# 行情源。qmt为xtquant.xtdata；fake为本地回放，没有QMT时压测subscribe_tick.py
+QUOTE_SOURCE = "qmt"
+# fake的参数，见FakeXtData。path为None时用合成行情，speed为0时不等待
+FAKE_QUOTE = dict(path=None, speed=1.0, n_assets=5000)
+
 # =====交易设置======
 # 信号
 FILE_s1t = r"M:\s1t.npy"  # 顺序记录插入的信号
@@ -58,3 +99,13 @@ FILE_s1d = r"M:\s1d.npy"  # 日频信号，用与下单
 USERDATA_DIR = r"D:\ProgramFiles\国金QMT交易端模拟\userdata_mini"
 # TODO: 交易账号    
 ACCOUNT = "55005362"
+
+# 下单、撤单调度，见OrderDispatcher
+# TODO 速率按券商的流控规则设置。同一委托撤单间隔不少于2秒，连续失败3次放弃
+ORDER_DISPATCH = dict(order_rate=10, order_burst=10, cancel_rate=5, cancel_burst=5, n_workers=2,
+                      max_retry=2, backoff=0.5, cancel_interval=2.0, max_cancel_fail=3,
+                      response_timeout=10.0, keep_finished=300.0,
+                      # 只重试流控等暂时性错误，错误号按券商填写
+                      retry_error_ids=(), retry_keywords=("流控", "频繁", "繁忙", "超时"))
+# 本地交易状态与柜台全量对账的间隔，秒
+RECONCILE_INTERVAL = 60
@@ -123,6 +123,7 @@ def main(df: DataFrame) -> DataFrame:
     df = df.select(~cs.starts_with("_"))
 
     # shrink
-    df = df.select(cs.all().shrink_dtype())
+    # polars 2.0起表达式没有shrink_dtype，逐列调用Series.shrink_dtype
+    df = pl.DataFrame([col.shrink_dtype() for col in df.get_columns()])
 
     return df
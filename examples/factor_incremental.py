@@ -0,0 +1,39 @@
+"""
+factor_calc.py的增量版，配合`IncrementalFactor`使用
+
+时序指标直接在复权收盘价窗口上计算，只算当前K线，横截面指标再交给polars。
+修改factor_codegen.py中的公式后，需要同步修改这里，并确认window足够长
+"""
+import numpy as np
+import polars as pl
+from polars_ta.wq import cs_rank
+
+from qmt_quote.incremental import ts_mean, ts_returns
+
+# 窗口长度，含当前K线。MA10需要10根，ts_returns(CLOSE, 5)需要6根
+WINDOW = 10
+
+
+def main(df: pl.DataFrame, CLOSE: np.ndarray) -> pl.DataFrame:
+    """
+
+    Parameters
+    ----------
+    df: pl.DataFrame
+        当前K线，已含factor1/factor2/CLOSE
+    CLOSE: np.ndarray
+        复权收盘价窗口，(股票数, WINDOW)
+
+    """
+    df = df.with_columns(
+        pl.Series('MA5', ts_mean(CLOSE, 5), nan_to_null=True),
+        pl.Series('MA10', ts_mean(CLOSE, 10), nan_to_null=True),
+        pl.Series('A', ts_returns(CLOSE, 5), nan_to_null=True),
+    )
+    df = df.with_columns(
+        B=cs_rank(-pl.col('A'), False),
+    )
+    df = df.with_columns(
+        OUT=pl.col('B') <= 5,
+    )
+    return df
@@ -0,0 +1,35 @@
+"""
+延时统计
+
+读取`subscribe_tick.py`/`subscribe_minute.py`/`strategy_runner.py`记录的各阶段耗时，按分钟统计p50/p99/max，单位ms
+
+Receive: 交易所时间到收到推送，QMT的延时
+Ingest: 编码并写入d1t
+Bars: tick更新K线
+Factor: 计算因子
+Signal: 写入信号
+Trigger: 分钟切换到信号写完
+
+"""
+import sys
+from pathlib import Path
+
+import polars as pl
+
+# 添加当前目录和上一级目录到sys.path
+sys.path.insert(0, str(Path(__file__).parent))  # 当前目录
+sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
+
+from examples.config import FILE_latency
+from qmt_quote.latency import load_latency, latency_report
+
+pl.Config.set_tbl_rows(100)
+pl.Config.set_tbl_cols(20)
+
+if __name__ == "__main__":
+    df = load_latency(FILE_latency)
+    # TODO 重点关注开盘和午后开盘
+    report = latency_report(df, every="1m")
+    print(report.filter(pl.col('time').dt.strftime("%H:%M").is_in(["09:25", "09:30", "09:31", "13:00", "13:01"])))
+    # 全天各阶段汇总
+    print(latency_report(df, every="1d"))
@@ -0,0 +1,77 @@
+"""
+多天回放，不需要QMT
+
+按日期读取`archive.py`归档的tick，每分钟一批更新K线，再调用`strategy_runner.main`，
+与实盘中`subscribe_minute.py`+`strategy_runner.py`两个进程的过程相同。用于回归测试和测速
+
+1. 会覆盖内存映射文件，不要与实盘同时运行
+2. 历史K线取起始日期之前的，见`prepare_mmap`
+3. 同样的输入每次输出相同，可保存信号对比改动前后的差异
+
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import polars as pl
+from loguru import logger
+
+# 添加当前目录和上一级目录到sys.path
+sys.path.insert(0, str(Path(__file__).parent))  # 当前目录
+sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
+
+from examples.config import BACKUP_DIR
+from examples.subscribe_minute import prepare_mmap, new_bar_manager, link_bar_manager, update_bars
+from qmt_quote.bars.signals import BarManager as BarManagerS
+from qmt_quote.replay import TickReplay, find_archives
+
+# TODO 回放日期范围，含两端
+START_DATE = "20250224"
+END_DATE = "20250228"
+# 0为尽快回放，1为实际速度，60为60倍速
+SPEED = 0
+# 只更新K线时设为False，用于测K线引擎的速度
+RUN_STRATEGY = True
+
+if __name__ == "__main__":
+    files = find_archives(BACKUP_DIR, START_DATE, END_DATE)
+    if len(files) == 0:
+        logger.error("{} 中没有 {}~{} 的归档", BACKUP_DIR, START_DATE, END_DATE)
+        sys.exit(1)
+    logger.info("回放 {} 天：{}", len(files), [str(d) for d, _ in files])
+
+    # 历史K线取第一天之前的
+    prepare_mmap(end_date=pl.lit(files[0][0], dtype=pl.Datetime(time_unit='ms', time_zone='Asia/Shanghai')))
+    bm = new_bar_manager()
+    link_bar_manager(bm)
+
+    # 复权因子由prepare_mmap生成，之后才能导入
+    import examples.strategy_runner as runner  # noqa
+
+    runner.bm_s1d = BarManagerS(runner.s1d._a, runner.s1d._t)
+
+    t0 = time.perf_counter()
+    t_bars = 0.0
+    n_ticks = 0
+    n_calls = 0
+    replay = TickReplay(files, speed=SPEED)
+    last_day = None
+    for day, ticks, curr_time in replay:
+        if day != last_day:
+            # 日频信号一天一条，s1d只按一天的容量申请，换日时从头开始，否则第二天就写满了
+            last_day = day
+            runner.s1d.clear()
+            runner.bm_s1d.reset()
+        t1 = time.perf_counter()
+        # 一分钟的tick较多，分片并行
+        update_bars(bm, ticks, n_shards=os.cpu_count())
+        t_bars += time.perf_counter() - t1
+        n_ticks += len(ticks)
+        if RUN_STRATEGY:
+            runner.main(curr_time)
+            n_calls += 1
+
+    total = time.perf_counter() - t0
+    logger.info("tick {} 条，策略调用 {} 次，总耗时 {:.2f}s，其中K线 {:.2f}s({:.0f}条/秒)",
+                n_ticks, n_calls, total, t_bars, n_ticks / max(t_bars, 1e-9))
@@ -2,6 +2,7 @@ import sys
 import time
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 import pandas as pd
@@ -12,21 +13,36 @@ from npyt import NPYT
 sys.path.insert(0, str(Path(__file__).parent))  # 当前目录
 sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
 
-from examples.config import (FILE_d1m, FILE_d1d, FILE_d5m, FILE_s1t, FILE_s1d, BARS_PER_DAY, TOTAL_ASSET)
+from examples.config import (FILE_d1m, FILE_d1d, FILE_d5m, FILE_s1t, FILE_s1d, BARS_PER_DAY, TOTAL_ASSET,
+                             FILE_factor, FILE_latency, FACTOR_INCREMENTAL,
+                             COLUMNAR, FILE_c1m, FILE_c5m, FILE_c1d, FILE_i1m, FILE_i5m, FILE_i1d)
 from qmt_quote.bars.labels import get_label_stock_1d, get_label
 from qmt_quote.bars.signals import BarManager as BarManagerS
+from qmt_quote.columnar import ColumnStore
 from qmt_quote.dtypes import DTYPE_SIGNAL_1t, DTYPE_SIGNAL_1m
+from qmt_quote.enums import LatencyStage
+from qmt_quote.factor_cache import FactorCache
+from qmt_quote.incremental import IncrementalFactor
+from qmt_quote.latency import LatencyTracer
+from qmt_quote.notify import Waiter
+from qmt_quote.rolling import make_room
+from qmt_quote.row_index import RowIndex
 from qmt_quote.utils_qmt import last_factor
 
 # TODO 这里简单模拟了分钟因子和日线因子
 from examples.factor_calc import main as factor_func_1m  # noqa
 from examples.factor_calc import main as factor_func_5m  # noqa
 from examples.factor_calc import main as factor_func_1d  # noqa
+from examples.factor_incremental import main as factor_inc, WINDOW  # noqa
 
 # K线
 d1m = NPYT(FILE_d1m).load(mmap_mode="r")
 d5m = NPYT(FILE_d5m).load(mmap_mode="r")
 d1d = NPYT(FILE_d1d).load(mmap_mode="r")
+# 列式副本与行号索引，由subscribe_minute.py维护。开启COLUMNAR时全量计算零拷贝读取，不再行转列
+if COLUMNAR:
+    c1m, c5m, c1d = [ColumnStore(f).load(mmap_mode="r") for f in (FILE_c1m, FILE_c5m, FILE_c1d)]
+    i1m, i5m, i1d = [RowIndex(f).load(mmap_mode="r") for f in (FILE_i1m, FILE_i5m, FILE_i1d)]
 
 # TODO 策略数量，本来只用到了3个策略，但为了防止溢出，申请了4份空间
 STRATEGY_COUNT = 4
@@ -38,6 +54,8 @@ s1d = NPYT(FILE_s1d, dtype=DTYPE_SIGNAL_1m).save(capacity=TOTAL_ASSET * STRATEGY
 # 重置信号位置
 s1t.clear()
 s1d.clear()
+# 各阶段延时
+tracer = LatencyTracer(FILE_latency, "strategy").save().load(mmap_mode="r+")
 
 pd.set_option('display.width', 1000)
 pd.set_option('display.max_columns', None)
@@ -47,6 +65,23 @@ pd.set_option('display.max_colwidth', None)
 # 窗口长度为何要+1，因为最新的K线还在变化中，为了防止信号闪烁，用户在计算前可能会剔除最后一根K线
 TAIL_N = 120000
 
+# 复权因子缓存，由subscribe_minute.py开盘前生成。全量计算时查表，不再每分钟排序。只在全量计算时才加载
+factors: Optional[FactorCache] = None
+
+
+def get_factors() -> FactorCache:
+    """第一次用到时才加载复权因子缓存"""
+    global factors
+    if factors is None:
+        factors = FactorCache().load(FILE_factor)
+    return factors
+
+
+# 增量计算。每只股票只保留WINDOW根K线的状态，每分钟只推入新完成的K线
+inc_1m = IncrementalFactor(factor_inc, WINDOW)
+inc_5m = IncrementalFactor(factor_inc, WINDOW)
+inc_1d = IncrementalFactor(factor_inc, WINDOW)
+
 
 def to_array(df: pl.DataFrame, strategy_id: int = 0) -> np.ndarray:
     arr = df.select(
@@ -81,12 +116,29 @@ def main(curr_time: int) -> None:
     label_5m *= 1000
     label_1d *= 1000
 
-    t1 = time.perf_counter()
+    t1 = time.time_ns()
     # TODO 计算因子
-    df1m = last_factor(d1m.tail(TAIL_N), factor_func_1m, label_1m, label_1m)  # 1分钟线
-    df5m = last_factor(d5m.tail(TAIL_N), factor_func_5m, label_5m, label_5m)  # 5分钟线
-    df1d = last_factor(d1d.tail(TAIL_N), factor_func_1d, label_1d, label_1d)  # 日线，要求当天K线是动态变化的
-    t2 = time.perf_counter()
+    if FACTOR_INCREMENTAL:
+        df1m = inc_1m.last_factor(d1m.data(), label_1m)  # 1分钟线
+        df5m = inc_5m.last_factor(d5m.data(), label_5m)  # 5分钟线
+        df1d = inc_1d.last_factor(d1d.data(), label_1d)  # 日线，要求当天K线是动态变化的
+    else:
+        # 全量计算。公式不便写成增量版时使用，每次都重算TAIL_N行
+        factors = get_factors()
+        factors.update(d1d.data())  # 补上当天的复权因子
+        if COLUMNAR:
+            # 由时间索引得到label之前的最后TAIL_N行，零拷贝
+            b1m = c1m.between(i1m, 0, label_1m + 1, TAIL_N)
+            b5m = c5m.between(i5m, 0, label_5m + 1, TAIL_N)
+            b1d = c1d.between(i1d, 0, label_1d + 1, TAIL_N)
+        else:
+            b1m, b5m, b1d = d1m.tail(TAIL_N), d5m.tail(TAIL_N), d1d.tail(TAIL_N)
+        df1m = last_factor(b1m, factor_func_1m, label_1m, label_1m, factors=factors)  # 1分钟线
+        df5m = last_factor(b5m, factor_func_5m, label_5m, label_5m, factors=factors)  # 5分钟线
+        df1d = last_factor(b1d, factor_func_1d, label_1d, label_1d, factors=factors)  # 日线
+    t2 = time.time_ns()
+    rows = len(df1m) + len(df5m) + len(df1d)
+    tracer.record(LatencyStage.Factor, t1, t2, rows, int(curr_time * 1000))
 
     # if df1m.is_empty():
     #     print("没有1分钟数据，返回")
@@ -98,27 +150,38 @@ def main(curr_time: int) -> None:
     print(df1d.tail(1))
 
     # 将3个信号增量更新到内存文件映射
-    s1t.append(to_array(df1m, strategy_id=1))
-    s1t.append(to_array(df5m, strategy_id=2))
-    s1t.append(to_array(df1d, strategy_id=3))
+    signals = [to_array(df1m, strategy_id=1), to_array(df5m, strategy_id=2), to_array(df1d, strategy_id=3)]
+    # 空间不够时丢弃已读过的信号
+    if not make_room(s1t, sum(len(a) for a in signals)):
+        raise IndexError(f"s1t is full, capacity={s1t.capacity()}")
+    for a in signals:
+        s1t.append(a)
+    t3 = time.time_ns()
+    tracer.record(LatencyStage.Signal, t2, t3, rows, int(curr_time * 1000))
+    # 分钟切换到信号写完。curr_time之前的tick全部处理完才算数据完整
+    tracer.record(LatencyStage.Trigger, int(curr_time * 1e9), t3, rows, int(curr_time * 1000))
 
     # 内存文件映射读取
     start, end, step = bm_s1d.extend(s1t.read(n=BARS_PER_DAY), get_label_stock_1d, 3600 * 8)
     # 只显示最新的3条
-    print(end, datetime.now(), t2 - t1)
+    print(end, datetime.now(), (t2 - t1) / 1e9)
     print(s1d.tail(3))
 
 
 if __name__ == "__main__":
     bm_s1d = BarManagerS(s1d._a, s1d._t)
+    # subscribe_minute.py更新K线后会通知
+    waiter = Waiter("d1m")
 
     # 实盘运行
     last_time = -1
     while True:
         # 调整成成分钟标签，用户可以考虑设置成10秒等更快频率。注意!!!内存映射文件要扩大几倍
-        curr_time = datetime.now().timestamp() // 60 * 60
+        now = datetime.now().timestamp()
+        curr_time = now // 60 * 60
         if curr_time == last_time:
-            time.sleep(0.5)
+            # 等到下一分钟，或K线有更新。K线更新只是提前醒来再检查一次时间
+            waiter.wait(curr_time + 60 - now)
             continue
         # 正好在分钟切换时才会到这一步
         last_time = curr_time
@@ -26,6 +26,7 @@ import time
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
 import polars as pl
 from loguru import logger
 from npyt import NPYT
@@ -36,18 +37,43 @@ sys.path.insert(0, str(Path(__file__).parent))  # 当前目录
 sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
 
 from examples.config import (FILE_d1d, TOTAL_1d, FILE_d1m, TOTAL_1m, TOTAL_5m, FILE_d5m, FILE_d1t, TICKS_PER_MINUTE,
-                             BARS_PER_DAY, TOTAL_ASSET)
-from qmt_quote.bars.labels import get_label_stock_5m, get_label_stock_1m
-from qmt_quote.bars.tick_day import BarManager as BarManagerD
-from qmt_quote.bars.tick_minute import BarManager as BarManagerM
-from qmt_quote.dtypes import DTYPE_STOCK_1m, DTYPE_STOCK_1t
-from qmt_quote.enums import InstrumentType
+                             BARS_PER_DAY, TOTAL_ASSET, FILE_ckpt, CHECKPOINT_INTERVAL, FILE_factor,
+                             COLUMNAR, FILE_c1m, FILE_c5m, FILE_c1d, FILE_i1m, FILE_i5m, FILE_i1d,
+                             FILE_snapshot, ROLLING, FILE_latency, REF_DIR, REF_BUILD_AFTER)
+from qmt_quote.bars.tick_array import MultiBarManager
+from qmt_quote.columnar import ColumnStore
+from qmt_quote.dtypes import DTYPE_STOCK_1m
+from qmt_quote.enums import InstrumentType, LatencyStage
+from qmt_quote.factor_cache import FactorCache
+from qmt_quote.latency import LatencyTracer
+from qmt_quote.notify import Notifier, Waiter
+from qmt_quote.ref_data import RefData
+from qmt_quote.replay import open_ticks
+from qmt_quote.rolling import sync_rolled
+from qmt_quote.row_index import RowIndex
+from qmt_quote.snapshot import Snapshot
 from qmt_quote.utils_qmt import load_history_data  # noqa
 
 # 分种级别数据，将历史TICK和实盘TICK拼接成一个实盘分钟级别数据
 d1m = NPYT(FILE_d1m, dtype=DTYPE_STOCK_1m).save(capacity=TOTAL_1m).load(mmap_mode="r+")
 d5m = NPYT(FILE_d5m, dtype=DTYPE_STOCK_1m).save(capacity=TOTAL_5m).load(mmap_mode="r+")
 d1d = NPYT(FILE_d1d, dtype=DTYPE_STOCK_1m).save(capacity=TOTAL_1d).load(mmap_mode="r+")
+# 列式副本，顺序与bm的周期相同：日线、5分钟、1分钟
+columns = [
+    ColumnStore(FILE_c1d).save(DTYPE_STOCK_1m, capacity=TOTAL_1d).load(mmap_mode="r+"),
+    ColumnStore(FILE_c5m).save(DTYPE_STOCK_1m, capacity=TOTAL_5m).load(mmap_mode="r+"),
+    ColumnStore(FILE_c1m).save(DTYPE_STOCK_1m, capacity=TOTAL_1m).load(mmap_mode="r+"),
+] if COLUMNAR else []
+# 行号索引，顺序同上
+indexes = [
+    RowIndex(FILE_i1d).save().load(mmap_mode="r+"),
+    RowIndex(FILE_i5m).save().load(mmap_mode="r+"),
+    RowIndex(FILE_i1m).save().load(mmap_mode="r+"),
+]
+# 最新快照，日线更新时同步写入，下单前直接取
+snapshot = Snapshot(FILE_snapshot).save().load(mmap_mode="r+")
+# 各阶段延时
+tracer = LatencyTracer(FILE_latency, "minute").save().load(mmap_mode="r+")
 
 
 def prepare_mmap(end_date: pl.datetime):
@@ -76,6 +102,13 @@ def prepare_mmap(end_date: pl.datetime):
     d1m.clear().append(his_stk_1m.select(DTYPE_STOCK_1m.names).to_numpy(structured=True))
     d5m.clear().append(his_stk_5m.select(DTYPE_STOCK_1m.names).to_numpy(structured=True))
     d1d.clear().append(his_stk_1d.select(DTYPE_STOCK_1m.names).to_numpy(structured=True))
+    for c, d in zip(columns, [d1d, d5m, d1m]):
+        c.clear().write(d._a, 0, d.end())
+    for i, d in zip(indexes, [d1d, d5m, d1m]):
+        i.clear().update_time(d._a, 0, d.end())
+
+    # 历史复权因子只算一次，盘中查表
+    FactorCache.from_bars(d1d.data()).save(FILE_factor)
 
     logger.info("d1m:{:.4f}, d5m:{:.4f}, d1d:{:.4f}, 注意：0表示空间不够没有插入，0.8以上通常空间不够当天使用，会崩溃",
                 d1m.end() / d1m.capacity(),
@@ -84,15 +117,73 @@ def prepare_mmap(end_date: pl.datetime):
                 )
 
 
-def do(file, is_live=False):
+def is_checkpoint_valid(ckpt: str) -> bool:
+    """检查点是今天生成的才能用。昨天的检查点对应的是昨天的tick文件"""
+    if not os.path.exists(ckpt):
+        return False
+    return datetime.fromtimestamp(os.path.getmtime(ckpt)).date() == datetime.now().date()
+
+
+def new_bar_manager() -> MultiBarManager:
+    """接着已有K线生成新K线
+    多周期一起更新，tick只遍历一次。需要15m/30m/60m时，加上对应的文件和周期(900/1800/3600)即可
+    """
+    return MultiBarManager([d1d._a, d5m._a, d1m._a], [d1d._t, d5m._t, d1m._t], [86400, 300, 60], snapshot=snapshot)
+
+
+def link_bar_manager(bm: MultiBarManager) -> None:
+    """新K线引擎不从检查点恢复时，由已有K线重建最新行索引和快照"""
+    for i, d in zip(indexes, [d1d, d5m, d1m]):
+        # 新K线引擎的编号与之前不同，重新由已有K线找每只股票的最后一根
+        i.clear(time=False).update_latest_rows(bm.symbols.encode(d.data()['stock_code'], dtype=np.int64))
+    # 开盘前快照为昨天日线的最后一根
+    snapshot.clear().update_bars(d1d.data(), bm.symbols.encode(d1d.data()['stock_code'], dtype=np.int64))
+    snapshot.update_limits(load_ref())
+
+
+def load_ref() -> RefData:
+    """盘前参考数据，取涨跌停价。与trade_manual.py共用同一份文件，先启动的生成"""
+
+    def stock_list():
+        from xtquant import xtdata
+        xtdata.download_sector_data()
+        return xtdata.get_stock_list_in_sector("沪深A股")
+
+    return RefData(REF_DIR).get_or_build(stock_list, after=REF_BUILD_AFTER)
+
+
+def maintain_bars(bm: MultiBarManager) -> None:
+    """盘前维护。剩余空间放不下一天时丢弃最早的整天数据，并同步列式副本和行号索引"""
+    rolled = bm.maintain([TOTAL_ASSET, BARS_PER_DAY // 5, BARS_PER_DAY], 3600 * 8)
+    # 不启用列式副本时columns为空，行号索引照样同步
+    sync_rolled(rolled, [d1d, d5m, d1m], indexes, columns)
+    if any(rolled):
+        logger.info("空间不够，丢弃最早的整天数据：{}", rolled)
+
+
+def update_bars(bm: MultiBarManager, a1t: np.ndarray, n_shards: int = 0) -> None:
+    """一批tick更新K线，并同步列式副本和行号索引"""
+    out = bm.extend(a1t, 3600 * 8, n_shards=n_shards)
+    for c, d, (start, end) in zip(columns, [d1d, d5m, d1m], bm.dirty):
+        # 只同步改动过的行
+        c.write(d._a, start, end)
+    for j, (i, d, (last_index, index, _)) in enumerate(zip(indexes, [d1d, d5m, d1m], out)):
+        # 新K线的时间不会再变，只索引新行
+        i.update_time(d._a, last_index, index)
+        i.update_latest(bm.state.valid[j], bm.state.index[j])
+
+
+def do(file, is_live=False, ckpt=None):
     """
 
     Parameters
     ----------
     file : str
-        原始tick数据文件
+        原始tick数据文件，或`write_archive`生成的归档目录
     is_live
         是否是实盘，实盘会等待数据，历史会推出
+    ckpt : str
+        检查点文件。存在时从检查点继续，并定时保存
 
     """
     # 文件不存在，直接返回
@@ -100,23 +191,41 @@ def do(file, is_live=False):
         logger.error("数据文件 {} 不存在，直接返回", file)
         return
 
-    d1t = NPYT(file, dtype=DTYPE_STOCK_1t).load(mmap_mode="r")
+    # 归档目录时逐个文件解压回放
+    d1t = open_ticks(file)
 
-    # 接着昨天数据生成新K线
-    bm_d1m = BarManagerM(d1m._a, d1m._t)
-    bm_d5m = BarManagerM(d5m._a, d5m._t)
-    bm_d1d = BarManagerD(d1d._a, d1d._t)
+    bm = new_bar_manager()
+    if ckpt is not None and os.path.exists(ckpt):
+        # 恢复状态，并跳过已经处理过的tick
+        d1t.seek(bm.load(ckpt))
+        logger.info("从检查点 {} 恢复，tick位置 {}", ckpt, d1t.tell())
+        for i, index in zip(indexes, bm.indices):
+            # 检查点之后的行会重新生成
+            i.truncate(int(index))
+    else:
+        link_bar_manager(bm)
+        if ROLLING:
+            # 新的一天从头开始，还没开盘，可以整体前移
+            maintain_bars(bm)
+            if ckpt is not None and any(bm.rolled):
+                # 行号已前移，立即保存
+                bm.save(ckpt, d1t.tell())
+    last_save = time.time()
+    # 新tick写入时立即唤醒；K线更新后通知strategy_runner.py
+    waiter = Waiter("d1t") if is_live else None
+    notifier = Notifier("d1m")
 
     bar_format = "{desc}: {percentage:5.2f}%|{bar}{r_bar}"
     # 昨天的行情数据放一起
-    pbar = tqdm(total=d1t.capacity(), desc="股票+指数", initial=0, bar_format=bar_format, ncols=100)
+    pbar = tqdm(total=d1t.capacity(), desc="股票+指数", initial=d1t.tell(), bar_format=bar_format, ncols=100)
     while True:
         # tick数据顺序调用，每一条不会重复使用
         a1t = d1t.read(n=TICKS_PER_MINUTE, prefetch=0)
         if len(a1t) == 0:
             # 没有新数据要更新，等等
             if is_live:
-                time.sleep(0.5)
+                # 收不到通知时(如subscribe_tick.py还是旧版)最多等0.5秒
+                waiter.wait(0.5)
                 continue
             else:
                 break
@@ -127,9 +236,15 @@ def do(file, is_live=False):
         # 这里要refresh，否则看起来行情延时很大
         pbar.set_description(f"延时 {now - t:8.3f}s", refresh=True)
 
-        bm_d1d.extend(a1t, 3600 * 8)
-        bm_d5m.extend(a1t, get_label_stock_5m, 3600 * 8)
-        bm_d1m.extend(a1t, get_label_stock_1m, 3600 * 8)
+        # 历史回放一批tick很多，按编号分片多核并行。实盘一批很少，单线程更快
+        t0 = time.time_ns()
+        update_bars(bm, a1t, n_shards=0 if is_live else os.cpu_count())
+        notifier.notify()
+        tracer.record(LatencyStage.Bars, t0, time.time_ns(), len(a1t), int(a1t['time'].max()))
+
+        if ckpt is not None and time.time() - last_save >= CHECKPOINT_INTERVAL:
+            bm.save(ckpt, d1t.tell())
+            last_save = time.time()
 
 
 if __name__ == "__main__":
@@ -138,20 +253,30 @@ if __name__ == "__main__":
     print()
     print("=" * 60)
 
-    # TODO 指定日期之前的数据从parquet中加载写入到内存文件映射
-    # end_date = pl.datetime(2025, 5, 22, time_unit='ms', time_zone='Asia/Shanghai')
-    end_date = pl.lit(datetime.now().date(), dtype=pl.Datetime(time_unit='ms', time_zone='Asia/Shanghai'))
-    # 使用今天之前的数据做历史。如果昨天的数据有问题，可以取更早一天，注意节假日
-    prepare_mmap(end_date=end_date - pl.duration(days=0))
+    if is_checkpoint_valid(FILE_ckpt):
+        # 盘中重启。内存映射文件中已经有历史和今天的K线，只需从检查点继续
+        print("=" * 60)
+        do(FILE_d1t, is_live=True, ckpt=FILE_ckpt)
+    else:
+        if os.path.exists(FILE_ckpt):
+            os.remove(FILE_ckpt)
 
-    # TODO 从指定文件加载tick数据，转换成日线和分钟
-    FILE_d1t_list = [
-        # 历史tick数据。注意不要与prepare_mmap的数据重叠
-        # r"F:\backup\20250521\d1t.npy",
-        # 当日实时tick数据
-        FILE_d1t,
-    ]
+        # TODO 指定日期之前的数据从parquet中加载写入到内存文件映射
+        # end_date = pl.datetime(2025, 5, 22, time_unit='ms', time_zone='Asia/Shanghai')
+        end_date = pl.lit(datetime.now().date(), dtype=pl.Datetime(time_unit='ms', time_zone='Asia/Shanghai'))
+        # 使用今天之前的数据做历史。如果昨天的数据有问题，可以取更早一天，注意节假日
+        prepare_mmap(end_date=end_date - pl.duration(days=0))
 
-    print("=" * 60)
-    for i, file in enumerate(FILE_d1t_list):
-        do(file, is_live=i == len(FILE_d1t_list) - 1)
+        # TODO 从指定文件加载tick数据，转换成日线和分钟
+        FILE_d1t_list = [
+            # 历史tick数据。注意不要与prepare_mmap的数据重叠
+            # r"F:\backup\20250521\d1t.npy",
+            # r"F:\backup\20250521\d1t",  # archive.py生成的归档目录
+            # 当日实时tick数据
+            FILE_d1t,
+        ]
+
+        print("=" * 60)
+        for i, file in enumerate(FILE_d1t_list):
+            is_live = i == len(FILE_d1t_list) - 1
+            do(file, is_live=is_live, ckpt=FILE_ckpt if is_live else None)
@@ -6,22 +6,29 @@
 4. 15点以后再关闭，否则错失中间数据。其实到16点前都有数据推送
 """
 import sys
-from datetime import datetime
+import time
 from pathlib import Path
 
 from npyt import NPYT
-from npyt.format import dtype_to_column_dtypes
 from tqdm import tqdm
-from xtquant import xtdata
 
 # 添加当前目录和上一级目录到sys.path
 sys.path.insert(0, str(Path(__file__).parent))  # 当前目录
 sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
 
-from examples.config import FILE_d1t, TOTAL_1t
+from examples.config import FILE_d1t, TOTAL_1t, TOTAL_ASSET, FILE_i1t, QUOTE_SOURCE, FAKE_QUOTE, FILE_latency, \
+    RECORD_FUND
 from qmt_quote.dtypes import DTYPE_STOCK_1t
-from qmt_quote.enums import InstrumentType
-from qmt_quote.utils import ticks_to_dataframe, generate_code, input_with_timeout
+from qmt_quote.enums import InstrumentType, LatencyStage
+from qmt_quote.ingest import TickEncoder, build_type_map
+from qmt_quote.latency import LatencyTracer
+from qmt_quote.notify import Notifier
+from qmt_quote.quote_source import use_quote_source
+from qmt_quote.row_index import RowIndex
+from qmt_quote.utils import generate_code, input_with_timeout
+
+# 行情源。fake时回放录制的tick或合成行情，不需要QMT
+xtdata = use_quote_source(QUOTE_SOURCE, **FAKE_QUOTE)
 
 # 开盘前需要先更新板块数据，因为会有新股上市
 xtdata.download_sector_data()
@@ -38,36 +45,51 @@ G.沪深指数 = set(G.沪深指数)
 G.沪深基金 = set(G.沪深基金)
 print(f"沪深A股:{len(G.沪深A股)}, 沪深指数:{len(G.沪深指数)}, 沪深基金:{len(G.沪深基金)},")
 
+# 代码到类型的映射，回调中一次遍历完成分类
+# 写入d1t的顺序为推送中的顺序，不再按类型分组。下游按stock_code/type区分，不依赖行的先后
+# TODO 可以替换成日线选股票池，减少股票数后处理速度更快
+sectors = {
+    InstrumentType.Stock: G.沪深A股,
+    InstrumentType.Index: G.沪深指数,
+}
+if RECORD_FUND:
+    sectors[InstrumentType.Fund] = G.沪深基金
+G.types = build_type_map(sectors)
+
 d1t = NPYT(FILE_d1t, dtype=DTYPE_STOCK_1t).save(capacity=TOTAL_1t).load(mmap_mode="r+")
 
-# 索引上的名字，在to_records时会用到,所以这里要剔除
-columns = list(DTYPE_STOCK_1t.names)[1:]
-column_dtypes = dtype_to_column_dtypes(DTYPE_STOCK_1t)
+# 直接编码成结构化数组，不经过pandas
+encoder = TickEncoder(DTYPE_STOCK_1t, capacity=TOTAL_ASSET, level=5,
+                      depths=["askPrice", "bidPrice", "askVol", "bidVol"])
+# 写入后立即唤醒subscribe_minute.py
+notifier = Notifier("d1t")
+# 按分钟取tick时用
+i1t = RowIndex(FILE_i1t).save(capacity_symbols=1).load(mmap_mode="r+")
+# 各阶段延时
+tracer = LatencyTracer(FILE_latency, "tick").save().load(mmap_mode="r+")
 
 
 def func(datas):
     # 获取当前时间转ms
-    now = datetime.now().timestamp()
-    now_ms = int(now * 1000)
+    t0 = time.time_ns()
+    now = t0 / 1e9
+    now_ms = t0 // 1000000
 
     step_ = 0
     # =======================
-    # TODO 这里的set可以替换成日线选股票池，减少股票数后处理速度更快
-    d = {k: v for k, v in datas.items() if k in G.沪深A股}
-    if len(d) > 0:
-        df = ticks_to_dataframe(d, now=now_ms, index_name='stock_code', level=5,
-                                depths=["askPrice", "bidPrice", "askVol", "bidVol"], type=InstrumentType.Stock)
-        remaining = d1t.append(df[columns].to_records(index=True))
-        step_ += len(df) - remaining
-    # =======================
-    d = {k: v for k, v in datas.items() if k in G.沪深指数}
-    if len(d) > 0:
-        df = ticks_to_dataframe(d, now=now_ms, index_name='stock_code', level=5,
-                                depths=["askPrice", "bidPrice", "askVol", "bidVol"], type=InstrumentType.Index)
-        remaining = d1t.append(df[columns].to_records(index=True))
-        step_ += len(df) - remaining
+    arr = encoder.encode_universe(datas, now=now_ms, types=G.types)
+    if len(arr) > 0:
+        end = d1t.end()
+        remaining = d1t.append(arr)
+        step_ += len(arr) - remaining
+        i1t.update_time(d1t._a, end, d1t.end())
+        # 最新tick的交易所时间到收到，编码写入
+        t = int(arr['time'].max())
+        tracer.record(LatencyStage.Receive, t * 1000000, t0, len(arr), t)
+        tracer.record(LatencyStage.Ingest, t0, time.time_ns(), len(arr), t)
     # =======================
     if step_ > 0:
+        notifier.notify()
         t = int(d1t.at(d1t.end() - 1)['time'] / 1000)
         # 这里没有必要refresh这么快
         pbar.set_description(f"延时 {now - t:8.3f}s", refresh=False)
@@ -83,6 +105,8 @@ if __name__ == "__main__":
     code2 = input_with_timeout(f"20秒內输入验证码重置文件指针({code1}/回车忽略)：", timeout=20)
     if code2 == code1:
         d1t.clear()
+        i1t.clear()
+        tracer.clear()
         print("!!!重置文件指针成功!!!")
     print()
     print("开始订阅行情，**输入`:q`退出**")
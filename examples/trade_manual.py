@@ -17,11 +17,17 @@ from xtquant.xttype import StockAccount
 sys.path.insert(0, str(Path(__file__).parent))  # 当前目录
 sys.path.insert(0, str(Path(__file__).parent.parent))  # 上一级目录
 
-from examples.config import FILE_d1d, USERDATA_DIR, ACCOUNT, FILE_s1d
+from examples.config import FILE_d1d, USERDATA_DIR, ACCOUNT, FILE_s1d, FILE_i1d, FILE_snapshot, ORDER_DISPATCH, \
+    RECONCILE_INTERVAL, REF_DIR, REF_BUILD_AFTER, REF_FORCE_REBUILD
 from qmt_quote.enums import SizeType
+from qmt_quote.order_dispatcher import OrderDispatcher
+from qmt_quote.ref_data import RefData
+from qmt_quote.row_index import RowIndex
+from qmt_quote.snapshot import Snapshot
+from qmt_quote.trade_book import TradeBook
 from qmt_quote.trader_callback import MyXtQuantTraderCallback
 from qmt_quote.utils_trade import to_dict, objs_to_dataframe, cancel_orders, before_market_open, send_orders_1, \
-    send_orders_2, send_orders_3, send_orders_4, send_orders_5
+    send_orders_2, send_orders_3, send_orders_4, send_orders_5, snapshot_reprice
 
 pd.set_option('display.width', 1000)
 pd.set_option('display.max_columns', None)
@@ -29,16 +35,23 @@ pd.set_option('display.max_colwidth', None)
 
 # 取行情
 d1d = NPYT(FILE_d1d).load(mmap_mode="r")
+# 每只股票最新日线的行号，由subscribe_minute.py维护
+i1d = RowIndex(FILE_i1d).load(mmap_mode="r")
+# 每只股票最新快照，由subscribe_minute.py维护。有它时不再读d1d
+snapshot = Snapshot(FILE_snapshot).load(mmap_mode="r")
 # 取信号
 s1d = NPYT(FILE_s1d).load(mmap_mode="r")
 
 G = Exception()
-details = before_market_open(G)
+# 当天已生成过且不早于REF_BUILD_AFTER时直接加载，重启不用再逐只查询
+details = before_market_open(G, RefData(REF_DIR), force=REF_FORCE_REBUILD, after=REF_BUILD_AFTER)
 print("获取当天涨跌停价(含ST/退)：\n", details)
 
 if __name__ == "__main__":
     print("demo test")
-    callback = MyXtQuantTraderCallback()
+    # 委托、成交推送维护本地交易状态，下单前不用再查柜台
+    book = TradeBook()
+    callback = MyXtQuantTraderCallback(book=book)
     xt_trader = XtQuantTrader(USERDATA_DIR, int(time.time()), callback)
     acc = StockAccount(ACCOUNT)
     # 启动交易线程
@@ -49,6 +62,11 @@ if __name__ == "__main__":
     # 对交易回调进行订阅，订阅后可以收到交易主推，返回0表示订阅成功
     subscribe_result = xt_trader.subscribe(acc)
     print("subscribe", subscribe_result)
+    # 限速并发下单、撤单，异步回报由callback转发。重试时按最新快照重新报价，同send_orders_4(df, -1, 0, False)
+    dispatcher = OrderDispatcher(xt_trader, acc, reprice=snapshot_reprice(snapshot, details, -1, 0),
+                                 **ORDER_DISPATCH).start()
+    callback.dispatcher = dispatcher
+    book.start(xt_trader, acc, interval=RECONCILE_INTERVAL)
 
     debug = True
 
@@ -81,13 +99,13 @@ if __name__ == "__main__":
             df = objs_to_dataframe(orders)
             if df.empty:
                 continue
-            df = cancel_orders(xt_trader, acc, df, order_remark=order_remark, do_async=False)
+            df = cancel_orders(xt_trader, acc, df, order_remark=order_remark, dispatcher=dispatcher)
             print(df)
             continue
         if choice == "5":
             order_remark = input("请输入order_remark:")
 
-            df = send_orders_1(xt_trader, acc, details, d1d)
+            df = send_orders_1(xt_trader, acc, details, d1d, i1d, snapshot, book=book)
 
             # 等市值买入
             arr = s1d.data()
@@ -104,6 +122,6 @@ if __name__ == "__main__":
 
             df = send_orders_2(df, pd.DataFrame(arr), 0.05, or_volume=True)
 
-            df = send_orders_3(xt_trader, acc, df, SizeType.TargetValuePercent)
+            df = send_orders_3(xt_trader, acc, df, SizeType.TargetValuePercent, book=book)
             df = send_orders_4(df, -1, 0, False)
-            df = send_orders_5(xt_trader, acc, df, order_remark, debug=debug)
+            df = send_orders_5(xt_trader, acc, df, order_remark, debug=debug, dispatcher=dispatcher)
@@ -77,7 +77,8 @@ def ticks_to_minute(df: pl.DataFrame, every: str = "1m", closed: str = "left", l
             preClose=pl.first("lastClose"),
         )
         .with_columns(
-            preClose=pl.col("close").shift(1, fill_value=pl.col("preClose")).over('stock_code', order_by='time'),
+            # shift的fill_value新版polars只接受标量
+            preClose=pl.col("close").shift(1).over('stock_code', order_by='time').fill_null(pl.col("preClose")),
         )
         .with_columns(duration=pl.col("close_dt") - pl.col("open_dt"))
     )
@@ -122,3 +122,27 @@ def get_label(t: int, bar_size: int, tz: int = 3600 * 8) -> int:
     日线处理一定要加时区
     """
     return (t + tz) // bar_size * bar_size - tz
+
+
+@njit(cache=True)
+def get_label_stock(t: int, bar_size: int, tz: int = 3600 * 8) -> int:
+    """按周期长度取标签，方便多周期一起处理
+
+    Parameters
+    ----------
+    t: int
+        时间戳，秒
+    bar_size: int
+        周期长度，秒。60/300/900/1800/3600/7200/86400
+    tz: int
+        时区
+
+    """
+    if bar_size == 86400:
+        return get_label_stock_1d(t, tz)
+    if bar_size == 7200:
+        return get_label_stock_120m(t, tz)
+    if bar_size == 3600:
+        return get_label_stock_60m(t, tz)
+    n, t0, tz = _get_label_stock(t, tz, bar_size)
+    return n + t0 - tz
@@ -0,0 +1,186 @@
+"""
+分钟转换，数组版
+
+`min_m5.BarManager`中每只股票一个jitclass对象，存在字典中。这里同`tick_array`，
+状态按编号存放在一组连续数组中，由一个@njit函数遍历整批K线
+
+1. 代码为`U9`时由SymbolTable分配编号，为整数编号时直接作下标，不必再区分`BarManager`/`BarManagerID`
+2. 可保存检查点，用法同`tick_array.MinuteBarManager`
+
+输出与`min_m5.BarManager`(`update_bar_v1`/`fill_bar_v1`)完全一致
+
+"""
+from collections import namedtuple
+from typing import Optional, Tuple
+
+import numpy as np
+from numba import njit
+
+from qmt_quote.bars.tick_array import STATE_DTYPES as _STATE_DTYPES, _ArrayBarManager
+from qmt_quote.symbols import SymbolTable
+
+# 在tick_array.BarState的基础上多一个last_time，数据源K线的时间戳
+STATE_DTYPES = dict(_STATE_DTYPES, last_time=np.uint64)
+
+MinState = namedtuple('MinState', list(STATE_DTYPES))
+
+
+def new_state(n: int) -> MinState:
+    """创建n只股票的空状态"""
+    return MinState(**{k: np.zeros(n, dtype=v) for k, v in STATE_DTYPES.items()})
+
+
+@njit(cache=True)
+def _update_bar(s: MinState, k, b: np.ndarray, time: int, include_quote: bool) -> bool:
+    """同min_m5.Bar.update_bar_v1"""
+    if not s.valid[k]:
+        # 同min_m5.Bar(b['preClose'])
+        s.valid[k] = True
+        s.close[k] = b['preClose']
+        s.time[k] = 0
+        s.last_time[k] = 0
+        s.last_amount[k] = 0
+        s.last_volume[k] = 0
+
+    if s.time[k] != time:
+        s.time[k] = time
+        is_new = True
+        s.open_dt[k] = b['open_dt']
+        s.type[k] = b['type']
+
+        s.pre_close[k] = s.close[k]
+        s.open[k] = b['open']
+        s.high[k] = b['high']
+        s.low[k] = b['low']
+
+        s.last_time[k] = b['time']
+        s.pre_amount[k] = 0
+        s.pre_volume[k] = 0
+    else:
+        is_new = False
+        s.high[k] = max(b['high'], s.high[k])
+        s.low[k] = min(b['low'], s.low[k])
+
+    if s.last_time[k] != b['time']:
+        # 上一根小K线已经结束，累计到前一段
+        s.last_time[k] = b['time']
+        s.pre_amount[k] += s.last_amount[k]
+        s.pre_volume[k] += s.last_volume[k]
+
+    s.last_amount[k] = b['amount']
+    s.last_volume[k] = b['volume']
+    s.close_dt[k] = b['close_dt']
+    s.close[k] = b['close']
+    s.avg_price[k] = b['avg_price']
+
+    if include_quote:
+        s.askPrice_1[k] = b['askPrice_1']
+        s.bidPrice_1[k] = b['bidPrice_1']
+        s.askVol_1[k] = b['askVol_1']
+        s.bidVol_1[k] = b['bidVol_1']
+        s.askVol_2[k] = b['askVol_2']
+        s.bidVol_2[k] = b['bidVol_2']
+    return is_new
+
+
+@njit(cache=True)
+def _fill_bar(s: MinState, k, arr: np.ndarray, b: np.ndarray, include_quote: bool) -> None:
+    """同min_m5.Bar.fill_bar_v1，代码直接取自输入K线"""
+    arr['stock_code'] = b['stock_code']
+    arr['time'] = s.time[k]
+    arr['open_dt'] = s.open_dt[k]
+    arr['close_dt'] = s.close_dt[k]
+    arr['open'] = s.open[k]
+    arr['high'] = s.high[k]
+    arr['low'] = s.low[k]
+    arr['close'] = s.close[k]
+    arr['preClose'] = s.pre_close[k]
+    arr['amount'] = s.pre_amount[k] + s.last_amount[k]
+    arr['volume'] = s.pre_volume[k] + s.last_volume[k]
+    arr['type'] = s.type[k]
+    arr['avg_price'] = s.avg_price[k]
+
+    if include_quote:
+        arr['askPrice_1'] = s.askPrice_1[k]
+        arr['bidPrice_1'] = s.bidPrice_1[k]
+        arr['askVol_1'] = s.askVol_1[k]
+        arr['bidVol_1'] = s.bidVol_1[k]
+        arr['askVol_2'] = s.askVol_2[k]
+        arr['bidVol_2'] = s.bidVol_2[k]
+
+
+@njit
+def extend_bars(s: MinState, bars: np.ndarray, ids: np.ndarray, arr1: np.ndarray, index: int,
+                get_label, get_label_arg1: int, include_quote: bool) -> int:
+    """一批短周期K线更新长周期K线
+
+    Parameters
+    ----------
+    s: MinState
+        状态
+    bars: np.ndarray
+        短周期K线
+    ids: np.ndarray
+        每根K线对应的编号
+    arr1: np.ndarray
+        K线输出
+    index: int
+        K线输出的当前位置
+    get_label
+        标签函数
+    get_label_arg1
+        标签函数参数，时区
+    include_quote: bool
+        是否更新盘口字段
+
+    Returns
+    -------
+    int
+        K线输出的新位置
+
+    """
+    for i in range(len(bars)):
+        b = bars[i]
+        time = get_label(b['time'] // 1000, get_label_arg1) * 1000
+        if time == 0:
+            continue
+        k = ids[i]
+        if _update_bar(s, k, b, time, include_quote):
+            if index >= len(arr1):
+                raise IndexError("bar file is full")
+            s.index[k] = index
+            index += 1
+        _fill_bar(s, k, arr1[s.index[k]], b, include_quote)
+    return index
+
+
+class BarManager(_ArrayBarManager):
+    """短周期K线转长周期，用法同min_m5.BarManager"""
+
+    def __init__(self, arr1: np.ndarray, arr2: np.ndarray, include_quote: bool,
+                 symbols: Optional[SymbolTable] = None, n_symbols: int = 8192):
+        """
+
+        Parameters
+        ----------
+        include_quote: bool
+            是否更新盘口字段。其余参数同_ArrayBarManager
+
+        """
+        super().__init__(arr1, arr2, symbols, n_symbols)
+        self.include_quote: bool = include_quote
+
+    def _new_state(self, n: int) -> MinState:
+        return new_state(n)
+
+    def extend(self, bars: np.ndarray, get_label, get_label_arg1: float) -> Tuple[int, int, int]:
+        """来短周期bar数据，更新成长周期数据。
+
+        由于历史重复不好取，所以使用for_all()来获取
+
+        """
+        last_index = self.index
+        ids = self.ids(bars)
+        self.index = extend_bars(self.state, bars, ids, self.arr1, self.index, get_label, get_label_arg1,
+                                 self.include_quote)
+        return self._done(last_index)
@@ -122,6 +122,9 @@ class BarManager:
 
             bb = self.bars[key]
             if bb.update(s, time):
+                if self.index >= len(self.arr1):
+                    # numba不检查越界，写过头会破坏内存
+                    raise IndexError("bar file is full")
                 bb.index = self.index
                 self.index += 1
             bb.fill(self.arr1[bb.index], stock_code)
@@ -0,0 +1,219 @@
+"""
+信号记录，数组版
+
+`signals.BarManager`以(代码, 策略ID)为键，每个键一个jitclass对象，存在字典中。
+这里状态为(策略数, 股票数)的二维数组，下标为(策略行号, 编号)，由一个@njit函数遍历整批信号
+
+1. 代码由SymbolTable分配编号，整数编号格式直接作下标
+2. 策略ID按出现顺序分配行号，一般只有几个策略
+3. 可保存检查点，策略ID与行号的对应一起保存
+
+输出与`signals.BarManager`完全一致
+
+"""
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+from numba import njit
+
+from qmt_quote.bars.tick_array import save_checkpoint, load_checkpoint
+from qmt_quote.symbols import SymbolTable
+
+STATE_DTYPES = {
+    'valid': np.bool_,
+    'index': np.uint64,
+    'time': np.uint64,
+    'open_dt': np.uint64,
+    'close_dt': np.uint64,
+    'float32': np.float32,
+    'int32': np.int32,
+    'boolean': np.bool_,
+}
+
+# 每个(策略, 股票)的信号状态，字段含义同signals.Bar
+SignalState = namedtuple('SignalState', list(STATE_DTYPES))
+
+
+def new_state(n_strategies: int, n: int) -> SignalState:
+    """创建n_strategies个策略、n只股票的空状态"""
+    return SignalState(**{k: np.zeros((n_strategies, n), dtype=v) for k, v in STATE_DTYPES.items()})
+
+
+def grow_state(state: SignalState, n_strategies: int, n: int) -> SignalState:
+    """扩充到至少n_strategies个策略、n只股票，已有状态保留"""
+    rows, cols = state.valid.shape
+    if n_strategies <= rows and n <= cols:
+        return state
+    out = new_state(max(n_strategies, rows), cols if n <= cols else max(n, cols * 2))
+    for a, b in zip(out, state):
+        a[:rows, :cols] = b
+    return out
+
+
+@njit(cache=True)
+def _update(s: SignalState, k, signal: np.ndarray, time: int) -> bool:
+    """同signals.Bar.update"""
+    if not s.valid[k] or s.time[k] != time:
+        s.valid[k] = True
+        s.time[k] = time
+        is_new = True
+        s.open_dt[k] = signal['time']
+    else:
+        is_new = False
+
+    s.close_dt[k] = signal['time']
+    s.float32[k] = signal['float32']
+    s.int32[k] = signal['int32']
+    s.boolean[k] = signal['boolean']
+    return is_new
+
+
+@njit(cache=True)
+def _fill(s: SignalState, k, arr: np.ndarray, signal: np.ndarray) -> None:
+    """同signals.Bar.fill，代码和策略ID直接取自信号"""
+    arr['stock_code'] = signal['stock_code']
+    arr['time'] = s.time[k]
+    arr['strategy_id'] = signal['strategy_id']
+    arr['open_dt'] = s.open_dt[k]
+    arr['close_dt'] = s.close_dt[k]
+    arr['float32'] = s.float32[k]
+    arr['int32'] = s.int32[k]
+    arr['boolean'] = s.boolean[k]
+
+
+@njit
+def extend_signals(s: SignalState, signals: np.ndarray, rows: np.ndarray, ids: np.ndarray, arr1: np.ndarray,
+                   index: int, get_label, get_label_arg1: int) -> int:
+    """一批信号更新信号K线
+
+    Parameters
+    ----------
+    s: SignalState
+        状态
+    signals: np.ndarray
+        信号
+    rows: np.ndarray
+        每条信号的策略行号
+    ids: np.ndarray
+        每条信号的股票编号
+    arr1: np.ndarray
+        输出
+    index: int
+        输出的当前位置
+    get_label
+        标签函数
+    get_label_arg1
+        标签函数参数，时区
+
+    Returns
+    -------
+    int
+        输出的新位置
+
+    """
+    for i in range(len(signals)):
+        sig = signals[i]
+        time = get_label(sig['time'] // 1000, get_label_arg1) * 1000
+        k = (rows[i], ids[i])
+        if _update(s, k, sig, time):
+            if index >= len(arr1):
+                raise IndexError("bar file is full")
+            s.index[k] = index
+            index += 1
+        _fill(s, k, arr1[s.index[k]], sig)
+    return index
+
+
+class BarManager:
+    """信号转信号K线，用法同signals.BarManager"""
+
+    def __init__(self, arr1: np.ndarray, arr2: np.ndarray, symbols: Optional[SymbolTable] = None,
+                 n_symbols: int = 8192):
+        """
+
+        Parameters
+        ----------
+        arr1: np.ndarray
+            输出，NPYT._a
+        arr2: np.ndarray
+            位置记录，NPYT._t
+        symbols: SymbolTable
+            代码表。None时内部维护一个临时代码表。信号为整数编号格式时，需与写入信号的代码表相同
+        n_symbols: int
+            初始股票数量，不够时自动扩充
+
+        """
+        self.arr1: np.ndarray = arr1
+        self.arr2: np.ndarray = arr2
+        self.index: int = int(self.arr2[1])
+        self.symbols: SymbolTable = SymbolTable() if symbols is None else symbols
+        # 策略ID -> 状态中的行号
+        self.strategies: Dict[int, int] = {}
+        self.state: SignalState = new_state(1, n_symbols)
+
+    def reset(self):
+        self.strategies.clear()
+        self.state = new_state(1, self.state.valid.shape[1])
+        self.index = 0
+        self.arr2[1] = 0
+
+    def keys(self, signals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """信号对应的(策略行号, 股票编号)，同时确保状态足够大"""
+        codes = signals['stock_code']
+        if codes.dtype.kind in 'iu':
+            ids = codes
+        else:
+            ids = self.symbols.encode(codes, dtype=np.int64)
+        uniq, inverse = np.unique(signals['strategy_id'], return_inverse=True)
+        for sid in uniq.tolist():
+            if sid not in self.strategies:
+                self.strategies[sid] = len(self.strategies)
+        rows = np.array([self.strategies[sid] for sid in uniq.tolist()], dtype=np.int64)[inverse]
+        if len(ids) > 0:
+            self.state = grow_state(self.state, len(self.strategies), int(ids.max()) + 1)
+        return rows, ids
+
+    def extend(self, signals: np.ndarray, get_label, get_label_arg1: int) -> Tuple[int, int, int]:
+        """来ticks数据，更新bar数据
+
+        tick不能重复，使用for_next()来获取
+
+        """
+        last_index = self.index
+        rows, ids = self.keys(signals)
+        self.index = extend_signals(self.state, signals, rows, ids, self.arr1, self.index, get_label,
+                                    get_label_arg1)
+        # 记录位子
+        self.arr2[1] = self.index
+        return last_index, self.index, self.index - last_index
+
+    def save(self, path: Union[str, Path], cursor: int) -> None:
+        """保存检查点
+
+        Parameters
+        ----------
+        path: str
+            检查点文件
+        cursor: int
+            信号的读取位置。一般为NPYT.tell()
+
+        """
+        strategies = np.array(sorted(self.strategies, key=self.strategies.get), dtype=np.int64)
+        save_checkpoint(path, self.state, self.symbols, np.array([self.index]), cursor, strategies=strategies)
+
+    def load(self, path: Union[str, Path]) -> int:
+        """从检查点恢复，之后生成的信号K线会被重新生成
+
+        Returns
+        -------
+        int
+            信号的读取位置。一般用于NPYT.seek()
+
+        """
+        self.state, indices, cursor, kwargs = load_checkpoint(path, self.symbols, SignalState)
+        self.strategies = {int(sid): i for i, sid in enumerate(kwargs['strategies'])}
+        self.index = int(indices[0])
+        self.arr2[1] = self.index
+        return cursor
@@ -0,0 +1,975 @@
+"""
+Tick转K线，数组版
+
+`tick_minute.py`/`tick_day.py`中每只股票一个jitclass对象，存在字典中。
+这里改成按编号存放在一组连续数组中(struct-of-arrays)，由一个@njit函数遍历整批tick
+
+1. 不再字符串哈希，也没有jitclass属性装箱
+2. 状态就是一组numpy数组，可以直接保存和恢复
+3. 编号由SymbolTable分配，`U9`格式与整数编号格式都能处理
+4. 可保存检查点(状态+tick读取位置)，重启后从检查点继续，不必重放全天tick
+5. 按编号分片多核并行，用于历史回放和冷启动
+6. 可同时维护最新快照(`qmt_quote.snapshot.Snapshot`)，下单前直接取，不必从日线去重
+7. 紧凑tick格式(`compact_tick_dtype`)自动还原后处理，输出为整数编号格式的K线
+8. 写入前检查空间，不够时报错，不会越界写坏内存。盘前`maintain`丢弃最早的整天数据，腾出一天的空间
+9. 分钟K线跨日时成交量、成交额重新累计，前收取自tick，可多天连续回放
+
+单日时输出与`tick_minute.BarManager`/`tick_day.BarManager`完全一致
+
+"""
+import os
+from collections import namedtuple
+from pathlib import Path
+from typing import Tuple, Optional, List, Sequence, Union
+
+import numpy as np
+from numba import njit, prange
+
+from qmt_quote.bars.labels import get_label_stock_1d, get_label_stock
+from qmt_quote.compact import is_compact, from_compact
+from qmt_quote.rolling import drop_head, rows_to_drop
+from qmt_quote.snapshot import Snapshot
+from qmt_quote.symbols import SymbolTable
+
+# 每只股票的K线状态，字段含义同tick_minute.Bar
+# 下标k为编号。多周期时字段为二维数组，下标k为(周期, 编号)
+BarState = namedtuple('BarState', [
+    'valid',
+    'index',
+    'time',
+    'open_dt',
+    'close_dt',
+    'open',
+    'high',
+    'low',
+    'close',
+    'pre_close',
+    'pre_amount',
+    'pre_volume',
+    'last_amount',
+    'last_volume',
+    'type',
+    'avg_price',
+    'askPrice_1',
+    'bidPrice_1',
+    'askVol_1',
+    'bidVol_1',
+    'askVol_2',
+    'bidVol_2',
+])
+
+STATE_DTYPES = {
+    'valid': np.bool_,
+    'index': np.uint64,
+    'time': np.uint64,
+    'open_dt': np.uint64,
+    'close_dt': np.uint64,
+    'open': np.float32,
+    'high': np.float32,
+    'low': np.float32,
+    'close': np.float32,
+    'pre_close': np.float32,
+    'pre_amount': np.float64,
+    'pre_volume': np.uint64,
+    'last_amount': np.float64,
+    'last_volume': np.uint64,
+    'type': np.int8,
+    'avg_price': np.float32,
+    'askPrice_1': np.float32,
+    'bidPrice_1': np.float32,
+    'askVol_1': np.uint32,
+    'bidVol_1': np.uint32,
+    'askVol_2': np.uint32,
+    'bidVol_2': np.uint32,
+}
+
+
+def new_state(n: int, n_frames: int = 0) -> BarState:
+    """创建n只股票的空状态
+
+    Parameters
+    ----------
+    n: int
+        股票数量
+    n_frames: int
+        周期数量。0时每个字段为一维数组，大于0时为(n_frames, n)的二维数组，用于多周期
+
+    """
+    shape = n if n_frames == 0 else (n_frames, n)
+    return BarState(**{k: np.zeros(shape, dtype=v) for k, v in STATE_DTYPES.items()})
+
+
+def grow_state(state: BarState, n: int) -> BarState:
+    """扩充到至少n只股票，已有状态保留"""
+    size = state.valid.shape[-1]
+    if n <= size:
+        return state
+    # 按已有数组的类型扩充，其他引擎的状态(字段更多)也能用
+    shape = state.valid.shape[:-1] + (max(n, size * 2),)
+    out = type(state)(*[np.zeros(shape, dtype=a.dtype) for a in state])
+    for a, b in zip(out, state):
+        a[..., :size] = b
+    return out
+
+
+def save_checkpoint(path: Union[str, Path], state: BarState, symbols: SymbolTable,
+                    indices: np.ndarray, cursor: int, **kwargs) -> None:
+    """保存检查点
+
+    先写临时文件再替换，写到一半崩溃也不会破坏上一个检查点
+
+    Parameters
+    ----------
+    path: str
+        检查点文件，如：`M:\\d1t.ckpt.npz`
+    state: BarState
+        状态
+    symbols: SymbolTable
+        代码表。编号依赖代码表，恢复时要保证编号不变
+    indices: np.ndarray
+        K线输出的当前位置
+    cursor: int
+        tick的读取位置
+    kwargs
+        其他需要一起保存的信息
+
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.savez(f, **state._asdict(),
+                 _codes=symbols.codes(),
+                 _indices=np.asarray(indices, dtype=np.int64),
+                 _cursor=np.int64(cursor),
+                 **{f'_{k}': v for k, v in kwargs.items()})
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: Union[str, Path], symbols: SymbolTable,
+                    cls: type = BarState) -> Tuple[BarState, np.ndarray, int, dict]:
+    """加载检查点
+
+    Parameters
+    ----------
+    path: str
+        检查点文件
+    symbols: SymbolTable
+        代码表。内存代码表按检查点中的顺序重建编号；文件代码表检查编号是否一致
+    cls: type
+        状态类型。其他引擎的状态字段不同
+
+    Returns
+    -------
+    tuple
+        (state, indices, cursor, 其他信息)
+
+    """
+    with np.load(path) as f:
+        state = cls(**{k: f[k] for k in cls._fields})
+        codes = f['_codes']
+        indices = f['_indices']
+        cursor = int(f['_cursor'])
+        kwargs = {k[1:]: f[k] for k in f.files if k.startswith('_') and k not in ('_codes', '_indices', '_cursor')}
+
+    for i, c in enumerate(codes):
+        assert symbols.get_id(str(c)) == i, f"symbol table mismatch: {c}"
+    return state, indices, cursor, kwargs
+
+
+@njit(cache=True)
+def _update_quote(s: BarState, k, t: np.ndarray) -> None:
+    """更新成交均价与盘口"""
+    # TODO 不同类型可能不一样，先标记一下
+    if t['volume'] > 0:
+        s.avg_price[k] = t['amount'] / t['volume'] / 100
+    s.askPrice_1[k] = t['askPrice_1']
+    s.bidPrice_1[k] = t['bidPrice_1']
+    s.askVol_1[k] = t['askVol_1']
+    s.bidVol_1[k] = t['bidVol_1']
+    s.askVol_2[k] = t['askVol_2']
+    s.bidVol_2[k] = t['bidVol_2']
+
+
+@njit(cache=True)
+def _update_minute(s: BarState, k, t: np.ndarray, time: int, tz: int) -> bool:
+    """同tick_minute.Bar.update。跨日时重新开始，支持多天连续回放"""
+    if not s.valid[k] or (np.int64(s.time[k]) // 1000 + tz) // 86400 != (time // 1000 + tz) // 86400:
+        # 新的交易日，tick中的成交量、成交额从0累计，前收取自tick
+        s.valid[k] = True
+        s.close[k] = t['lastClose']
+        s.last_amount[k] = 0
+        s.last_volume[k] = 0
+
+    if s.time[k] != time:
+        s.time[k] = time
+        is_new = True
+        s.open_dt[k] = t['time']
+        s.type[k] = t['type']
+
+        s.pre_close[k] = s.close[k]
+        s.pre_amount[k] = s.last_amount[k]
+        s.pre_volume[k] = s.last_volume[k]
+        s.open[k] = t['lastPrice']
+        s.high[k] = t['lastPrice']
+        s.low[k] = t['lastPrice']
+    else:
+        is_new = False
+        s.high[k] = max(t['lastPrice'], s.high[k])
+        s.low[k] = min(t['lastPrice'], s.low[k])
+
+    s.close_dt[k] = t['time']
+    s.close[k] = t['lastPrice']
+    s.last_amount[k] = t['amount']
+    s.last_volume[k] = t['volume']
+    _update_quote(s, k, t)
+    return is_new
+
+
+@njit(cache=True)
+def _update_day(s: BarState, k, t: np.ndarray, time: int) -> bool:
+    """同tick_day.Bar.update。pre_amount/pre_volume一直为0"""
+    s.valid[k] = True
+    if s.time[k] != time:
+        s.time[k] = time
+        is_new = True
+        s.open_dt[k] = t['time']
+        s.type[k] = t['type']
+
+        s.pre_close[k] = t['lastClose']
+    else:
+        is_new = False
+
+    s.open[k] = t['open']  # 部分tick9点25之前0
+    s.high[k] = t['high']
+    s.low[k] = t['low']
+
+    s.close_dt[k] = t['time']
+    s.close[k] = t['lastPrice']
+    s.last_amount[k] = t['amount']
+    s.last_volume[k] = t['volume']
+    _update_quote(s, k, t)
+    return is_new
+
+
+@njit(cache=True)
+def _fill(s: BarState, k, arr: np.ndarray, t: np.ndarray) -> None:
+    """状态写入K线，代码直接取自tick"""
+    arr['stock_code'] = t['stock_code']
+    arr['time'] = s.time[k]
+    arr['open_dt'] = s.open_dt[k]
+    arr['close_dt'] = s.close_dt[k]
+    arr['open'] = s.open[k]
+    arr['high'] = s.high[k]
+    arr['low'] = s.low[k]
+    arr['close'] = s.close[k]
+    arr['preClose'] = s.pre_close[k]
+    arr['amount'] = s.last_amount[k] - s.pre_amount[k]
+    arr['volume'] = s.last_volume[k] - s.pre_volume[k]
+    arr['type'] = s.type[k]
+    arr['avg_price'] = s.avg_price[k]
+
+    arr['askPrice_1'] = s.askPrice_1[k]
+    arr['bidPrice_1'] = s.bidPrice_1[k]
+    arr['askVol_1'] = s.askVol_1[k]
+    arr['bidVol_1'] = s.bidVol_1[k]
+    arr['askVol_2'] = s.askVol_2[k]
+    arr['bidVol_2'] = s.bidVol_2[k]
+
+
+def as_standard(ticks: np.ndarray, tz: int) -> np.ndarray:
+    """紧凑格式的tick还原成`DTYPE_STOCK_1t_ID`，其他格式原样返回"""
+    if is_compact(ticks.dtype):
+        return from_compact(ticks, tz=tz)
+    return ticks
+
+
+@njit(cache=True)
+def fill_snapshot(s: BarState, ticks: np.ndarray, ids: np.ndarray, snap: np.ndarray) -> int:
+    """日线状态写入快照，只写本批tick涉及的股票
+
+    Parameters
+    ----------
+    s: BarState
+        日线状态，每个字段为一维数组
+    ticks: np.ndarray
+        tick数据，只取代码
+    ids: np.ndarray
+        每条tick对应的编号
+    snap: np.ndarray
+        快照，行号即编号
+
+    Returns
+    -------
+    int
+        用到的最大编号+1
+
+    """
+    n = 0
+    for i in range(len(ticks)):
+        k = ids[i]
+        r = snap[k]
+        r['stock_code'] = ticks[i]['stock_code']
+        r['time'] = s.close_dt[k]
+        r['type'] = s.type[k]
+        r['lastPrice'] = s.close[k]
+        r['open'] = s.open[k]
+        r['high'] = s.high[k]
+        r['low'] = s.low[k]
+        r['lastClose'] = s.pre_close[k]
+        r['amount'] = s.last_amount[k]
+        r['volume'] = s.last_volume[k]
+        r['avg_price'] = s.avg_price[k]
+        r['askPrice_1'] = s.askPrice_1[k]
+        r['bidPrice_1'] = s.bidPrice_1[k]
+        r['askVol_1'] = s.askVol_1[k]
+        r['bidVol_1'] = s.bidVol_1[k]
+        r['askVol_2'] = s.askVol_2[k]
+        r['bidVol_2'] = s.bidVol_2[k]
+        n = max(n, k + 1)
+    return n
+
+
+def update_snapshot(snapshot: Snapshot, s: BarState, ticks: np.ndarray, ids: np.ndarray) -> None:
+    """日线状态写入快照"""
+    if len(ticks) == 0:
+        return
+    snapshot.grow(int(ids.max()) + 1)
+    fill_snapshot(s, ticks, ids, snapshot.arr)
+
+
+@njit
+def extend_minute(s: BarState, ticks: np.ndarray, ids: np.ndarray, arr1: np.ndarray, index: int,
+                  get_label, get_label_arg1: int) -> int:
+    """一批tick更新分钟K线
+
+    Parameters
+    ----------
+    s: BarState
+        状态
+    ticks: np.ndarray
+        tick数据
+    ids: np.ndarray
+        每条tick对应的编号
+    arr1: np.ndarray
+        K线输出
+    index: int
+        K线输出的当前位置
+    get_label
+        标签函数
+    get_label_arg1
+        标签函数参数，时区
+
+    Returns
+    -------
+    int
+        K线输出的新位置
+
+    """
+    for i in range(len(ticks)):
+        t = ticks[i]
+        if t['open'] == 0:
+            # 出现部分股票9点25过几秒open价还是0的情况
+            continue
+        time = get_label(t['time'] // 1000, get_label_arg1) * 1000
+        if time == 0:
+            continue
+        k = ids[i]
+        if _update_minute(s, k, t, time, get_label_arg1):
+            if index >= len(arr1):
+                raise IndexError("bar file is full")
+            s.index[k] = index
+            index += 1
+        _fill(s, k, arr1[s.index[k]], t)
+    return index
+
+
+@njit(cache=True)
+def extend_day(s: BarState, ticks: np.ndarray, ids: np.ndarray, arr1: np.ndarray, index: int,
+               get_label_arg1: int) -> int:
+    """一批tick更新日K线。参数同extend_minute"""
+    for i in range(len(ticks)):
+        t = ticks[i]
+        time = get_label_stock_1d(t['time'] // 1000, get_label_arg1) * 1000
+        k = ids[i]
+        if _update_day(s, k, t, time):
+            if index >= len(arr1):
+                raise IndexError("bar file is full")
+            s.index[k] = index
+            index += 1
+        _fill(s, k, arr1[s.index[k]], t)
+    return index
+
+
+@njit
+def count_new_bars_1(times: np.ndarray, ticks: np.ndarray, ids: np.ndarray, get_label, get_label_arg1: int,
+                     minute: bool) -> int:
+    """一批tick在单个周期会新建的K线数，同extend_minute/extend_day，但不改动状态
+
+    Parameters
+    ----------
+    times: np.ndarray
+        状态中的time。会被复制
+    minute: bool
+        True同extend_minute，跳过open为0与标签为0的tick。False同extend_day
+    其余参数同extend_minute
+
+    """
+    last = times.copy()
+    n = 0
+    for i in range(len(ticks)):
+        t = ticks[i]
+        if minute and t['open'] == 0:
+            continue
+        time = get_label(t['time'] // 1000, get_label_arg1) * 1000
+        if minute and time == 0:
+            continue
+        k = ids[i]
+        if last[k] != time:
+            last[k] = time
+            n += 1
+    return n
+
+
+@njit(cache=True)
+def extend_multi(s: BarState, ticks: np.ndarray, ids: np.ndarray, arr1s, indices: np.ndarray,
+                 bar_sizes: np.ndarray, get_label_arg1: int) -> None:
+    """一批tick同时更新多个周期，每条tick只遍历一次
+
+    Parameters
+    ----------
+    s: BarState
+        多周期状态，每个字段都是(周期数, 股票数)的二维数组
+    ticks: np.ndarray
+        tick数据
+    ids: np.ndarray
+        每条tick对应的编号
+    arr1s: tuple of np.ndarray
+        每个周期的K线输出，dtype需相同
+    indices: np.ndarray
+        每个周期K线输出的当前位置，原地更新
+    bar_sizes: np.ndarray
+        每个周期的长度，秒。86400为日线，按tick_day的方式生成，其余按tick_minute的方式生成
+    get_label_arg1
+        标签函数参数，时区
+
+    """
+    for i in range(len(ticks)):
+        t = ticks[i]
+        sec = t['time'] // 1000
+        for j in range(len(bar_sizes)):
+            k = (j, ids[i])
+            if bar_sizes[j] == 86400:
+                time = get_label_stock_1d(sec, get_label_arg1) * 1000
+                is_new = _update_day(s, k, t, time)
+            else:
+                if t['open'] == 0:
+                    # 出现部分股票9点25过几秒open价还是0的情况
+                    continue
+                time = get_label_stock(sec, bar_sizes[j], get_label_arg1) * 1000
+                if time == 0:
+                    continue
+                is_new = _update_minute(s, k, t, time, get_label_arg1)
+            if is_new:
+                if indices[j] >= len(arr1s[j]):
+                    raise IndexError("bar file is full")
+                s.index[k] = indices[j]
+                indices[j] += 1
+            _fill(s, k, arr1s[j][s.index[k]], t)
+
+
+@njit(cache=True)
+def count_new_bars(times: np.ndarray, ticks: np.ndarray, ids: np.ndarray, bar_sizes: np.ndarray,
+                   get_label_arg1: int) -> np.ndarray:
+    """一批tick在每个周期会新建的K线数，同extend_multi，但不改动状态
+
+    Parameters
+    ----------
+    times: np.ndarray
+        状态中的time，(周期数, 股票数)。会被复制
+    其余参数同extend_multi
+
+    """
+    last = times.copy()
+    out = np.zeros(len(bar_sizes), dtype=np.int64)
+    for i in range(len(ticks)):
+        t = ticks[i]
+        sec = t['time'] // 1000
+        for j in range(len(bar_sizes)):
+            if bar_sizes[j] == 86400:
+                time = get_label_stock_1d(sec, get_label_arg1) * 1000
+            else:
+                if t['open'] == 0:
+                    continue
+                time = get_label_stock(sec, bar_sizes[j], get_label_arg1) * 1000
+                if time == 0:
+                    continue
+            if last[j, ids[i]] != time:
+                last[j, ids[i]] = time
+                out[j] += 1
+    return out
+
+
+@njit(cache=True)
+def _shard_order(ids: np.ndarray, n_shards: int) -> Tuple[np.ndarray, np.ndarray]:
+    """按编号分片，计数排序。分片内保持tick原有顺序
+
+    Returns
+    -------
+    tuple
+        (order, starts)。第s片的tick为order[starts[s]:starts[s+1]]
+
+    """
+    starts = np.zeros(n_shards + 1, dtype=np.int64)
+    for i in range(len(ids)):
+        starts[ids[i] % n_shards + 1] += 1
+    for s in range(n_shards):
+        starts[s + 1] += starts[s]
+    pos = starts[:-1].copy()
+    order = np.empty(len(ids), dtype=np.int64)
+    for i in range(len(ids)):
+        s = ids[i] % n_shards
+        order[pos[s]] = i
+        pos[s] += 1
+    return order, starts
+
+
+@njit(parallel=True, cache=True)
+def extend_multi_sharded(s: BarState, ticks: np.ndarray, ids: np.ndarray, arr1s, indices: np.ndarray,
+                         bar_sizes: np.ndarray, get_label_arg1: int, scratch: np.ndarray, n_shards: int) -> None:
+    """多核并行版extend_multi，输出与extend_multi完全一致
+
+    1. 按编号分片，每片在自己的草稿区中生成新K线，并记下生成它的tick序号
+    2. 同一周期内每条tick最多生成一根新K线，按tick序号排列即为串行时的顺序
+    3. 按此顺序把草稿区复制到输出，并修正状态中的位置
+
+    Parameters
+    ----------
+    s: BarState
+        多周期状态
+    ticks: np.ndarray
+        tick数据
+    ids: np.ndarray
+        每条tick对应的编号
+    arr1s: tuple of np.ndarray
+        每个周期的K线输出
+    indices: np.ndarray
+        每个周期K线输出的当前位置，原地更新
+    bar_sizes: np.ndarray
+        每个周期的长度，秒
+    get_label_arg1
+        标签函数参数，时区
+    scratch: np.ndarray
+        草稿区，(周期数, tick数量)，dtype同输出
+    n_shards: int
+        分片数量。一般为CPU核数
+
+    """
+    n = len(ticks)
+    n_frames = len(bar_sizes)
+    order, starts = _shard_order(ids, n_shards)
+    # 本批新建K线在草稿区中的位置，-1表示K线建于之前的批次，直接写输出
+    local = np.full(s.valid.shape, -1, dtype=np.int64)
+    # 草稿区每一行是由哪条tick生成的
+    owner = np.full((n_frames, n), -1, dtype=np.int64)
+
+    for p in prange(n_shards):
+        # 第p片的草稿区为[starts[p], starts[p+1])，每条tick每个周期最多一根新K线，不会越界
+        counts = np.full(n_frames, starts[p], dtype=np.int64)
+        for q in range(starts[p], starts[p + 1]):
+            i = order[q]
+            t = ticks[i]
+            sec = t['time'] // 1000
+            for j in range(n_frames):
+                k = (j, ids[i])
+                if bar_sizes[j] == 86400:
+                    time = get_label_stock_1d(sec, get_label_arg1) * 1000
+                    is_new = _update_day(s, k, t, time)
+                else:
+                    if t['open'] == 0:
+                        continue
+                    time = get_label_stock(sec, bar_sizes[j], get_label_arg1) * 1000
+                    if time == 0:
+                        continue
+                    is_new = _update_minute(s, k, t, time, get_label_arg1)
+                if is_new:
+                    local[k] = counts[j]
+                    owner[j, i] = counts[j]
+                    counts[j] += 1
+                if local[k] >= 0:
+                    _fill(s, k, scratch[j, local[k]], t)
+                else:
+                    _fill(s, k, arr1s[j][s.index[k]], t)
+
+    # 按tick顺序分配输出位置
+    rows = np.full((n_frames, n), -1, dtype=np.int64)
+    for j in range(n_frames):
+        index = indices[j]
+        for i in range(n):
+            r = owner[j, i]
+            if r >= 0:
+                if index >= len(arr1s[j]):
+                    raise IndexError("bar file is full")
+                rows[j, r] = index
+                index += 1
+        indices[j] = index
+
+    for j in range(n_frames):
+        arr1 = arr1s[j]
+        for r in prange(n):
+            if rows[j, r] >= 0:
+                arr1[rows[j, r]] = scratch[j, r]
+
+    for j in range(n_frames):
+        for k in range(local.shape[1]):
+            if local[j, k] >= 0:
+                s.index[j, k] = rows[j, local[j, k]]
+
+
+class _ArrayBarManager:
+
+    def __init__(self, arr1: np.ndarray, arr2: np.ndarray, symbols: Optional[SymbolTable] = None,
+                 n_symbols: int = 8192):
+        """
+
+        Parameters
+        ----------
+        arr1: np.ndarray
+            K线输出，NPYT._a
+        arr2: np.ndarray
+            位置记录，NPYT._t
+        symbols: SymbolTable
+            代码表。None时内部维护一个临时代码表。tick为整数编号格式时，需与写入tick的代码表相同
+        n_symbols: int
+            初始股票数量，不够时自动扩充
+
+        """
+        self.arr1: np.ndarray = arr1
+        self.arr2: np.ndarray = arr2
+        self.index: int = int(self.arr2[1])
+        self.symbols: SymbolTable = SymbolTable() if symbols is None else symbols
+        self.state: BarState = self._new_state(n_symbols)
+
+    def _new_state(self, n: int) -> BarState:
+        """空状态。子类的状态字段不同时重写"""
+        return new_state(n)
+
+    def reset(self):
+        self.state = self._new_state(self.state.valid.shape[-1])
+        self.index = 0
+        self.arr2[1] = 0
+
+    def ids(self, ticks: np.ndarray) -> np.ndarray:
+        """tick对应的编号，同时确保状态足够大"""
+        codes = ticks['stock_code']
+        if codes.dtype.kind in 'iu':
+            ids = codes
+        else:
+            ids = self.symbols.encode(codes, dtype=np.int64)
+        if len(ids) > 0:
+            self.state = grow_state(self.state, int(ids.max()) + 1)
+        return ids
+
+    def _ensure_room(self, ticks: np.ndarray, ids: np.ndarray, get_label, get_label_arg1: int, minute: bool) -> None:
+        """检查空间，不够时在改动状态前报错。每条tick最多新建一根K线，不够时再逐条计算实际新建的K线数"""
+        free = len(self.arr1) - self.index
+        if len(ticks) <= free:
+            return
+        need = count_new_bars_1(self.state.time, ticks, ids, get_label, get_label_arg1, minute)
+        if need > free:
+            raise IndexError(f"bar file is full, capacity={len(self.arr1)}, index={self.index}, need={need}")
+
+    def _done(self, last_index: int) -> Tuple[int, int, int]:
+        # 记录位子
+        self.arr2[1] = self.index
+        return last_index, self.index, self.index - last_index
+
+    def save(self, path: Union[str, Path], cursor: int) -> None:
+        """保存检查点
+
+        Parameters
+        ----------
+        path: str
+            检查点文件
+        cursor: int
+            tick的读取位置。一般为NPYT.tell()
+
+        """
+        save_checkpoint(path, self.state, self.symbols, np.array([self.index]), cursor)
+
+    def load(self, path: Union[str, Path]) -> int:
+        """从检查点恢复，之后生成的K线会被重新生成
+
+        Returns
+        -------
+        int
+            tick的读取位置。一般用于NPYT.seek()
+
+        """
+        self.state, indices, cursor, _ = load_checkpoint(path, self.symbols, type(self.state))
+        self.index = int(indices[0])
+        self.arr2[1] = self.index
+        return cursor
+
+
+class MinuteBarManager(_ArrayBarManager):
+    """Tick转分钟，用法同tick_minute.BarManager"""
+
+    def extend(self, ticks: np.ndarray, get_label, get_label_arg1: float) -> Tuple[int, int, int]:
+        """来ticks数据，更新bar数据
+
+        tick不能重复，使用for_next()来获取
+
+        """
+        last_index = self.index
+        ticks = as_standard(ticks, int(get_label_arg1))
+        ids = self.ids(ticks)
+        self._ensure_room(ticks, ids, get_label, get_label_arg1, True)
+        self.index = extend_minute(self.state, ticks, ids, self.arr1, self.index, get_label, get_label_arg1)
+        return self._done(last_index)
+
+
+class DayBarManager(_ArrayBarManager):
+    """Tick转日线，用法同tick_day.BarManager"""
+
+    def __init__(self, arr1: np.ndarray, arr2: np.ndarray, symbols: Optional[SymbolTable] = None,
+                 n_symbols: int = 8192, snapshot: Optional[Snapshot] = None):
+        """
+
+        Parameters
+        ----------
+        snapshot: Snapshot
+            最新快照，None时不维护。其余参数同_ArrayBarManager
+
+        """
+        super().__init__(arr1, arr2, symbols, n_symbols)
+        self.snapshot: Optional[Snapshot] = snapshot
+
+    def extend(self, ticks: np.ndarray, get_label_arg1: int) -> Tuple[int, int, int]:
+        """来ticks数据，更新bar数据
+
+        tick不能重复，使用for_next()来获取
+
+        """
+        last_index = self.index
+        ticks = as_standard(ticks, int(get_label_arg1))
+        ids = self.ids(ticks)
+        self._ensure_room(ticks, ids, get_label_stock_1d, get_label_arg1, False)
+        self.index = extend_day(self.state, ticks, ids, self.arr1, self.index, get_label_arg1)
+        if self.snapshot is not None:
+            update_snapshot(self.snapshot, self.state, ticks, ids)
+        return self._done(last_index)
+
+
+class MultiBarManager:
+    """多周期一起更新。tick只遍历一次，编号只查一次
+
+    Examples
+    --------
+    >>> bm = MultiBarManager([d1d._a, d5m._a, d1m._a], [d1d._t, d5m._t, d1m._t], [86400, 300, 60])
+    >>> bm.extend(ticks, 3600 * 8)
+
+    """
+
+    def __init__(self, arr1s: Sequence[np.ndarray], arr2s: Sequence[np.ndarray], bar_sizes: Sequence[int],
+                 symbols: Optional[SymbolTable] = None, n_symbols: int = 8192, snapshot: Optional[Snapshot] = None):
+        """
+
+        Parameters
+        ----------
+        arr1s: list of np.ndarray
+            每个周期的K线输出，NPYT._a。dtype需相同
+        arr2s: list of np.ndarray
+            每个周期的位置记录，NPYT._t
+        bar_sizes: list of int
+            每个周期的长度，秒。60/300/900/1800/3600/7200/86400
+        symbols: SymbolTable
+            代码表。None时内部维护一个临时代码表
+        n_symbols: int
+            初始股票数量，不够时自动扩充
+        snapshot: Snapshot
+            最新快照，None时不维护。需要有日线周期
+
+        """
+        assert len(arr1s) == len(arr2s) == len(bar_sizes)
+        assert snapshot is None or 86400 in bar_sizes, "snapshot needs a 86400 bar size"
+        self.arr1s: Tuple[np.ndarray, ...] = tuple(arr1s)
+        self.arr2s: Tuple[np.ndarray, ...] = tuple(arr2s)
+        self.bar_sizes: np.ndarray = np.array(bar_sizes, dtype=np.int64)
+        self.indices: np.ndarray = np.array([int(a[1]) for a in arr2s], dtype=np.int64)
+        self.symbols: SymbolTable = SymbolTable() if symbols is None else symbols
+        self.state: BarState = new_state(n_symbols, len(bar_sizes))
+        # 并行时的草稿区，按需扩充
+        self.scratch: Optional[np.ndarray] = None
+        # 最近一次extend改动过的行范围[start, end)，每个周期一个
+        self.dirty: List[Tuple[int, int]] = [(int(i), int(i)) for i in self.indices]
+        self.snapshot: Optional[Snapshot] = snapshot
+        # 最近一次maintain每个周期丢弃的行数，非0时行号整体前移了
+        self.rolled: List[int] = [0] * len(bar_sizes)
+
+    def reset(self):
+        self.state = new_state(self.state.valid.shape[-1], len(self.bar_sizes))
+        self.indices[:] = 0
+        for a in self.arr2s:
+            a[1] = 0
+
+    def ids(self, ticks: np.ndarray) -> np.ndarray:
+        """tick对应的编号，同时确保状态足够大"""
+        codes = ticks['stock_code']
+        if codes.dtype.kind in 'iu':
+            ids = codes
+        else:
+            ids = self.symbols.encode(codes, dtype=np.int64)
+        if len(ids) > 0:
+            self.state = grow_state(self.state, int(ids.max()) + 1)
+        return ids
+
+    def roll(self, j: int, n: int) -> int:
+        """第j个周期丢弃前n行，其余行和状态中的行号一起前移
+
+        Returns
+        -------
+        int
+            实际丢弃的行数
+
+        """
+        n = drop_head(self.arr1s[j], self.arr2s[j], n)
+        if n == 0:
+            return 0
+        self.indices[j] -= n
+        index = self.state.index[j]
+        valid = self.state.valid[j]
+        # 当前K线已被丢弃的股票，下一条tick时新建K线
+        dropped = valid & (index < n)
+        index[valid & ~dropped] -= n
+        valid[dropped] = False
+        index[dropped] = 0
+        self.state.time[j][dropped] = 0
+        self.rolled[j] += n
+        return n
+
+    def maintain(self, rows_per_day: Sequence[int], get_label_arg1: int) -> List[int]:
+        """盘前维护。剩余空间放不下一天时，丢弃最早的整天数据，其余行前移
+
+        整体前移要复制整个文件，只在开盘前调用，盘中的extend不做
+
+        Parameters
+        ----------
+        rows_per_day: list of int
+            每个周期一天最多的K线数
+        get_label_arg1: int
+            时区
+
+        Returns
+        -------
+        list of int
+            每个周期丢弃的行数，同`rolled`。非0时行号索引、列式副本、检查点需同步
+
+        """
+        self.rolled = [0] * len(self.bar_sizes)
+        for j, (arr1, need) in enumerate(zip(self.arr1s, rows_per_day)):
+            end = int(self.indices[j])
+            free = len(arr1) - end
+            if need > free:
+                self.roll(j, rows_to_drop(arr1['time'][:end], need - free, get_label_arg1))
+        return self.rolled
+
+    def _ensure_room(self, ticks: np.ndarray, ids: np.ndarray, get_label_arg1: int) -> None:
+        """检查空间，不够时报错。先按最坏情况估算，每只股票每个周期最多新建本批跨越的周期数根K线，
+        不够时再逐条计算实际新建的K线数"""
+        if len(ticks) == 0:
+            return
+        exact = None
+        t0 = int(ticks['time'].min()) // 1000 + get_label_arg1
+        t1 = int(ticks['time'].max()) // 1000 + get_label_arg1
+        n_ids = int(ids.max()) + 1
+        for j, (arr1, bar_size) in enumerate(zip(self.arr1s, self.bar_sizes)):
+            need = min(len(ticks), n_ids * (t1 // int(bar_size) - t0 // int(bar_size) + 1))
+            free = len(arr1) - int(self.indices[j])
+            if need > free:
+                if exact is None:
+                    exact = count_new_bars(self.state.time, ticks, ids, self.bar_sizes, get_label_arg1)
+                need = int(exact[j])
+            if need > free:
+                raise IndexError(f"bar file {j} is full, capacity={len(arr1)}, index={int(self.indices[j])}, "
+                                 f"need={need}. Enlarge the file or call maintain() before the open")
+
+    def extend(self, ticks: np.ndarray, get_label_arg1: int, n_shards: int = 0) -> List[Tuple[int, int, int]]:
+        """来ticks数据，更新全部周期的bar数据
+
+        tick不能重复，使用for_next()来获取
+
+        Parameters
+        ----------
+        ticks: np.ndarray
+            tick数据
+        get_label_arg1: int
+            时区
+        n_shards: int
+            分片数量。0时单线程；大于0时按编号分片多核并行，输出相同。
+            并行有额外开销，只在一批tick较多时使用，如历史回放和冷启动
+
+        Returns
+        -------
+        list
+            每个周期的(last_index, index, step)
+
+        """
+        ticks = as_standard(ticks, int(get_label_arg1))
+        ids = self.ids(ticks)
+        self._ensure_room(ticks, ids, get_label_arg1)
+        last_indices = self.indices.copy()
+        # 本批会更新的旧K线中最靠前的一根，之后的行都可能被改动
+        valid = self.state.valid[:, ids]
+        first = np.where(valid, self.state.index[:, ids].astype(np.int64), last_indices[:, None])
+        first = first.min(axis=1, initial=2 ** 62)
+        if n_shards > 0 and len(ticks) > 0:
+            if self.scratch is None or self.scratch.shape[1] < len(ticks):
+                self.scratch = np.empty((len(self.bar_sizes), len(ticks)), dtype=self.arr1s[0].dtype)
+            extend_multi_sharded(self.state, ticks, ids, self.arr1s, self.indices, self.bar_sizes, get_label_arg1,
+                                 self.scratch, n_shards)
+        else:
+            extend_multi(self.state, ticks, ids, self.arr1s, self.indices, self.bar_sizes, get_label_arg1)
+        if self.snapshot is not None:
+            j = int(np.flatnonzero(self.bar_sizes == 86400)[0])
+            update_snapshot(self.snapshot, BarState(*[a[j] for a in self.state]), ticks, ids)
+        out = []
+        for a, last_index, index in zip(self.arr2s, last_indices, self.indices):
+            # 记录位子
+            a[1] = index
+            out.append((int(last_index), int(index), int(index - last_index)))
+        # 本批改动过的行范围，用于同步到其他文件
+        self.dirty = [(int(min(f, last_index)), int(index)) for f, last_index, index in
+                      zip(first, last_indices, self.indices)]
+        return out
+
+    def save(self, path: Union[str, Path], cursor: int) -> None:
+        """保存检查点
+
+        Parameters
+        ----------
+        path: str
+            检查点文件
+        cursor: int
+            tick的读取位置。一般为NPYT.tell()
+
+        """
+        save_checkpoint(path, self.state, self.symbols, self.indices, cursor, bar_sizes=self.bar_sizes)
+
+    def load(self, path: Union[str, Path]) -> int:
+        """从检查点恢复，之后生成的K线会被重新生成
+
+        Returns
+        -------
+        int
+            tick的读取位置。一般用于NPYT.seek()
+
+        """
+        state, indices, cursor, kwargs = load_checkpoint(path, self.symbols)
+        assert np.array_equal(kwargs['bar_sizes'], self.bar_sizes), "bar_sizes mismatch"
+        self.state = state
+        self.indices[:] = indices
+        for a, index in zip(self.arr2s, self.indices):
+            a[1] = index
+        return cursor
@@ -12,8 +12,9 @@ import numpy as np
 from numba import uint64, float32, float64, uint32, typeof, int8
 from numba.experimental import jitclass
 from numba.typed.typeddict import Dict
+from numba.typed.typedlist import List
 
-from qmt_quote.dtypes import DTYPE_STOCK_1m
+from qmt_quote.dtypes import DTYPE_STOCK_1m, DTYPE_STOCK_1m_ID
 
 
 class Bar:
@@ -179,6 +180,9 @@ class BarManager:
 
             bb = self.bars[stock_code]
             if bb.update(t, time):
+                if self.index >= len(self.arr1):
+                    # numba不检查越界，写过头会破坏内存
+                    raise IndexError("bar file is full")
                 bb.index = self.index
                 self.index += 1
             bb.fill(self.arr1[bb.index], stock_code)
@@ -201,3 +205,86 @@ if os.environ.get('NUMBA_DISABLE_JIT', '0') != '1':
         ('arr2', idx_type),
     ]
     BarManager = jitclass(spec)(BarManager)
+
+
+class BarManagerID:
+    """代码为整数编号时使用。按编号直接取下标，不再字符串哈希
+
+    紧凑tick格式需先用`compact.from_compact`还原，这里不检查格式
+    """
+
+    def __init__(self, arr1: np.ndarray, arr2: np.ndarray):
+        tmp = List()
+        tmp.append(Bar(0.0))
+        tmp.clear()
+        self.bars = tmp
+        self.valid = np.zeros(0, dtype=np.bool_)
+
+        self.arr1: np.ndarray = arr1
+        self.arr2: np.ndarray = arr2
+        self.index: int = int(self.arr2[1])
+
+    def reset(self):
+        self.bars.clear()
+        self.valid = np.zeros(0, dtype=np.bool_)
+        self.index = 0
+        self.arr2[1] = 0
+
+    def _grow(self, n: int) -> None:
+        """编号超出范围时扩充"""
+        valid = np.zeros(max(n, len(self.valid) * 2), dtype=np.bool_)
+        valid[:len(self.valid)] = self.valid
+        self.valid = valid
+        while len(self.bars) < len(valid):
+            self.bars.append(Bar(0.0))
+
+    def extend(self, ticks: np.ndarray, get_label, get_label_arg1: float) -> Tuple[int, int, int]:
+        """来ticks数据，更新bar数据
+
+        tick不能重复，使用for_next()来获取
+
+        """
+        last_index = self.index
+        for t in ticks:
+            if t['open'] == 0:
+                # 出现部分股票9点25过几秒open价还是0的情况
+                continue
+            time = get_label(t['time'] // 1000, get_label_arg1) * 1000
+            if time == 0:
+                continue
+            stock_id = t['stock_code']
+            if stock_id >= len(self.valid):
+                self._grow(stock_id + 1)
+            if not self.valid[stock_id]:
+                self.valid[stock_id] = True
+                self.bars[stock_id] = Bar(t['lastClose'])
+
+            bb = self.bars[stock_id]
+            if bb.update(t, time):
+                if self.index >= len(self.arr1):
+                    # numba不检查越界，写过头会破坏内存
+                    raise IndexError("bar file is full")
+                bb.index = self.index
+                self.index += 1
+            bb.fill(self.arr1[bb.index], stock_id)
+        # 记录位子
+        self.arr2[1] = self.index
+        return last_index, self.index, self.index - last_index
+
+
+if os.environ.get('NUMBA_DISABLE_JIT', '0') != '1':
+    tmp1 = List()
+    tmp1.append(Bar(0.0))
+    tmp1.clear()
+
+    idx_type = typeof(np.empty(4, dtype=np.uint64))
+    bar_type = typeof(np.empty(1, dtype=DTYPE_STOCK_1m_ID))
+    valid_type = typeof(np.empty(1, dtype=np.bool_))
+    spec = [
+        ('bars', typeof(tmp1)),
+        ('valid', valid_type),
+        ('index', uint64),
+        ('arr1', bar_type),
+        ('arr2', idx_type),
+    ]
+    BarManagerID = jitclass(spec)(BarManagerID)
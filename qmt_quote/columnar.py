@@ -0,0 +1,219 @@
+"""
+列式K线文件
+
+`NPYT`按行存放结构化数组，`pl.from_numpy`时每一列都要从行中抽出来复制一遍。
+这里每个字段一个`.npy`内存映射文件，polars直接在映射内存上建列，不复制
+
+1. 由写入进程在`BarManager.extend`之后同步改动过的行，与原`NPYT`文件并存
+2. 读取进程按行号范围取数，切片仍是映射内存上的视图。按时间取数时由`RowIndex`得到行号范围，不扫描time列
+3. 数值列零拷贝。`U9`代码列需转换成字符串，先转成整数键再查表，比直接转换快很多。
+   转换结果按行缓存，每次只转换新追加的行。整数编号格式(`DTYPE_STOCK_1m_ID`)则全部零拷贝
+
+Notes
+-----
+零拷贝意味着读到的DataFrame与文件共享内存，写入进程还在更新的K线(最后一根)会在计算过程中变化。
+需要稳定的数据时请用`copy=True`
+
+"""
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import polars as pl
+
+from qmt_quote.row_index import RowIndex
+from qmt_quote.symbols import code_keys
+
+
+class ColumnStore:
+    """一个目录，每个字段一个文件
+
+    Examples
+    --------
+    写入进程
+
+    >>> c1m = ColumnStore(FILE_c1m).save(DTYPE_STOCK_1m, capacity=TOTAL_1m).load(mmap_mode="r+")
+    >>> c1m.write(d1m._a, start, end)
+
+    读取进程
+
+    >>> c1m = ColumnStore(FILE_c1m).load(mmap_mode="r")
+    >>> df = c1m.tail(TAIL_N)
+    >>> df = c1m.between(i1m, 0, label_1m + 1, TAIL_N)
+
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+
+        Parameters
+        ----------
+        path: str
+            目录，如：`M:\\c1m`
+
+        """
+        self.path: Path = Path(path)
+        self.dtype: Optional[np.dtype] = None
+        self._columns = {}
+        # [end, 清空次数]
+        self._meta: Optional[np.ndarray] = None
+        # U9代码查表用，有序键与对应的代码
+        self._keys: np.ndarray = np.empty(0, dtype=np.uint64)
+        self._codes: pl.Series = pl.Series([], dtype=pl.String)
+        # 已转换的字符串列，{列名: (清空次数, 起始行, 字符串列)}
+        self._cache = {}
+
+    def save(self, dtype: np.dtype, capacity: int) -> "ColumnStore":
+        """创建文件。已存在且格式相同时不做任何事"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        schema = self.path / "_dtype.npy"
+        if schema.exists() and np.load(schema).dtype == dtype:
+            old = np.load(self.path / f"{dtype.names[0]}.npy", mmap_mode="r")
+            if len(old) == capacity:
+                return self
+        np.save(schema, np.empty(0, dtype=dtype))
+        for name in dtype.names:
+            np.lib.format.open_memmap(self.path / f"{name}.npy", mode="w+", dtype=dtype[name], shape=(capacity,))
+        np.lib.format.open_memmap(self.path / "_meta.npy", mode="w+", dtype=np.uint64, shape=(4,))
+        return self
+
+    def load(self, mmap_mode: str = "r") -> "ColumnStore":
+        """
+        Parameters
+        ----------
+        mmap_mode
+            r: 只读
+            r+: 读写
+
+        """
+        self.dtype = np.load(self.path / "_dtype.npy").dtype
+        self._columns = {name: np.load(self.path / f"{name}.npy", mmap_mode=mmap_mode) for name in self.dtype.names}
+        self._meta = np.load(self.path / "_meta.npy", mmap_mode=mmap_mode)
+        return self
+
+    def end(self) -> int:
+        return int(self._meta[0])
+
+    def capacity(self) -> int:
+        return len(self._columns[self.dtype.names[0]])
+
+    def clear(self) -> "ColumnStore":
+        self._meta[0] = 0
+        # 行号对应的数据变了，通知读取进程丢弃字符串缓存
+        self._meta[1] += 1
+        return self
+
+    def write(self, arr: np.ndarray, start: int, end: int) -> None:
+        """同步结构化数组中[start, end)行
+
+        Parameters
+        ----------
+        arr: np.ndarray
+            行式数组，一般为`NPYT._a`，dtype需相同
+        start: int
+            起始行
+        end: int
+            结束行，不含
+
+        """
+        if end <= start:
+            return
+        assert end <= self.capacity(), f"ColumnStore is full, capacity={self.capacity()}, end={end}"
+        rows = arr[start:end]
+        for name, col in self._columns.items():
+            col[start:end] = rows[name]
+        if end > self._meta[0]:
+            self._meta[0] = end
+
+    def column(self, name: str, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """单列视图，不复制"""
+        end = self.end() if end is None else end
+        return self._columns[name][start:end]
+
+    def to_polars(self, start: int = 0, end: Optional[int] = None, columns: Optional[Sequence[str]] = None,
+                  copy: bool = False) -> pl.DataFrame:
+        """[start, end)行转polars
+
+        Parameters
+        ----------
+        start: int
+            起始行
+        end: int
+            结束行，不含。None时到当前末尾
+        columns
+            只取部分列
+        copy: bool
+            是否复制。默认零拷贝，与文件共享内存
+
+        """
+        end = self.end() if end is None else end
+        start = max(0, min(start, end))
+        columns = self.dtype.names if columns is None else columns
+        series = []
+        for name in columns:
+            a = self._columns[name][start:end]
+            if a.dtype.kind == 'U':
+                series.append(self._strings(name, start, end))
+            else:
+                series.append(pl.Series(name, np.array(a) if copy else np.asarray(a)))
+        return pl.DataFrame(series)
+
+    def _strings(self, name: str, start: int, end: int) -> pl.Series:
+        """`U9`列[start, end)行转字符串列
+
+        同一行的代码不会变，已转换过的行直接切片，只转换新追加的行。`clear`后缓存作废
+        """
+        generation = int(self._meta[1])
+        g, s0, cached = self._cache.get(name, (-1, 0, None))
+        if g != generation or start < s0 or start > s0 + len(cached):
+            g, s0, cached = generation, start, self._decode(self._columns[name][start:end])
+        elif end > s0 + len(cached):
+            cached = pl.concat([cached, self._decode(self._columns[name][s0 + len(cached):end])], rechunk=False)
+            if cached.n_chunks() > 64:
+                cached = cached.rechunk()
+        self._cache[name] = (g, s0, cached)
+        return cached.slice(start - s0, end - start).alias(name)
+
+    def _decode(self, a: np.ndarray) -> pl.Series:
+        """`U9`数组转字符串列。代码种类很少，查表比逐个转换快"""
+        keys = code_keys(a)
+        pos = np.searchsorted(self._keys, keys).clip(0, max(len(self._keys) - 1, 0))
+        if len(self._keys) == 0 or not np.array_equal(self._keys[pos], keys):
+            # 出现新代码，重建查表
+            codes = np.concatenate([self._codes.to_numpy().astype('U9'), a])
+            self._keys, idx = np.unique(np.concatenate([self._keys, keys]), return_index=True)
+            self._codes = pl.Series(codes[idx], dtype=pl.String)
+        return pl.Series(keys).replace_strict(pl.Series(self._keys), self._codes, return_dtype=pl.String)
+
+    def between(self, index: RowIndex, t0: int, t1: int, n: Optional[int] = None,
+                columns: Optional[Sequence[str]] = None, copy: bool = False) -> pl.DataFrame:
+        """时间在[t0, t1)内的行。由行号索引得到行号范围，不扫描time列
+
+        Parameters
+        ----------
+        index: RowIndex
+            同一K线文件的行号索引
+        t0: int
+            起始时间，ms
+        t1: int
+            结束时间，ms，不含
+        n: int
+            最多取范围内的最后n行。None时不限
+        columns
+            只取部分列
+        copy: bool
+            是否复制
+
+        Notes
+        -----
+        范围内可能夹杂少量其他时间的行，需要精确时再按time过滤
+
+        """
+        rows = index.rows_for_time(t0, t1)
+        start = rows.start if n is None else max(rows.start, rows.stop - n)
+        return self.to_polars(start, rows.stop, columns, copy)
+
+    def tail(self, n: int = 5, columns: Optional[Sequence[str]] = None, copy: bool = False) -> pl.DataFrame:
+        """取尾部数据"""
+        end = self.end()
+        return self.to_polars(end - n, end, columns, copy)
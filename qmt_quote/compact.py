@@ -0,0 +1,101 @@
+"""
+紧凑tick格式的转换
+
+`DTYPE_STOCK_1t`每行184字节，其中`U9`代码36字节，对齐填充和float32价格也占了不少。
+紧凑格式(`compact_tick_dtype`)代码用编号、价格用放大后的int32、时间用当天的偏移、深度可选，
+5档132字节，1档68字节。内存盘和归档文件都相应变小
+
+1. 写入：`TickEncoder`先编码成`DTYPE_STOCK_1t_ID`，再`to_compact`
+2. 读取：`from_compact`还原成`DTYPE_STOCK_1t_ID`。数组版K线引擎(`tick_array`)收到紧凑格式时自动还原；
+   jitclass版`tick_minute`/`tick_day`不检查格式，需先调用`from_compact`，否则时间、价格都不对。
+   `min_m5`输入的是分钟K线，与tick格式无关
+3. 价格放大后取整，A股价格最小变动不小于0.001元，还原后与float32原值相同
+
+"""
+import numpy as np
+
+from qmt_quote.dtypes import DTYPE_STOCK_1t_COMPACT, DTYPE_STOCK_1t_ID, PRICE_SCALE
+
+# 时间字段，紧凑格式中为当天的偏移
+_TIME_FIELDS = ("now", "time")
+# 分块转换，每块都在缓存中，比整列转换快
+_CHUNK = 16384
+
+
+def is_compact(dtype: np.dtype) -> bool:
+    """是否为紧凑tick格式"""
+    return dtype.names is not None and "day" in dtype.names and dtype["lastPrice"].kind == "i"
+
+
+def _is_price(name: str) -> bool:
+    return name in ("lastPrice", "open", "high", "low", "lastClose") or "Price_" in name
+
+
+def to_compact(ticks: np.ndarray, dtype: np.dtype = DTYPE_STOCK_1t_COMPACT, tz: int = 3600 * 8) -> np.ndarray:
+    """标准tick转紧凑格式
+
+    Parameters
+    ----------
+    ticks: np.ndarray
+        tick，代码需为整数编号，如`DTYPE_STOCK_1t_ID`
+    dtype: np.dtype
+        紧凑格式，由`compact_tick_dtype`生成。档位少于原数据时多余的档位丢弃
+    tz: int
+        时区，秒
+
+    """
+    assert ticks.dtype["stock_code"].kind in "iu", "stock_code must be an integer id, use SymbolTable.encode first"
+    out = np.empty(len(ticks), dtype=dtype)
+    for i in range(0, len(ticks), _CHUNK):
+        _to_compact(ticks[i:i + _CHUNK], out[i:i + _CHUNK], tz)
+    return out
+
+
+def _to_compact(ticks: np.ndarray, out: np.ndarray, tz: int) -> None:
+    dtype = out.dtype
+    t = ticks["time"].astype(np.int64) + tz * 1000
+    day = t // 86400000
+    base = day * 86400000
+    out["day"] = day
+    for name in dtype.names:
+        if name == "day":
+            continue
+        if name in _TIME_FIELDS:
+            # now为本地接收时间，与time同一天
+            out[name] = np.clip(ticks[name].astype(np.int64) + tz * 1000 - base, 0, None)
+        elif _is_price(name):
+            out[name] = np.rint(ticks[name].astype(np.float64) * PRICE_SCALE)
+        else:
+            out[name] = ticks[name]
+
+
+def from_compact(arr: np.ndarray, dtype: np.dtype = DTYPE_STOCK_1t_ID, tz: int = 3600 * 8) -> np.ndarray:
+    """紧凑格式还原成标准tick
+
+    Parameters
+    ----------
+    arr: np.ndarray
+        紧凑格式tick
+    dtype: np.dtype
+        标准格式，代码为整数编号。紧凑格式中没有的档位为0
+    tz: int
+        时区，秒
+
+    """
+    out = np.zeros(len(arr), dtype=dtype)
+    for i in range(0, len(arr), _CHUNK):
+        _from_compact(arr[i:i + _CHUNK], out[i:i + _CHUNK], tz)
+    return out
+
+
+def _from_compact(arr: np.ndarray, out: np.ndarray, tz: int) -> None:
+    base = arr["day"].astype(np.int64) * 86400000 - tz * 1000
+    for name in arr.dtype.names:
+        if name == "day":
+            continue
+        if name in _TIME_FIELDS:
+            out[name] = base + arr[name]
+        elif _is_price(name):
+            out[name] = arr[name] / PRICE_SCALE
+        else:
+            out[name] = arr[name]
@@ -98,3 +98,150 @@ DTYPE_SIGNAL_1m = np.dtype([
 ],
     align=True,
 )
+
+
+def with_stock_id(dtype: np.dtype, id_dtype=np.uint32) -> np.dtype:
+    """`stock_code`由`U9`替换成整数编号，得到紧凑格式
+
+    编号是`SymbolTable`中的位置，`U9`占36字节，`uint32`只占4字节。
+    字段名保持不变，解码后下游代码无需修改
+
+    Parameters
+    ----------
+    dtype: np.dtype
+        原格式
+    id_dtype
+        编号类型。uint16最多65536个代码，uint32足够
+
+    """
+    descr = [(name, id_dtype if name == "stock_code" else dtype.fields[name][0]) for name in dtype.names]
+    return np.dtype(descr, align=dtype.isalignedstruct)
+
+
+# 代码表，一行一个代码，行号即编号
+DTYPE_SYMBOL = np.dtype([
+    ("stock_code", "U9"),
+],
+    align=True,
+)
+
+# 复权因子，每只股票每天一行。由日线计算，分钟线按天查表
+DTYPE_FACTOR = np.dtype([
+    ("stock_code", "U9"),
+    ("time", np.uint64),  # 日线时间
+    ("close", np.float64),  # 当天收盘价，用于计算下一天的复权因子
+    ("factor2", np.float64),  # 累乘复权因子，同calc_factor1
+],
+    align=True,
+)
+
+# 最新快照，每只股票一行，行号即K线引擎中的编号。字段名同get_full_tick。涨跌停价tick中没有，由盘前参考数据写入
+DTYPE_SNAPSHOT = np.dtype([
+    ("stock_code", "U9"),
+    ("time", np.uint64),  # 最新tick时间
+    ("type", np.int8),  # InstrumentType
+    ("lastPrice", np.float32),
+    ("open", np.float32),
+    ("high", np.float32),
+    ("low", np.float32),
+    ("lastClose", np.float32),
+    ("amount", np.float64),
+    ("volume", np.uint64),
+    ("avg_price", np.float32),
+    ("askPrice_1", np.float32),
+    ("bidPrice_1", np.float32),
+    ("askVol_1", np.uint32),
+    ("bidVol_1", np.uint32),
+    ("askVol_2", np.uint32),
+    ("bidVol_2", np.uint32),
+    ("UpStopPrice", np.float64),  # 涨停价，见Snapshot.update_limits
+    ("DownStopPrice", np.float64),  # 跌停价
+],
+    align=True,
+)
+
+# 时间索引，每个时间段一行。[first, last)内包含该时间段的全部行，可能夹杂少量其他时间段的行
+DTYPE_TIME_INDEX = np.dtype([
+    ("time", np.uint64),
+    ("first", np.uint64),
+    ("last", np.uint64),
+],
+    align=True,
+)
+
+# 延时记录，每批一行。时间为ns时间戳，跨进程可比
+DTYPE_LATENCY = np.dtype([
+    ("time", np.uint64),  # 本批最新tick的交易所时间，ms。按分钟统计时用
+    ("start", np.int64),
+    ("end", np.int64),
+    ("rows", np.uint32),
+    ("stage", np.int8),  # LatencyStage
+],
+    align=True,
+)
+
+# 盘前参考数据，每只股票一行，按代码排序。每天生成一次，见RefData
+DTYPE_REF = np.dtype([
+    ("stock_code", "U9"),
+    ("InstrumentName", "U16"),
+    ("PreClose", np.float64),
+    ("UpStopPrice", np.float64),  # 涨停价
+    ("DownStopPrice", np.float64),  # 跌停价
+    ("PriceTick", np.float64),  # 最小变动单位
+    ("board_type", np.int8),  # BoardType
+    ("is_st", np.bool_),
+    ("is_delisting", np.bool_),
+],
+    align=True,
+)
+
+# 整数编号代码的紧凑格式
+DTYPE_STOCK_1t_ID = with_stock_id(DTYPE_STOCK_1t)
+DTYPE_STOCK_1m_ID = with_stock_id(DTYPE_STOCK_1m)
+DTYPE_SIGNAL_1t_ID = with_stock_id(DTYPE_SIGNAL_1t)
+DTYPE_SIGNAL_1m_ID = with_stock_id(DTYPE_SIGNAL_1m)
+DTYPE_FACTOR_ID = with_stock_id(DTYPE_FACTOR)
+
+# 价格放大倍数。A股最小变动0.001元(基金)，放大后用int32无损保存
+PRICE_SCALE = 1000
+
+
+def compact_tick_dtype(level: int = 5, id_dtype=np.uint32) -> np.dtype:
+    """紧凑tick格式，约为`DTYPE_STOCK_1t`的一半
+
+    1. 代码为整数编号，配合`SymbolTable`
+    2. 价格为int32，单位为1/PRICE_SCALE元
+    3. 时间为当天0点(本地时区)起的毫秒数，日期单独存为1970年起的天数
+    4. 深度行情只保留level档
+    5. 不对齐，没有填充字节
+
+    Parameters
+    ----------
+    level: int
+        行情深度，1或5
+    id_dtype
+        编号类型
+
+    """
+    descr = [
+        ("stock_code", id_dtype),
+        ("day", np.uint16),  # 1970年起的天数，本地时区
+        ("now", np.uint32),  # 当天0点起的毫秒数
+        ("time", np.uint32),  # 当天0点起的毫秒数
+        ("lastPrice", np.int32),
+        ("open", np.int32),
+        ("high", np.int32),
+        ("low", np.int32),
+        ("lastClose", np.int32),
+        ("amount", np.float64),
+        ("volume", np.uint64),
+        ("openInt", np.int8),
+        ("type", np.int8),
+    ]
+    descr += [(f"{d}Price_{i + 1}", np.int32) for d in ("ask", "bid") for i in range(level)]
+    descr += [(f"{d}Vol_{i + 1}", np.uint32) for d in ("ask", "bid") for i in range(level)]
+    return np.dtype(descr, align=False)
+
+
+DTYPE_STOCK_1t_COMPACT = compact_tick_dtype(5)
+DTYPE_STOCK_1t_COMPACT1 = compact_tick_dtype(1)
@@ -59,3 +59,64 @@ class BoardTypeT(NamedTuple):
 
 
 BoardType = BoardTypeT()
+
+
+class LatencyStageT(NamedTuple):
+    # 交易所时间到本地收到，取一次推送中最新的tick
+    Receive: int = 0
+    # 编码并写入d1t
+    Ingest: int = 1
+    # tick更新K线
+    Bars: int = 2
+    # 计算因子
+    Factor: int = 3
+    # 写入信号
+    Signal: int = 4
+    # 分钟切换到信号写完
+    Trigger: int = 5
+
+
+LatencyStage = LatencyStageT()
+
+
+class DispatchStatusT(NamedTuple):
+    # 排队中，含等待重试
+    Pending: int = 0
+    # 已发出，等待异步回报
+    Sent: int = 1
+    # 柜台已受理
+    Done: int = 2
+    # 重试次数用完，放弃
+    Failed: int = 3
+
+
+DispatchStatus = DispatchStatusT()
+
+
+class OrderStatusT(NamedTuple):
+    """委托状态，与xtconstant中的ORDER_*相同"""
+    # 未报
+    Unreported: int = 48
+    # 待报
+    WaitReporting: int = 49
+    # 已报
+    Reported: int = 50
+    # 已报待撤
+    ReportedCancel: int = 51
+    # 部成待撤
+    PartSuccCancel: int = 52
+    # 部撤
+    PartCancel: int = 53
+    # 已撤
+    Canceled: int = 54
+    # 部成
+    PartSucc: int = 55
+    # 已成
+    Succeeded: int = 56
+    # 废单
+    Junk: int = 57
+    # 未知
+    Unknown: int = 255
+
+
+OrderStatus = OrderStatusT()
@@ -0,0 +1,185 @@
+"""
+复权因子缓存
+
+`calc_factor1`每次都要全表排序，再分组计算复权因子。但复权因子只在换日时才会变化，
+所以开盘前由历史日线算好每只股票每天的`factor2`，保存成旁路文件。
+盘中只需补算当天一行，然后按 (代码, 日期) 查表，不再排序
+
+1. 历史部分：`prepare_mmap`中由日线生成并保存，盘中只读
+2. 当天部分：由当天日线的`preClose`与昨天收盘价算出，`update`时补上
+3. 分钟线、5分钟线都按日期查同一张表。factor1(当天的除权比例)也存在表中，查表时不做窗口排序
+
+"""
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import polars as pl
+from npyt import NPYT
+
+from qmt_quote.dtypes import DTYPE_FACTOR, with_stock_id
+from qmt_quote.utils import calc_factor1
+
+
+def _day(col: str = 'time', tz: int = 3600 * 8) -> pl.Expr:
+    """ms时间戳转日期序号，用于查表"""
+    return ((pl.col(col).cast(pl.Int64) // 1000 + tz) // 86400).alias('_day')
+
+
+class FactorCache:
+    """复权因子缓存
+
+    Examples
+    --------
+    开盘前
+
+    >>> FactorCache.from_bars(d1d.data()).save(FILE_factor)
+
+    盘中
+
+    >>> factors = FactorCache().load(FILE_factor)
+    >>> factors.update(d1d.data())
+    >>> df = factors.apply(pl.from_numpy(d1m.tail(TAIL_N)))
+
+    """
+
+    def __init__(self, history: Optional[pl.DataFrame] = None, tz: int = 3600 * 8):
+        """
+
+        Parameters
+        ----------
+        history: pl.DataFrame
+            历史复权因子，字段同DTYPE_FACTOR
+        tz: int
+            时区，秒
+
+        """
+        self.tz: int = tz
+        self.cursor: int = 0
+        self.live: Optional[pl.DataFrame] = None
+        self._set_history(pl.DataFrame(schema={
+            'stock_code': pl.String, 'time': pl.UInt64, 'close': pl.Float64, 'factor2': pl.Float64,
+        }) if history is None else history)
+
+    def _set_history(self, history: pl.DataFrame) -> None:
+        self.history = history.with_columns(_day(tz=self.tz))
+        # 每只股票最后一天，用于补算之后的复权因子
+        self._last = self.history.group_by('stock_code').agg(
+            _day_last=pl.col('_day').max(),
+            close_last=pl.col('close').sort_by('_day').last(),
+            factor2_last=pl.col('factor2').sort_by('_day').last(),
+        )
+        self._max_day = self.history['_day'].max()
+        self.cursor = 0
+        # 游标前一行的时间，用于检查数据是否被重写或整体前移
+        self._check = None
+        self.live = None
+        # 历史部分的factor1只在加载时排序计算一次
+        self._history_table = (
+            self.history.select('stock_code', '_day', 'factor2')
+            .sort('stock_code', '_day')
+            .with_columns(factor1=(pl.col('factor2') / pl.col('factor2').shift(1)).over('stock_code')
+                          .fill_null(1).round(8))
+            .select('stock_code', '_day', 'factor1', 'factor2')
+        )
+        self._table = self._history_table
+        # 每只股票最近一天的factor2，表中没有的日期用它
+        self._latest = self._last.select('stock_code', _factor2=pl.col('factor2_last'))
+
+    @classmethod
+    def from_bars(cls, arr: np.ndarray, tz: int = 3600 * 8) -> "FactorCache":
+        """由日线计算历史复权因子
+
+        Parameters
+        ----------
+        arr: np.ndarray
+            日线，一般为`d1d.data()`。只在开盘前调用，结果与calc_factor1相同
+        tz: int
+            时区，秒
+
+        """
+        df = calc_factor1(pl.from_numpy(arr))
+        return cls(df.select(DTYPE_FACTOR.names), tz=tz)
+
+    def save(self, path: Union[str, Path]) -> "FactorCache":
+        """保存历史部分"""
+        df = self.history.select(DTYPE_FACTOR.names)
+        dtype = DTYPE_FACTOR if df.schema['stock_code'] == pl.String else with_stock_id(DTYPE_FACTOR)
+        arr = df.to_numpy(structured=True).astype(dtype)
+        f = NPYT(path, dtype=dtype).save(capacity=max(len(arr), 1)).load(mmap_mode="r+")
+        f.clear().append(arr)
+        return self
+
+    def load(self, path: Union[str, Path]) -> "FactorCache":
+        """加载历史部分"""
+        arr = NPYT(path).load(mmap_mode="r").data()
+        self._set_history(pl.from_numpy(arr))
+        return self
+
+    def update(self, arr: np.ndarray) -> None:
+        """由日线补算历史之后的复权因子。每次K线更新后调用，只处理新增的行
+
+        Parameters
+        ----------
+        arr: np.ndarray
+            日线，一般为`d1d.data()`，需包含历史部分
+
+        """
+        if len(arr) < self.cursor or (self._check is not None and arr[self.cursor - 1]['time'] != self._check):
+            # 数据被清空重写，或滚动丢弃了前面的行
+            self.cursor = 0
+            self._check = None
+        if self.cursor == 0 and self._max_day is not None and len(arr) > 0:
+            # 跳过历史部分。之后只会在尾部追加或更新
+            day = (arr['time'].astype(np.int64) // 1000 + self.tz) // 86400
+            newer = np.flatnonzero(day > self._max_day)
+            self.cursor = int(newer[0]) if len(newer) > 0 else len(arr)
+            self._check = arr[self.cursor - 1]['time'] if self.cursor > 0 else None
+
+        df = pl.from_numpy(arr[self.cursor:]).select('stock_code', 'time', 'close', 'preClose')
+        df = (
+            df
+            .with_columns(_day(tz=self.tz))
+            .join(self._last, on='stock_code', how='left')
+            .filter(pl.col('_day_last').is_null() | (pl.col('_day') > pl.col('_day_last')))
+            # 一般只有当天一行，排序量很小
+            .sort('stock_code', '_day')
+            .with_columns(
+                factor1=(pl.col('close').shift(1).over('stock_code')
+                         .fill_null(pl.coalesce('close_last', 'preClose')) / pl.col('preClose')).round(8))
+            .with_columns(
+                factor2=pl.col('factor2_last').fill_null(1) * pl.col('factor1').cum_prod().over('stock_code'))
+        )
+        live = df.select('stock_code', '_day', pl.col('factor1').cast(pl.Float64), 'factor2')
+        if self.live is not None and live.equals(self.live):
+            # 当天的复权因子一般不变，不必重新拼表
+            return
+        self.live = live
+        self._table = pl.concat([self._history_table, live])
+        # live已按(代码, 日期)排序
+        latest = live.group_by('stock_code').agg(_factor2=pl.col('factor2').last())
+        self._latest = pl.concat([self._last.select('stock_code', _factor2=pl.col('factor2_last'))
+                                 .join(latest, on='stock_code', how='anti'), latest])
+
+    def apply(self, df: pl.DataFrame) -> pl.DataFrame:
+        """按 (代码, 日期) 查表添加factor1/factor2列，用于替代calc_factor1
+
+        Notes
+        -----
+        表中没有的日期(如未调用update)，用该股票最近一天的复权因子。
+        factor1与calc_factor1相同：每只股票第一行为1，同一天内为1，换日行为当天的除权比例。
+        K线按时间追加，同一只股票的行序即时间序，用首次出现判断换日，不用排序
+
+        """
+        df = df.with_columns(_day(tz=self.tz)).join(self._table, on=['stock_code', '_day'], how='left',
+                                                    maintain_order='left')
+        if df['factor2'].null_count() > 0:
+            df = (
+                df.join(self._latest, on='stock_code', how='left', maintain_order='left')
+                .with_columns(pl.col('factor2').fill_null(pl.col('_factor2')))
+                .drop('_factor2')
+            )
+        day_first = pl.struct('stock_code', '_day').is_first_distinct() & ~pl.col('stock_code').is_first_distinct()
+        df = df.with_columns(factor1=pl.when(day_first).then(pl.col('factor1').fill_null(1)).otherwise(1.0))
+        # 列顺序同calc_factor1
+        return df.select(pl.exclude('_day', 'factor1', 'factor2'), 'factor1', 'factor2')
@@ -0,0 +1,224 @@
+"""
+本地回放的xtdata
+
+没有QMT时(如Linux服务器)，把录制的tick或合成行情还原成全推的嵌套字典，按设定速度调用`subscribe_whole_quote`的回调。
+`subscribe_tick.py`不用改动就能压测接收链路
+
+1. 录制的tick按`now`分组，一组就是当时的一次推送；合成行情每批为一次推送
+2. `speed=1`按录制时的间隔推送，10为10倍速，0为不等待
+3. 每次回调的行数、开始时间和耗时记录在`stats`中，可算出接收吞吐和回调延时
+4. 板块只按类型区分：沪深A股、沪深指数、沪深基金
+
+"""
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union, Iterator, Callable
+
+import numpy as np
+
+from qmt_quote.dtypes import DTYPE_STOCK_1t
+from qmt_quote.enums import InstrumentType
+from qmt_quote.symbols import SymbolTable
+
+# 板块名到类型
+SECTORS = {
+    "沪深A股": (InstrumentType.Stock,),
+    "沪深指数": (InstrumentType.Index,),
+    "沪深基金": (InstrumentType.Fund, InstrumentType.ETF),
+}
+
+
+def _depth_names(dtype: np.dtype) -> Dict[str, List[str]]:
+    """深度行情的列，如：{'askPrice': ['askPrice_1', ...]}"""
+    out = {}
+    for name in dtype.names:
+        head, _, level = name.rpartition('_')
+        if head and level.isdigit():
+            out.setdefault(head, []).append(name)
+    return out
+
+
+def to_push(arr: np.ndarray, codes: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """结构化数组 转 全推的嵌套字典，`TickEncoder.encode`的逆过程
+
+    Parameters
+    ----------
+    arr: np.ndarray
+        一次推送的tick
+    codes: list of str
+        代码。None时取自`arr['stock_code']`
+
+    """
+    depths = _depth_names(arr.dtype)
+    skip = {'stock_code', 'now', 'type'} | {c for cols in depths.values() for c in cols}
+    names = [c for c in arr.dtype.names if c not in skip]
+    # 按列转成list，比逐行取值快得多
+    values = [arr[c].tolist() for c in names]
+    names.append('pvolume')
+    values.append((arr['volume'] * 100).tolist())
+    for d, cols in depths.items():
+        names.append(d)
+        values.append(np.stack([arr[c] for c in cols], axis=1).tolist())
+    if codes is None:
+        codes = arr['stock_code'].tolist()
+    return {code: dict(zip(names, row)) for code, row in zip(codes, zip(*values))}
+
+
+class FakeXtData:
+    """本地回放的xtdata，只实现接收行情用到的函数
+
+    Examples
+    --------
+    >>> xtdata = use_quote_source("fake", path=r"D:\\backup\\20250228\\d1t", speed=10)
+    >>> xtdata.subscribe_whole_quote(["SH", "SZ"], func)
+    >>> xtdata.run()
+    >>> print(xtdata.summary())
+
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, speed: float = 1.0, max_wait: float = 60.0,
+                 symbols: Optional[SymbolTable] = None, n_assets: int = 5000, date: str = "2025-02-28",
+                 interval: int = 3):
+        """
+
+        Parameters
+        ----------
+        path: str
+            录制的tick，`d1t.npy`或`archive.py`生成的归档目录。None时用合成行情
+        speed: float
+            推送速度。1为实际速度，大于1为加速，0为不等待
+        max_wait: float
+            两次推送最多等待的秒数(录制时间)，午休时不会真的等一个半小时
+        symbols: SymbolTable
+            代码表。录制的tick为整数编号格式时必填
+        n_assets: int
+            合成行情的股票数量
+        date: str
+            合成行情的交易日
+        interval: int
+            合成行情的推送间隔，秒
+
+        """
+        self.path = path
+        self.speed: float = speed
+        self.max_wait: float = max_wait
+        self.symbols: Optional[SymbolTable] = symbols
+        self.n_assets: int = n_assets
+        self.date: str = date
+        self.interval: int = interval
+        # 最新的tick，get_full_tick用
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        # 每次回调的(行数, 开始时间, 耗时)，秒
+        self.stats: List[tuple] = []
+        self._sectors: Optional[Dict[int, List[str]]] = None
+        self._threads: Dict[int, threading.Thread] = {}
+        self._stop: Dict[int, threading.Event] = {}
+
+    def _pushes(self) -> Iterator[np.ndarray]:
+        """逐次推送的tick"""
+        if self.path is None:
+            from qmt_quote.synthetic import iter_ticks
+            yield from iter_ticks(self.n_assets, self.date, self.interval)
+            return
+        from qmt_quote.replay import open_ticks
+        reader = open_ticks(self.path)
+        pending = None
+        while len(arr := reader.read(n=1024 * 1024)) > 0:
+            if pending is not None:
+                arr = np.concatenate([pending, arr])
+            # 同一次回调的now相同
+            cuts = np.flatnonzero(np.diff(arr['now'])) + 1
+            starts = np.r_[0, cuts]
+            for a, b in zip(starts[:-1], starts[1:]):
+                yield arr[a:b]
+            # 最后一组可能还没读完
+            pending = arr[starts[-1]:].copy()
+        if pending is not None and len(pending) > 0:
+            yield pending
+
+    def _codes(self, arr: np.ndarray) -> Optional[List[str]]:
+        if arr.dtype['stock_code'].kind in 'iu':
+            assert self.symbols is not None, "symbols is required when stock_code is an integer id"
+            return self.symbols.decode(arr['stock_code']).tolist()
+        return None
+
+    def _load_sectors(self) -> Dict[int, List[str]]:
+        """由第一次推送得到各类型的代码"""
+        if self._sectors is None:
+            arr = next(self._pushes(), np.empty(0, dtype=DTYPE_STOCK_1t))
+            codes = self._codes(arr) or arr['stock_code'].tolist()
+            self._sectors = {}
+            for code, type in zip(codes, arr['type'].tolist()):
+                self._sectors.setdefault(type, []).append(code)
+        return self._sectors
+
+    def download_sector_data(self) -> None:
+        pass
+
+    def get_sector_list(self) -> List[str]:
+        return list(SECTORS)
+
+    def get_stock_list_in_sector(self, sector_name: str) -> List[str]:
+        sectors = self._load_sectors()
+        return [c for t in SECTORS.get(sector_name, ()) for c in sectors.get(t, [])]
+
+    def get_full_tick(self, code_list: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {c: self.latest[c] for c in code_list if c in self.latest}
+
+    def _run(self, callback: Callable, stop: threading.Event) -> None:
+        last = None
+        clock = time.perf_counter()
+        for arr in self._pushes():
+            if stop.is_set():
+                break
+            now = int(arr['now'][0])
+            if self.speed > 0 and last is not None:
+                remain = clock + min(now - last, self.max_wait * 1000) / 1000 / self.speed - time.perf_counter()
+                if remain > 0:
+                    time.sleep(remain)
+            last = now
+            clock = time.perf_counter()
+            datas = to_push(arr, self._codes(arr))
+            self.latest.update(datas)
+            t = time.perf_counter()
+            callback(datas)
+            self.stats.append((len(arr), t, time.perf_counter() - t))
+
+    def subscribe_whole_quote(self, code_list: List[str], callback: Callable = None) -> int:
+        """开始回放，在后台线程中调用回调。code_list只为与xtdata接口相同
+
+        Returns
+        -------
+        int
+            订阅号，用于unsubscribe_quote
+
+        """
+        seq = len(self._threads) + 1
+        stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(callback, stop), daemon=True)
+        self._threads[seq] = thread
+        self._stop[seq] = stop
+        thread.start()
+        return seq
+
+    def unsubscribe_quote(self, seq: int) -> None:
+        self._stop[seq].set()
+
+    def run(self) -> None:
+        """等待全部回放结束"""
+        for thread in self._threads.values():
+            thread.join()
+
+    def summary(self) -> Dict[str, float]:
+        """接收统计。行数、回调次数、每秒行数、回调耗时的中位数和p99，ms"""
+        if len(self.stats) == 0:
+            return {}
+        rows, _, cost = np.array(self.stats).T
+        return {
+            "rows": int(rows.sum()),
+            "calls": len(rows),
+            "rows_per_sec": float(rows.sum() / max(cost.sum(), 1e-9)),
+            "p50_ms": float(np.percentile(cost, 50) * 1000),
+            "p99_ms": float(np.percentile(cost, 99) * 1000),
+        }
@@ -0,0 +1,221 @@
+"""
+增量因子计算
+
+`last_factor`每次都对TAIL_N行重新排序、计算复权因子、计算时序指标，耗时与 窗口长度×股票数 成正比。
+而实盘中只有每只股票最新的K线在变化，所以这里为每只股票维护状态：
+
+1. 复权：上一根K线收盘价、累乘的复权因子`factor2`
+2. 时序：最近`window-1`根已完成K线的复权收盘价，环形存放
+
+每次调用只把新完成的K线推入状态，再用 状态+当前K线 计算因子，耗时只与新K线数量和股票数有关。
+
+1. 已完成的K线(time < filter_label)推入状态，之后不再变化
+2. 当前K线(time == filter_label)不推入状态，每次临时计算
+3. 数据格式变化、数据被清空或重写时，状态全部重建，相当于一次全量计算
+
+Examples
+--------
+>>> inc = IncrementalFactor(factor_func, window=11)
+>>> df = inc.last_factor(d1m.data(), label_1m)
+
+结果与`last_factor(d1m.data(), factor_func_full, label_1m, label_1m)`一致，
+只是复权起点不同，复权价相差一个常数倍，收益率、排名等不受影响
+
+"""
+from typing import Callable, Optional
+
+import numpy as np
+import polars as pl
+from numba import njit
+
+from qmt_quote.enums import InstrumentType
+from qmt_quote.symbols import SymbolTable
+from qmt_quote.utils import cast_datetime
+
+
+def ts_mean(x: np.ndarray, d: int) -> np.ndarray:
+    """简单移动平均。x为(股票数, window)的窗口，最后一列为当前值。不足d个时为nan"""
+    return x[:, -d:].mean(axis=1)
+
+
+def ts_returns(x: np.ndarray, d: int = 1) -> np.ndarray:
+    """简单收益率。不足d+1个时为nan"""
+    return x[:, -1] / x[:, -1 - d] - 1
+
+
+@njit(cache=True)
+def _push(arr: np.ndarray, ids: np.ndarray, start: int, filter_label: int, stock_type: int,
+          last_time: np.ndarray, last_close: np.ndarray, factor2: np.ndarray,
+          buf: np.ndarray, pos: np.ndarray, count: np.ndarray) -> int:
+    """已完成的K线推入状态
+
+    Returns
+    -------
+    int
+        第一根未完成K线的位置，下次从这里开始
+
+    """
+    size = buf.shape[1]
+    cursor = len(arr)
+    for i in range(start, len(arr)):
+        t = arr[i]
+        if t['type'] != stock_type:
+            continue
+        if t['time'] >= filter_label:
+            if i < cursor:
+                cursor = i
+            continue
+        k = ids[i - start]
+        if t['time'] <= last_time[k]:
+            # 之前已推入
+            continue
+        if count[k] > 0:
+            # 同calc_factor1，第一根K线复权因子为1
+            factor2[k] *= np.round(last_close[k] / t['preClose'], 8)
+        buf[k, pos[k]] = t['close'] * factor2[k]
+        pos[k] = (pos[k] + 1) % size
+        count[k] += 1
+        last_close[k] = t['close']
+        last_time[k] = t['time']
+    return cursor
+
+
+class IncrementalFactor:
+    """增量版`last_factor`，只处理股票"""
+
+    def __init__(self, func: Callable[[pl.DataFrame, np.ndarray], pl.DataFrame], window: int,
+                 symbols: Optional[SymbolTable] = None, n_symbols: int = 8192):
+        """
+
+        Parameters
+        ----------
+        func
+            因子计算函数。输入为当前K线的DataFrame(已含factor1/factor2/CLOSE)，
+            与对应的复权收盘价窗口，(股票数, window)，最后一列为当前K线，不足时为nan
+        window: int
+            窗口长度，含当前K线。如ts_mean(CLOSE, 10)与ts_returns(CLOSE, 5)时至少为10
+        symbols: SymbolTable
+            代码表。数据为整数编号格式时，计算完成后再将编号转回代码
+        n_symbols: int
+            初始股票数量，不够时自动扩充
+
+        """
+        assert window >= 2
+        self.func = func
+        self.window: int = window
+        self.symbols: Optional[SymbolTable] = symbols
+        # 代码为U9时内部编号用
+        self._table: SymbolTable = SymbolTable()
+        self.n_symbols: int = n_symbols
+        self.reset()
+
+    def reset(self) -> None:
+        """清空状态，下次调用时全量重建"""
+        n = self.n_symbols
+        self.dtype: Optional[np.dtype] = None
+        self.cursor: int = 0
+        # 最后推入的一行，用于检查数据是否被重写
+        self._check = None
+        self.last_time = np.zeros(n, dtype=np.uint64)
+        self.last_close = np.zeros(n, dtype=np.float64)
+        self.factor2 = np.ones(n, dtype=np.float64)
+        self.buf = np.zeros((n, self.window - 1), dtype=np.float64)
+        self.pos = np.zeros(n, dtype=np.int64)
+        self.count = np.zeros(n, dtype=np.int64)
+
+    def _grow(self, n: int) -> None:
+        size = len(self.count)
+        if n <= size:
+            return
+        n = max(n, size * 2)
+        self.last_time = np.concatenate([self.last_time, np.zeros(n - size, dtype=np.uint64)])
+        self.last_close = np.concatenate([self.last_close, np.zeros(n - size, dtype=np.float64)])
+        self.factor2 = np.concatenate([self.factor2, np.ones(n - size, dtype=np.float64)])
+        self.buf = np.concatenate([self.buf, np.zeros((n - size, self.window - 1), dtype=np.float64)])
+        self.pos = np.concatenate([self.pos, np.zeros(n - size, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(n - size, dtype=np.int64)])
+
+    def _ids(self, codes: np.ndarray) -> np.ndarray:
+        if codes.dtype.kind in 'iu':
+            ids = codes.astype(np.int64)
+        else:
+            ids = self._table.encode(codes, dtype=np.int64)
+        if len(ids) > 0:
+            self._grow(int(ids.max()) + 1)
+        return ids
+
+    def _is_stale(self, arr: np.ndarray) -> bool:
+        """数据格式变化，或已推入的数据被清空、重写"""
+        if self.dtype is None:
+            return False
+        if arr.dtype != self.dtype or len(arr) < self.cursor:
+            return True
+        if self._check is not None:
+            i, t, c = self._check
+            return i >= len(arr) or arr[i]['time'] != t or arr[i]['stock_code'] != c
+        return False
+
+    def update(self, arr: np.ndarray, filter_label: int) -> None:
+        """新完成的K线推入状态
+
+        Parameters
+        ----------
+        arr: np.ndarray
+            全部K线，一般为`NPYT.data()`。下标需稳定，只能在尾部追加或更新
+        filter_label: int
+            当前K线标签，ms。之前的K线视为已完成
+
+        """
+        if self._is_stale(arr):
+            self.reset()
+        self.dtype = arr.dtype
+
+        start = self.cursor
+        ids = self._ids(arr['stock_code'][start:])
+        cursor = _push(arr, ids, start, filter_label, InstrumentType.Stock,
+                       self.last_time, self.last_close, self.factor2, self.buf, self.pos, self.count)
+        if cursor > 0:
+            self._check = (cursor - 1, arr[cursor - 1]['time'], arr[cursor - 1]['stock_code'])
+        self.cursor = cursor
+
+    def last_factor(self, arr: np.ndarray, filter_label: int) -> pl.DataFrame:
+        """获取当前K线的因子值
+
+        Parameters
+        ----------
+        arr: np.ndarray
+            全部K线，一般为`NPYT.data()`
+        filter_label: int
+            当前K线标签，ms。同`last_factor`中filter_label1=filter_label2=filter_label
+
+        """
+        self.update(arr, filter_label)
+
+        arr = arr[self.cursor:]
+        arr = arr[(arr['time'] == filter_label) & (arr['type'] == InstrumentType.Stock)]
+        ids = self._ids(arr['stock_code'])
+
+        # 当前K线临时复权，不改变状态
+        has_prev = self.count[ids] > 0
+        factor1 = np.ones(len(ids), dtype=np.float64)
+        factor1[has_prev] = np.round(self.last_close[ids][has_prev] / arr['preClose'][has_prev], 8)
+        factor2 = self.factor2[ids] * factor1
+        close = arr['close'] * factor2
+
+        # 按时间先后排列窗口，不足的部分为nan
+        size = self.window - 1
+        cols = (self.pos[ids, None] + np.arange(size)) % size
+        hist = self.buf[ids[:, None], cols]
+        hist[np.arange(size) < size - self.count[ids, None]] = np.nan
+        window = np.concatenate([hist, close[:, None]], axis=1)
+
+        df = pl.from_numpy(arr).with_columns(
+            pl.Series('factor1', factor1),
+            pl.Series('factor2', factor2),
+            pl.Series('CLOSE', close),
+        )
+        df = self.func(df, window)
+        if self.symbols is not None:
+            df = self.symbols.decode_frame(df)
+        df = cast_datetime(df, col=pl.col('time', 'open_dt', 'close_dt'))
+        return df
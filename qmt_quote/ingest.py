@@ -0,0 +1,200 @@
+"""
+全推行情直接编码成结构化数组
+
+`ticks_to_dataframe`需要经过pandas中转，深度行情还要逐格拆分，全推时间长了会堵塞回调线程。
+这里按列批量填充到预分配的缓冲区中，然后直接交给`NPYT.append`
+
+"""
+from typing import Dict, Any, List, Sequence, Iterable, Mapping, Optional
+
+import numpy as np
+
+from qmt_quote.dtypes import DTYPE_STOCK_1t
+from qmt_quote.enums import InstrumentType
+from qmt_quote.symbols import SymbolTable
+
+
+def build_type_map(sectors: Mapping[int, Iterable[str]]) -> Dict[str, int]:
+    """板块成分 转 代码到类型的映射。开盘前构建一次，回调中直接查表
+
+    Parameters
+    ----------
+    sectors: dict
+        类型到代码列表的映射。如：{InstrumentType.Stock: G.沪深A股, InstrumentType.Index: G.沪深指数}
+
+    Notes
+    -----
+    同一代码出现在多个板块中时，后面的覆盖前面的。所以ETF要放在基金之后
+
+    """
+    return {code: int(type) for type, codes in sectors.items() for code in codes}
+
+
+def _stack_depths(values: List[Dict[str, Any]], depths: Sequence[str], level: int) -> np.ndarray:
+    """深度行情堆叠成(n, len(depths), level)的数组
+
+    正常情况下一次np.array就能完成。档位长度不一致时，才逐个补齐
+    """
+    try:
+        arr = np.array([[v[d] for d in depths] for v in values], dtype=np.float64)
+        if arr.ndim == 3 and arr.shape[2] >= level:
+            return arr[:, :, :level]
+    except ValueError:
+        # 档位长度不一致，无法直接构造
+        pass
+
+    arr = np.zeros((len(values), len(depths), level), dtype=np.float64)
+    for i, v in enumerate(values):
+        for j, d in enumerate(depths):
+            x = v[d][:level]
+            arr[i, j, :len(x)] = x
+    return arr
+
+
+class TickEncoder:
+    """全推行情编码器
+
+    字典嵌套字典 转 结构化数组。缓冲区预先分配，不够时自动扩充
+
+    Examples
+    --------
+    >>> encoder = TickEncoder(DTYPE_STOCK_1t, capacity=TOTAL_ASSET, level=5)
+    >>> arr = encoder.encode(datas, now=now_ms, type=InstrumentType.Stock)
+    >>> d1t.append(arr)
+
+    """
+
+    def __init__(self, dtype: np.dtype = DTYPE_STOCK_1t, capacity: int = 8192, level: int = 5,
+                 depths=["askPrice", "bidPrice", "askVol", "bidVol"],
+                 index_name: str = 'stock_code', symbols: Optional[SymbolTable] = None):
+        """
+
+        Parameters
+        ----------
+        dtype: np.dtype
+            保存的数据格式
+        capacity: int
+            缓冲区初始大小。一般设置成资产数量
+        level: int
+            行情深度
+        depths
+            深度行情列名
+        index_name: str
+            资产名
+        symbols: SymbolTable
+            代码表。dtype中代码为整数编号时必填，如`DTYPE_STOCK_1t_ID`
+
+        """
+        self.dtype: np.dtype = dtype
+        self.level: int = level
+        self.depths: List[str] = list(depths)
+        self.index_name: str = index_name
+        self.symbols: Optional[SymbolTable] = symbols
+        self.use_id: bool = dtype[index_name].kind in 'iu'
+        assert not self.use_id or symbols is not None, "symbols is required when stock_code is an integer id"
+
+        # 深度行情展开后的列名，depth_columns[j][i]对应depths[j]的第i+1档
+        self.depth_columns: List[List[str]] = [[f'{d}_{i + 1}' for i in range(level)] for d in self.depths]
+        _depth_names = {c for cols in self.depth_columns for c in cols}
+        # 字典中直接对应的标量字段
+        self.scalar_columns: List[str] = [c for c in dtype.names if
+                                          c not in _depth_names and c not in (index_name, 'now', 'type')]
+
+        self.buffer: np.ndarray = np.zeros(capacity, dtype=dtype)
+
+    def reserve(self, n: int) -> None:
+        """确保缓冲区至少能放n行"""
+        if n > len(self.buffer):
+            self.buffer = np.zeros(max(n, len(self.buffer) * 2), dtype=self.dtype)
+
+    def encode(self, datas: Dict[str, Dict[str, Any]], now: int, type: InstrumentType = -1) -> np.ndarray:
+        """字典嵌套字典 转 结构化数组
+
+        Parameters
+        ----------
+        datas : dict
+            字典数据
+        now :int
+            当前时间戳
+        type:
+            类型
+
+        Returns
+        -------
+        np.ndarray
+            缓冲区的视图。下次调用时会被覆盖，需要保留时请copy
+
+        """
+        n = len(datas)
+        self.reserve(n)
+        arr = self.buffer[:n]
+        if n == 0:
+            return arr
+
+        values = list(datas.values())
+        arr[self.index_name] = self._codes(list(datas.keys()))
+        arr['now'] = now
+        arr['type'] = type
+        self._fill(arr, values)
+        return arr
+
+    def encode_universe(self, datas: Dict[str, Dict[str, Any]], now: int, types: Dict[str, int]) -> np.ndarray:
+        """一次遍历完成 过滤、分类、编码
+
+        股票、指数、基金等混在一起，只需一次`append`
+
+        Parameters
+        ----------
+        datas : dict
+            字典数据
+        now :int
+            当前时间戳
+        types: dict
+            代码到类型的映射，由`build_type_map`生成。不在其中的代码被丢弃
+
+        Returns
+        -------
+        np.ndarray
+            缓冲区的视图。下次调用时会被覆盖，需要保留时请copy
+
+        """
+        keys = []
+        values = []
+        kinds = []
+        for k, v in datas.items():
+            t = types.get(k)
+            if t is None:
+                continue
+            keys.append(k)
+            values.append(v)
+            kinds.append(t)
+
+        n = len(keys)
+        self.reserve(n)
+        arr = self.buffer[:n]
+        if n == 0:
+            return arr
+
+        arr[self.index_name] = self._codes(keys)
+        arr['now'] = now
+        arr['type'] = kinds
+        self._fill(arr, values)
+        return arr
+
+    def _codes(self, keys: List[str]):
+        """代码列，整数编号格式时查代码表"""
+        if self.use_id:
+            return self.symbols.encode(keys, dtype=self.dtype[self.index_name])
+        return keys
+
+    def _fill(self, arr: np.ndarray, values: List[Dict[str, Any]]) -> None:
+        """按列填充标量字段和深度行情"""
+        n = len(values)
+        for c in self.scalar_columns:
+            arr[c] = np.fromiter((v[c] for v in values), dtype=self.dtype[c], count=n)
+
+        if self.level > 0:
+            depths = _stack_depths(values, self.depths, self.level)
+            for j, cols in enumerate(self.depth_columns):
+                for i, c in enumerate(cols):
+                    arr[c] = depths[:, j, i]
@@ -0,0 +1,175 @@
+"""
+延时记录
+
+原来只在tqdm中打印`now - time`，看不出慢在哪一步。这里每个进程把每批的各阶段耗时写入一个定长的内存映射环，
+另开进程按分钟统计各阶段的p50/p99/max
+
+1. 一个目录，每个进程一个文件(`subscribe_tick`/`subscribe_minute`/`strategy_runner`)，互不加锁
+2. 写满后从头覆盖，只保留最近的记录
+3. 时间为`time.time_ns()`，跨进程可比。交易所时间也换算成ns，`Receive`即QMT推送延时
+4. 阶段见`LatencyStage`
+
+"""
+from pathlib import Path
+from typing import Union, Optional
+
+import numpy as np
+import polars as pl
+
+from qmt_quote.dtypes import DTYPE_LATENCY
+from qmt_quote.enums import LatencyStage
+
+
+class LatencyTracer:
+    """延时记录环，一个进程一个
+
+    Examples
+    --------
+    写入进程
+
+    >>> tracer = LatencyTracer(FILE_latency, "tick").save().load(mmap_mode="r+")
+    >>> t0 = time.time_ns()
+    >>> d1t.append(arr)
+    >>> tracer.record(LatencyStage.Ingest, t0, time.time_ns(), len(arr), arr['time'].max())
+
+    """
+
+    def __init__(self, path: Union[str, Path], name: str):
+        """
+
+        Parameters
+        ----------
+        path: str
+            目录，如：`M:\\latency`
+        name: str
+            进程名，即文件名
+
+        """
+        self.path: Path = Path(path)
+        self.name: str = name
+        self.arr: np.ndarray = np.zeros(0, dtype=DTYPE_LATENCY)
+        # [已写入的总行数]
+        self._meta: np.ndarray = np.zeros(4, dtype=np.uint64)
+
+    def save(self, capacity: int = 1 << 20) -> "LatencyTracer":
+        """创建文件。已存在且大小相同时不做任何事
+
+        Parameters
+        ----------
+        capacity: int
+            环的行数。每分钟几十到几百批，默认够记录几天
+
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = self.path / f"{self.name}.npy"
+        if file.exists():
+            old = np.load(file, mmap_mode="r")
+            if old.dtype == DTYPE_LATENCY and len(old) == capacity:
+                return self
+        np.lib.format.open_memmap(file, mode="w+", dtype=DTYPE_LATENCY, shape=(capacity,))
+        np.lib.format.open_memmap(self.path / f"{self.name}._meta.npy", mode="w+", dtype=np.uint64, shape=(4,))
+        return self
+
+    def load(self, mmap_mode: str = "r") -> "LatencyTracer":
+        self.arr = np.load(self.path / f"{self.name}.npy", mmap_mode=mmap_mode)
+        self._meta = np.load(self.path / f"{self.name}._meta.npy", mmap_mode=mmap_mode)
+        return self
+
+    def clear(self) -> "LatencyTracer":
+        self._meta[0] = 0
+        return self
+
+    def record(self, stage: int, start: int, end: int, rows: int = 0, time: int = 0) -> None:
+        """记录一批
+
+        Parameters
+        ----------
+        stage: int
+            阶段，LatencyStage
+        start: int
+            开始时间，ns
+        end: int
+            结束时间，ns
+        rows: int
+            本批行数
+        time: int
+            本批最新tick的交易所时间，ms。0时取结束时间
+
+        """
+        n = int(self._meta[0])
+        r = self.arr[n % len(self.arr)]
+        r['time'] = time if time > 0 else end // 1000000
+        r['start'] = start
+        r['end'] = end
+        r['rows'] = rows
+        r['stage'] = stage
+        # 先写数据再更新计数，读取方不会读到半行
+        self._meta[0] = n + 1
+
+    def data(self) -> np.ndarray:
+        """全部记录，按写入顺序。复制一份"""
+        n = int(self._meta[0])
+        size = len(self.arr)
+        if n <= size:
+            return self.arr[:n].copy()
+        i = n % size
+        return np.concatenate([self.arr[i:], self.arr[:i]])
+
+
+def load_latency(path: Union[str, Path]) -> pl.DataFrame:
+    """读取目录下所有进程的记录
+
+    Returns
+    -------
+    pl.DataFrame
+        time(交易所时间), stage(阶段名), rows, ms(耗时)
+
+    """
+    parts = []
+    for file in sorted(Path(path).glob("*._meta.npy")):
+        name = file.name[:-len("._meta.npy")]
+        parts.append(LatencyTracer(path, name).load(mmap_mode="r").data())
+    arr = np.concatenate(parts) if len(parts) > 0 else np.zeros(0, dtype=DTYPE_LATENCY)
+    names = {v: k for k, v in LatencyStage._asdict().items()}
+    return pl.from_numpy(arr).select(
+        pl.col('time').cast(pl.Datetime('ms', time_zone='Asia/Shanghai')),
+        pl.col('stage').replace_strict(names, return_dtype=pl.String),
+        'rows',
+        ms=(pl.col('end') - pl.col('start')) / 1e6,
+    )
+
+
+def latency_report(df: pl.DataFrame, every: str = "1m", start: Optional[str] = None) -> pl.DataFrame:
+    """按时间段、阶段统计耗时
+
+    Parameters
+    ----------
+    df: pl.DataFrame
+        `load_latency`的结果
+    every: str
+        时间段，如：1m、5m
+    start: str
+        只统计此时间之后，如："09:25"
+
+    Returns
+    -------
+    pl.DataFrame
+        time, stage, count, rows, p50, p99, max。耗时单位ms
+
+    """
+    if start is not None:
+        df = df.filter(pl.col('time').dt.time() >= pl.lit(start).str.to_time("%H:%M"))
+    return (
+        df
+        .sort('time')
+        .group_by_dynamic('time', every=every, group_by='stage')
+        .agg(
+            count=pl.len(),
+            rows=pl.sum('rows'),
+            p50=pl.col('ms').quantile(0.5),
+            p99=pl.col('ms').quantile(0.99),
+            max=pl.max('ms'),
+        )
+        .select('time', 'stage', 'count', 'rows', 'p50', 'p99', 'max')
+        .sort('time', 'stage')
+    )
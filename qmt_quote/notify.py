@@ -0,0 +1,238 @@
+"""
+跨进程通知
+
+写入进程`append`后通知，读取进程阻塞等待，收到通知立即唤醒，不用再固定`sleep(0.5)`
+
+1. 数据本身是否有更新仍以`NPYT.end()`为准，通知只负责唤醒。漏掉通知最多等到超时，不会丢数据
+2. 每个读取进程一个通道，登记在通知目录中，写入进程逐个通知
+3. Windows用命名事件，Linux/Mac用命名管道(FIFO)，都不可用时退化成sleep
+
+Examples
+--------
+写入进程
+
+>>> notifier = Notifier("d1t")
+>>> d1t.append(arr)
+>>> notifier.notify()
+
+读取进程
+
+>>> waiter = Waiter("d1t")
+>>> while True:
+>>>     a1t = d1t.read(n=TICKS_PER_MINUTE)
+>>>     if len(a1t) == 0:
+>>>         waiter.wait(0.5)
+>>>         continue
+
+"""
+import errno
+import os
+import select
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional, Dict, Union
+
+# 通知目录。同一台机器上的进程共用
+NOTIFY_ROOT = Path(tempfile.gettempdir()) / "qmt_quote_notify"
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.CreateEventW.restype = wintypes.HANDLE
+    _kernel32.CreateEventW.argtypes = [wintypes.LPVOID, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]
+    _kernel32.OpenEventW.restype = wintypes.HANDLE
+    _kernel32.OpenEventW.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.LPCWSTR]
+    _kernel32.SetEvent.argtypes = [wintypes.HANDLE]
+    _kernel32.WaitForSingleObject.restype = wintypes.DWORD
+    _kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+    _kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    EVENT_MODIFY_STATE = 0x0002
+    WAIT_OBJECT_0 = 0
+
+_HAS_FIFO = hasattr(os, "mkfifo")
+
+
+def _event_name(name: str, consumer: str) -> str:
+    return f"Local\\qmt_quote_{name}_{consumer}"
+
+
+class Notifier:
+    """写入进程使用，通知所有等待中的读取进程"""
+
+    def __init__(self, name: str, root: Optional[Union[str, Path]] = None):
+        """
+
+        Parameters
+        ----------
+        name: str
+            通道名，一般用文件名，如：d1t、d1m
+        root: str
+            通知目录，读写双方需相同
+
+        """
+        self.name: str = name
+        self.path: Path = Path(root or NOTIFY_ROOT) / name
+        self.path.mkdir(parents=True, exist_ok=True)
+        # 已打开的通道，避免每次通知都重新打开
+        self._handles: Dict[str, int] = {}
+
+    def notify(self) -> int:
+        """通知所有读取进程
+
+        Returns
+        -------
+        int
+            成功通知的读取进程数
+
+        """
+        count = 0
+        for entry in os.scandir(self.path):
+            if sys.platform == "win32":
+                count += self._notify_event(entry)
+            elif _HAS_FIFO:
+                count += self._notify_fifo(entry)
+        return count
+
+    def _notify_event(self, entry: os.DirEntry) -> int:
+        if not entry.name.endswith(".evt"):
+            return 0
+        h = self._handles.get(entry.name)
+        if h is None:
+            h = _kernel32.OpenEventW(EVENT_MODIFY_STATE, False, _event_name(self.name, entry.name[:-4]))
+            if not h:
+                # 读取进程已退出，事件已销毁
+                self._remove(entry.path)
+                return 0
+            self._handles[entry.name] = h
+        if _kernel32.SetEvent(h):
+            return 1
+        _kernel32.CloseHandle(self._handles.pop(entry.name))
+        return 0
+
+    def _notify_fifo(self, entry: os.DirEntry) -> int:
+        if not entry.name.endswith(".fifo"):
+            return 0
+        fd = self._handles.get(entry.name)
+        try:
+            if fd is None:
+                fd = os.open(entry.path, os.O_WRONLY | os.O_NONBLOCK)
+                self._handles[entry.name] = fd
+            os.write(fd, b"\0")
+            return 1
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                # 管道已满，说明还有未处理的通知，不用再写
+                return 1
+            if e.errno == errno.ENXIO:
+                # 没有读端，读取进程已退出
+                self._remove(entry.path)
+            if fd is not None:
+                os.close(self._handles.pop(entry.name))
+            return 0
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        for h in self._handles.values():
+            if sys.platform == "win32":
+                _kernel32.CloseHandle(h)
+            else:
+                os.close(h)
+        self._handles.clear()
+
+
+class Waiter:
+    """读取进程使用，阻塞等待写入进程的通知"""
+
+    def __init__(self, name: str, consumer: Optional[str] = None, root: Optional[Union[str, Path]] = None):
+        """
+
+        Parameters
+        ----------
+        name: str
+            通道名，需与Notifier相同
+        consumer: str
+            读取者名。None时用进程号。同一进程多处等待同一通道时需区分
+        root: str
+            通知目录，读写双方需相同
+
+        """
+        self.name: str = name
+        self.consumer: str = consumer or str(os.getpid())
+        path = Path(root or NOTIFY_ROOT) / name
+        path.mkdir(parents=True, exist_ok=True)
+
+        self._handle = None
+        self._fd: Optional[int] = None
+        self._fd_w: Optional[int] = None
+        if sys.platform == "win32":
+            # 自动复位事件，唤醒后自动回到未触发状态
+            self._handle = _kernel32.CreateEventW(None, False, False, _event_name(name, self.consumer))
+            self.path: Path = path / f"{self.consumer}.evt"
+            self.path.touch()
+        elif _HAS_FIFO:
+            self.path: Path = path / f"{self.consumer}.fifo"
+            if self.path.exists():
+                self.path.unlink()
+            os.mkfifo(self.path)
+            self._fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            # 自己持有一个写端，否则写入进程关闭后select会一直返回可读
+            self._fd_w = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        else:
+            self.path: Path = path
+
+    def wait(self, timeout: float) -> bool:
+        """等待通知
+
+        Parameters
+        ----------
+        timeout: float
+            超时，秒。不支持通知时直接sleep这么久
+
+        Returns
+        -------
+        bool
+            True: 收到通知。False: 超时
+
+        """
+        timeout = max(timeout, 0)
+        if self._handle is not None:
+            return _kernel32.WaitForSingleObject(self._handle, int(timeout * 1000)) == WAIT_OBJECT_0
+        if self._fd is not None:
+            r, _, _ = select.select([self._fd], [], [], timeout)
+            if not r:
+                return False
+            # 多次通知合并成一次
+            try:
+                os.read(self._fd, 4096)
+            except BlockingIOError:
+                pass
+            return True
+        time.sleep(timeout)
+        return False
+
+    def close(self) -> None:
+        if self._handle is not None:
+            _kernel32.CloseHandle(self._handle)
+            self._handle = None
+        for fd in (self._fd, self._fd_w):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._fd_w = None
+        if self.path.exists() and not self.path.is_dir():
+            self.path.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
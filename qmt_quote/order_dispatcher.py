@@ -0,0 +1,458 @@
+"""
+并发下单、撤单
+
+原来`send_orders_5`/`cancel_orders`逐行调用`order_stock_async`/`cancel_order_stock`，几百只股票调仓要等很久，
+撤单快了又会触发流控。这里把下单、撤单放入队列，由几个工作线程按令牌桶限速发出，异步回报按`seq`对应回请求，
+失败的按退避时间重试
+
+1. 下单、撤单各一个令牌桶，速率按券商的流控规则设置，见`config.ORDER_DISPATCH`
+2. 券商规则：连续撤单失败3次或距上次撤单不到2秒，直接反馈撤单失败。所以同一委托的撤单至少间隔`cancel_interval`秒，
+   失败`max_cancel_fail`次后放弃
+3. 只重试暂时性的失败：没发出去(异常、seq<0)、流控等。错误号在`retry_error_ids`中或错误信息含`retry_keywords`才重试，
+   资金不足、价格超限等拒单直接放弃
+4. 下单失败后等待`backoff * 2**(n-1)`秒重试，最多重试`max_retry`次。行情已变，重试前由`reprice`重新报价
+5. 发出后`response_timeout`秒还没有回报：下单可能已到柜台，不再重发，标记为失败；撤单重试
+6. 回报、错误可能先于`order_stock_async`返回seq到达，先暂存，超时或超出数量后丢弃
+7. 结束的请求保留`keep_finished`秒后清理，长时间运行内存不增长
+8. 回报在交易回调线程中，需在`MyXtQuantTraderCallback`中转发，见`MyXtQuantTraderCallback(dispatcher)`
+
+Examples
+--------
+>>> dispatcher = OrderDispatcher(xt_trader, acc, reprice=snapshot_reprice(snapshot, details), **ORDER_DISPATCH).start()
+>>> callback.dispatcher = dispatcher
+>>> reqs = [dispatcher.submit_order(code, STOCK_BUY, 100, FIX_PRICE, 10.0) for code in codes]
+>>> dispatcher.wait(30, reqs)
+>>> print(dispatcher.to_dataframe())
+
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from loguru import logger
+
+from qmt_quote.enums import DispatchStatus
+
+# 发出后没有回报的错误信息
+TIMEOUT_ERROR = "回报超时"
+
+
+class TokenBucket:
+    """令牌桶，线程安全"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+
+        Parameters
+        ----------
+        rate: float
+            每秒补充的令牌数，即长期的最大速率
+        burst: int
+            桶的容量，即允许的突发数量
+
+        """
+        self.rate: float = rate
+        self.burst: int = max(burst, 1)
+        self._tokens: float = float(self.burst)
+        self._last: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """取一个令牌，没有时等待。stop被设置时返回False"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                remain = (1 - self._tokens) / self.rate
+            # 在锁外等待，其他线程可同时计算
+            if stop is None:
+                time.sleep(remain)
+            elif stop.wait(remain):
+                return False
+
+
+class OrderRequest:
+    """一笔下单或撤单请求"""
+
+    def __init__(self, kind: str, order_id: int = 0, stock_code: str = "", order_type: int = 0,
+                 order_volume: int = 0, price_type: int = 0, price: float = 0.0,
+                 strategy_name: str = "", order_remark: str = ""):
+        # order 下单，cancel 撤单
+        self.kind: str = kind
+        # 撤单时为要撤的委托；下单时由异步回报填入
+        self.order_id: int = order_id
+        self.stock_code: str = stock_code
+        self.order_type: int = order_type
+        self.order_volume: int = order_volume
+        self.price_type: int = price_type
+        self.price: float = price
+        self.strategy_name: str = strategy_name
+        self.order_remark: str = order_remark
+        # 最近一次发出时的请求序列号
+        self.seq: int = 0
+        self.status: int = DispatchStatus.Pending
+        self.attempts: int = 0
+        self.error: str = ""
+        # 最近一次发出的时间，time.monotonic()
+        self.sent_at: float = 0.0
+        # 完成或放弃的时间，time.monotonic()。用于清理
+        self.finished_at: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+class OrderDispatcher:
+    """下单、撤单调度器"""
+
+    def __init__(self, trader, account,
+                 order_rate: float = 10.0, order_burst: int = 10,
+                 cancel_rate: float = 5.0, cancel_burst: int = 5,
+                 n_workers: int = 2, max_retry: int = 2, backoff: float = 0.5,
+                 cancel_interval: float = 2.0, max_cancel_fail: int = 3,
+                 response_timeout: float = 10.0, keep_finished: float = 300.0,
+                 retry_error_ids: Sequence[int] = (), retry_keywords: Sequence[str] = ("流控", "频繁", "繁忙", "超时"),
+                 reprice: Optional[Callable[[OrderRequest], Optional[float]]] = None, max_early: int = 10000):
+        """
+
+        Parameters
+        ----------
+        trader: XtQuantTrader
+        account: StockAccount
+        order_rate: float
+            下单每秒最多笔数
+        order_burst: int
+            下单允许的突发笔数
+        cancel_rate: float
+            撤单每秒最多笔数
+        cancel_burst: int
+            撤单允许的突发笔数
+        n_workers: int
+            工作线程数
+        max_retry: int
+            下单失败后最多重试次数
+        backoff: float
+            下单重试的初始等待秒数，之后每次翻倍
+        cancel_interval: float
+            同一委托两次撤单的最小间隔，秒
+        max_cancel_fail: int
+            同一委托连续撤单失败多少次后放弃
+        response_timeout: float
+            发出后多少秒没有回报算超时。暂存的提前回报也在这之后丢弃
+        keep_finished: float
+            结束的请求保留多少秒后清理
+        retry_error_ids: list of int
+            可重试的错误号，如券商的流控错误号
+        retry_keywords: list of str
+            错误信息中含有这些词时也重试
+        reprice: callable
+            下单重试前重新报价，输入请求，返回新价格，None表示放弃。为None时用原价重试，见`utils_trade.snapshot_reprice`
+        max_early: int
+            暂存的提前回报、错误最多条数
+
+        """
+        self.trader = trader
+        self.account = account
+        self.n_workers: int = n_workers
+        self.max_retry: int = max_retry
+        self.backoff: float = backoff
+        self.cancel_interval: float = cancel_interval
+        self.max_cancel_fail: int = max_cancel_fail
+        self.response_timeout: float = response_timeout
+        self.keep_finished: float = keep_finished
+        self.retry_error_ids: Tuple[int, ...] = tuple(retry_error_ids)
+        self.retry_keywords: Tuple[str, ...] = tuple(retry_keywords)
+        self.reprice = reprice
+        self.max_early: int = max_early
+        self.requests: List[OrderRequest] = []
+        self._buckets: Dict[str, TokenBucket] = {
+            "order": TokenBucket(order_rate, order_burst),
+            "cancel": TokenBucket(cancel_rate, cancel_burst),
+        }
+        # (发送时间, 序号, 请求)
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # 已发出请求的seq到请求
+        self._by_seq: Dict[int, OrderRequest] = {}
+        # order_id到下单请求、撤单请求。同一委托两者都有
+        self._orders: Dict[int, OrderRequest] = {}
+        self._cancels: Dict[int, OrderRequest] = {}
+        # 回报可能先于order_stock_async返回seq到达，先暂存。seq -> (到达时间, 回报)
+        self._early: Dict[int, Tuple[float, Any]] = {}
+        # 错误也可能先到。("seq", seq)或("order_id", order_id) -> (到达时间, 错误)
+        self._early_errors: Dict[Tuple[str, int], Tuple[float, Any]] = {}
+        self._last_sweep: float = 0.0
+        # 至少每秒检查一次超时
+        self._tick: float = min(response_timeout, 1.0)
+
+    def start(self) -> "OrderDispatcher":
+        self._stop.clear()
+        for i in range(self.n_workers):
+            thread = threading.Thread(target=self._worker, name=f"dispatcher-{i}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止工作线程。队列中还未发出的请求不再发出"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def _push(self, req: OrderRequest, delay: float = 0.0) -> None:
+        """放入队列，delay秒后发出。调用方需持有锁"""
+        req.status = DispatchStatus.Pending
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), req))
+        self._cond.notify_all()
+
+    def submit_order(self, stock_code: str, order_type: int, order_volume: int, price_type: int, price: float,
+                     strategy_name: str = "", order_remark: str = "") -> OrderRequest:
+        """下单，参数与`order_stock_async`相同"""
+        req = OrderRequest("order", stock_code=stock_code, order_type=order_type, order_volume=order_volume,
+                           price_type=price_type, price=price,
+                           strategy_name=strategy_name, order_remark=order_remark)
+        with self._cond:
+            self.requests.append(req)
+            self._push(req)
+        return req
+
+    def submit_cancel(self, order_id: int) -> OrderRequest:
+        """撤单。同一委托正在撤单时，返回原来的请求"""
+        with self._cond:
+            old = self._cancels.get(order_id)
+            if old is not None and old.status in (DispatchStatus.Pending, DispatchStatus.Sent):
+                return old
+            req = OrderRequest("cancel", order_id=order_id)
+            self._cancels[order_id] = req
+            self.requests.append(req)
+            self._push(req)
+        return req
+
+    def _worker(self) -> None:
+        tick = self._tick
+        while not self._stop.is_set():
+            with self._cond:
+                self._sweep()
+                if len(self._heap) == 0:
+                    self._cond.wait(tick)
+                    continue
+                remain = self._heap[0][0] - time.monotonic()
+                if remain > 0:
+                    # 还没到重试时间
+                    self._cond.wait(min(remain, tick))
+                    continue
+                _, _, req = heapq.heappop(self._heap)
+                if req.status != DispatchStatus.Pending:
+                    # 等待重试期间已完成或放弃
+                    continue
+            if req.kind == "order" and req.attempts > 0 and self.reprice is not None:
+                # 重试前按最新行情重新报价，在锁外计算
+                price = self.reprice(req)
+                if price is None:
+                    with self._cond:
+                        self._finish(req, DispatchStatus.Failed)
+                    logger.warning("重新报价失败，放弃：{} {}", req.stock_code, req.error)
+                    continue
+                req.price = price
+            if not self._buckets[req.kind].acquire(self._stop):
+                break
+            self._send(req)
+
+    def _finish(self, req: OrderRequest, status: int) -> None:
+        """完成或放弃。调用方需持有锁"""
+        req.status = status
+        req.finished_at = time.monotonic()
+        self._cond.notify_all()
+
+    def _put_early(self, d: Dict, key, obj) -> None:
+        """暂存提前到达的回报、错误，超出数量时丢弃最早的。调用方需持有锁"""
+        d[key] = (time.monotonic(), obj)
+        while len(d) > self.max_early:
+            d.pop(next(iter(d)))
+
+    def _sweep(self) -> None:
+        """回报超时、清理结束的请求和过期的暂存。调用方需持有锁，每秒最多一次"""
+        now = time.monotonic()
+        if now - self._last_sweep < self._tick:
+            return
+        self._last_sweep = now
+        for req in [r for r in self._by_seq.values() if r.status == DispatchStatus.Sent]:
+            if now - req.sent_at < self.response_timeout:
+                continue
+            if req.kind == "order":
+                # 可能已经到了柜台，重发会重复下单
+                req.error = TIMEOUT_ERROR
+                self._finish(req, DispatchStatus.Failed)
+                logger.warning("下单回报超时，可能已下单，请查询委托：{} seq={}", req.stock_code, req.seq)
+            else:
+                self._retry(req, TIMEOUT_ERROR, True)
+
+        if self.keep_finished >= 0:
+            old = [r for r in self.requests if 0 < r.finished_at <= now - self.keep_finished]
+            if old:
+                old_ids = set(map(id, old))
+                self.requests = [r for r in self.requests if id(r) not in old_ids]
+                for r in old:
+                    for d, key in ((self._by_seq, r.seq), (self._orders, r.order_id), (self._cancels, r.order_id)):
+                        if d.get(key) is r:
+                            del d[key]
+
+        for d in (self._early, self._early_errors):
+            for key in [k for k, (t, _) in d.items() if now - t > self.response_timeout]:
+                del d[key]
+
+    def _send(self, req: OrderRequest) -> None:
+        with self._cond:
+            req.attempts += 1
+            req.status = DispatchStatus.Sent
+            req.sent_at = time.monotonic()
+        try:
+            if req.kind == "order":
+                seq = self.trader.order_stock_async(self.account, req.stock_code, req.order_type, req.order_volume,
+                                                    req.price_type, req.price, req.strategy_name, req.order_remark)
+            else:
+                seq = self.trader.cancel_order_stock_async(self.account, req.order_id)
+        except Exception as e:
+            # 没有发出去，可以重试
+            with self._cond:
+                self._retry(req, f"{type(e).__name__}: {e}", True)
+            return
+        with self._cond:
+            if seq is None or seq < 0:
+                self._retry(req, f"seq={seq}", True)
+                return
+            req.seq = seq
+            self._by_seq[seq] = req
+            response = self._early.pop(seq, None)
+            error = self._early_errors.pop(("seq", seq), None)
+        if response is not None:
+            self._on_response(response[1])
+        if error is not None:
+            self._on_error(error[1], req.kind)
+
+    def _is_transient(self, error) -> bool:
+        """流控等暂时性的错误"""
+        return (getattr(error, "error_id", None) in self.retry_error_ids or
+                any(k in str(getattr(error, "error_msg", "")) for k in self.retry_keywords))
+
+    def _retry(self, req: OrderRequest, error: str, transient: bool) -> None:
+        """失败后重试或放弃。调用方需持有锁"""
+        req.error = error
+        if not transient:
+            self._finish(req, DispatchStatus.Failed)
+            logger.warning("{}被拒绝，不重试：{} {}", "下单" if req.kind == "order" else "撤单",
+                           req.stock_code or req.order_id, error)
+            return
+        if req.kind == "order":
+            if req.attempts > self.max_retry:
+                self._finish(req, DispatchStatus.Failed)
+                logger.warning("下单失败，放弃：{} {}", req.stock_code, error)
+                return
+            delay = self.backoff * 2 ** (req.attempts - 1)
+        else:
+            if req.attempts >= self.max_cancel_fail:
+                self._finish(req, DispatchStatus.Failed)
+                logger.warning("撤单失败，放弃：{} {}", req.order_id, error)
+                return
+            # 距上次撤单不到2秒会被柜台直接拒绝
+            delay = max(req.sent_at + self.cancel_interval - time.monotonic(), 0.0)
+        self._push(req, delay)
+
+    def _on_response(self, response) -> None:
+        error = None
+        with self._cond:
+            req = self._by_seq.get(response.seq)
+            if req is None:
+                self._put_early(self._early, response.seq, response)
+                return
+            timeout = req.status == DispatchStatus.Failed and req.error == TIMEOUT_ERROR
+            if req.seq != response.seq or not (req.status == DispatchStatus.Sent or timeout):
+                # 重试前那次的回报，或已放弃。超时放弃的下单回报晚到，说明已下单，照常完成
+                return
+            if req.kind == "order":
+                req.order_id = response.order_id
+                self._orders[response.order_id] = req
+                self._finish(req, DispatchStatus.Done)
+                error = self._early_errors.pop(("order_id", response.order_id), None)
+            elif getattr(response, "cancel_result", 0) == 0:
+                self._finish(req, DispatchStatus.Done)
+            else:
+                # 撤单失败多为撤得太快，按券商规则间隔后重试
+                self._retry(req, f"cancel_result={response.cancel_result}", True)
+        if error is not None:
+            self._on_error(error[1], "order")
+
+    def _on_error(self, error, kind: str) -> None:
+        with self._cond:
+            # 部分版本的错误回报带seq，优先用seq对应
+            seq = getattr(error, "seq", -1)
+            req = self._by_seq.get(seq)
+            if req is None or req.kind != kind:
+                req = (self._orders if kind == "order" else self._cancels).get(error.order_id)
+            if req is None:
+                # 可能先于seq或委托号到达，暂存
+                if seq is not None and seq > 0:
+                    self._put_early(self._early_errors, ("seq", seq), error)
+                elif kind == "order":
+                    self._put_early(self._early_errors, ("order_id", error.order_id), error)
+                return
+            if req.status == DispatchStatus.Failed or (req.status == DispatchStatus.Pending and req.attempts > 0):
+                # 已放弃，或已在等待重试，重复的错误不再计算
+                return
+            if kind == "order":
+                # 委托失败时order_id作废，重试后由新的回报填入
+                self._orders.pop(req.order_id, None)
+            self._retry(req, f"{error.error_id}: {error.error_msg}", self._is_transient(error))
+
+    # ===== 以下由MyXtQuantTraderCallback转发 =====
+    def on_order_stock_async_response(self, response) -> None:
+        self._on_response(response)
+
+    def on_cancel_order_stock_async_response(self, response) -> None:
+        self._on_response(response)
+
+    def on_order_error(self, order_error) -> None:
+        self._on_error(order_error, "order")
+
+    def on_cancel_error(self, cancel_error) -> None:
+        self._on_error(cancel_error, "cancel")
+
+    def pending(self) -> int:
+        """还未完成的请求数"""
+        with self._cond:
+            return sum(r.status in (DispatchStatus.Pending, DispatchStatus.Sent) for r in self.requests)
+
+    def wait(self, timeout: Optional[float] = None, requests: Optional[Iterable[OrderRequest]] = None) -> bool:
+        """等待请求完成或放弃。超时返回False
+
+        Parameters
+        ----------
+        timeout: float
+            最多等待的秒数
+        requests: list of OrderRequest
+            要等待的请求，一般为本批提交的请求。None时等待调用时已提交的全部请求
+
+        """
+        with self._cond:
+            reqs = list(self.requests if requests is None else requests)
+            return self._cond.wait_for(
+                lambda: all(r.status in (DispatchStatus.Done, DispatchStatus.Failed) for r in reqs),
+                timeout)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """最近的请求的状态，结束超过keep_finished秒的已清理"""
+        with self._cond:
+            return pd.DataFrame.from_records([r.to_dict() for r in self.requests])
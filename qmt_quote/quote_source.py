@@ -0,0 +1,65 @@
+"""
+行情源
+
+原来各处直接`from xtquant import xtdata`，没有QMT的机器上连导入都失败，也就无法压测接收链路。
+这里加一层可替换的行情源，接口为`xtdata`中用到的那部分函数
+
+1. 默认为`xtquant.xtdata`，第一次使用时才导入
+2. `use_quote_source("fake", ...)`换成本地回放的`FakeXtData`，见`qmt_quote.fake_xtdata`
+3. 各处改为`from qmt_quote.quote_source import xtdata`，调用方式不变
+
+"""
+from typing import Any, Optional
+
+
+class _QuoteSourceProxy:
+    """转发到当前行情源。切换行情源后，已导入的`xtdata`也跟着切换"""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_quote_source(), name)
+
+
+_source: Optional[Any] = None
+xtdata = _QuoteSourceProxy()
+
+
+def get_quote_source() -> Any:
+    """当前行情源。未设置时为`xtquant.xtdata`"""
+    global _source
+    if _source is None:
+        from xtquant import xtdata as _xtdata
+        _source = _xtdata
+    return _source
+
+
+def set_quote_source(source: Any) -> None:
+    """设置行情源。需实现`subscribe_whole_quote`/`get_stock_list_in_sector`等用到的函数"""
+    global _source
+    _source = source
+
+
+def use_quote_source(name: str = "qmt", **kwargs) -> Any:
+    """按名字选择行情源
+
+    Parameters
+    ----------
+    name: str
+        qmt: `xtquant.xtdata`
+        fake: 本地回放，`FakeXtData(**kwargs)`
+    kwargs
+        fake时传给`FakeXtData`，qmt时忽略
+
+    Returns
+    -------
+    行情源
+
+    """
+    if name == "qmt":
+        from xtquant import xtdata as _xtdata
+        set_quote_source(_xtdata)
+    elif name == "fake":
+        from qmt_quote.fake_xtdata import FakeXtData
+        set_quote_source(FakeXtData(**kwargs))
+    else:
+        raise ValueError(f"unknown quote source: {name}")
+    return get_quote_source()
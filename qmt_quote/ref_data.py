@@ -0,0 +1,180 @@
+"""
+盘前参考数据
+
+`before_market_open`对每只股票调用一次`get_instrument_detail`，5000多只股票要等很久，盘中重启交易进程也要重新取。
+这里每天只取一次，按日期保存成一个小文件，之后重启直接加载
+
+1. 一个目录，每天一个文件`YYYYMMDD.npy`，结构为`DTYPE_REF`，按代码排序
+2. 只保留下单用到的字段：涨跌停价、昨收、最小变动单位、板块、ST、退市
+3. `take`按代码取出各列的numpy数组，可直接传给`adjust_price_*_array`等；`to_dataframe`与原`before_market_open`的结果兼容
+4. 太早生成的可能还是昨天的涨跌停价。文件修改时间即生成时间，早于`after`时刻生成、现在已过此时刻的视为过期，重新生成。
+   也可`force=True`强制重新生成
+
+Examples
+--------
+>>> ref = RefData(REF_DIR).get_or_build(lambda: xtdata.get_stock_list_in_sector("沪深A股"), after="0900")
+>>> cols = ref.take(orders['stock_code'])
+>>> adjust_price_3_array(is_buy, price, cols['DownStopPrice'], cols['UpStopPrice'], 100)
+
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from qmt_quote.dtypes import DTYPE_REF
+from qmt_quote.enums import BoardType
+from qmt_quote.symbols import code_keys
+from qmt_quote.utils import get_board_type
+
+
+def details_to_ref(details: pd.DataFrame) -> np.ndarray:
+    """`get_instrument_detail_wrap`的结果转`DTYPE_REF`
+
+    Parameters
+    ----------
+    details: pd.DataFrame
+        索引为stock_code，含InstrumentName、PreClose、UpStopPrice、DownStopPrice、PriceTick
+
+    """
+    details = details.sort_index()
+    arr = np.zeros(len(details), dtype=DTYPE_REF)
+    arr['stock_code'] = details.index.to_numpy(dtype=str)
+    names = details['InstrumentName'].fillna('').astype(str)
+    arr['InstrumentName'] = names.to_numpy()
+    for c in ('PreClose', 'UpStopPrice', 'DownStopPrice'):
+        arr[c] = details[c].fillna(0).to_numpy(dtype=np.float64)
+    if 'PriceTick' in details.columns:
+        arr['PriceTick'] = details['PriceTick'].fillna(0.01).to_numpy(dtype=np.float64)
+    else:
+        arr['PriceTick'] = 0.01
+    arr['board_type'] = [get_board_type(c) for c in details.index]
+    # 沪深风险警示、沪深退市整理板块数据为空，只好从股票名字中获取
+    arr['is_st'] = names.str.contains('ST').to_numpy()
+    arr['is_delisting'] = names.str.contains('退').to_numpy()
+    return arr
+
+
+class RefData:
+    """按日期缓存的参考数据"""
+
+    def __init__(self, path: Union[str, Path]):
+        """
+
+        Parameters
+        ----------
+        path: str
+            目录，如：`D:\\ref`。不要放在每天清空的内存盘中
+
+        """
+        self.path: Path = Path(path)
+        self.date: str = ""
+        self.arr: np.ndarray = np.zeros(0, dtype=DTYPE_REF)
+        self._keys: np.ndarray = np.zeros(0, dtype=np.uint64)
+
+    def _file(self, date: str) -> Path:
+        return self.path / f"{date}.npy"
+
+    def _set(self, arr: np.ndarray, date: str) -> "RefData":
+        self.arr = arr
+        self.date = date
+        # 按代码排序，键也是有序的，可二分查找
+        self._keys = code_keys(arr['stock_code'])
+        return self
+
+    def exists(self, date: Optional[str] = None) -> bool:
+        return self._file(date or datetime.now().strftime("%Y%m%d")).exists()
+
+    def built_at(self, date: Optional[str] = None) -> Optional[datetime]:
+        """生成时间，不存在时为None。保存时先写临时文件再改名，文件修改时间即生成时间"""
+        file = self._file(date or datetime.now().strftime("%Y%m%d"))
+        if not file.exists():
+            return None
+        return datetime.fromtimestamp(file.stat().st_mtime)
+
+    def is_stale(self, date: Optional[str] = None, after: str = "") -> bool:
+        """不存在，或早于当天after时刻生成、而现在已过此时刻
+
+        Parameters
+        ----------
+        date: str
+            日期，默认为今天
+        after: str
+            `HHMM`，如`"0900"`。空时只要存在就不算过期
+
+        """
+        date = date or datetime.now().strftime("%Y%m%d")
+        built = self.built_at(date)
+        if built is None:
+            return True
+        if not after:
+            return False
+        threshold = datetime.strptime(date + after, "%Y%m%d%H%M")
+        return built < threshold <= datetime.now()
+
+    def load(self, date: Optional[str] = None) -> "RefData":
+        """加载某天的参考数据。默认为今天"""
+        date = date or datetime.now().strftime("%Y%m%d")
+        return self._set(np.load(self._file(date)), date)
+
+    def save(self, arr: np.ndarray, date: Optional[str] = None) -> "RefData":
+        """保存并加载。先写临时文件再改名，中途退出不会留下半个文件"""
+        date = date or datetime.now().strftime("%Y%m%d")
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f"{date}.tmp.npy"
+        np.save(tmp, arr)
+        tmp.replace(self._file(date))
+        return self._set(arr, date)
+
+    def build(self, stock_list: List[str], date: Optional[str] = None) -> "RefData":
+        """逐只查询合约详情，生成并保存。慢，每天只需一次"""
+        from qmt_quote.utils_qmt import get_instrument_detail_wrap
+        return self.save(details_to_ref(get_instrument_detail_wrap(stock_list)), date)
+
+    def get_or_build(self, stock_list: Union[List[str], Callable[[], List[str]]],
+                     date: Optional[str] = None, force: bool = False, after: str = "") -> "RefData":
+        """当天的文件存在且未过期时直接加载，否则生成
+
+        Parameters
+        ----------
+        stock_list: list or callable
+            股票列表。传函数时只在需要生成时才调用，加载时不用下载板块数据
+        date: str
+            日期，默认为今天
+        force: bool
+            强制重新生成。如发现涨跌停价不对时
+        after: str
+            `HHMM`，早于此时刻生成的视为过期，见`is_stale`
+
+        """
+        if not force and not self.is_stale(date, after):
+            return self.load(date)
+        if callable(stock_list):
+            stock_list = stock_list()
+        return self.build(stock_list, date)
+
+    def index(self, codes: Union[Sequence[str], np.ndarray, pd.Series]) -> np.ndarray:
+        """代码所在的行号，不存在时为-1"""
+        keys = code_keys(np.asarray(codes, dtype="U9"))
+        if len(self._keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        return np.where(self._keys[idx] == keys, idx, -1)
+
+    def take(self, codes: Union[Sequence[str], np.ndarray, pd.Series]) -> Dict[str, np.ndarray]:
+        """按代码顺序取出各列。不存在的代码涨跌停价为0和99999，与`adjust_price_3`的默认值相同"""
+        idx = self.index(codes)
+        missing = idx < 0
+        rows = np.zeros(len(idx), dtype=DTYPE_REF)
+        rows[~missing] = self.arr[idx[~missing]]
+        rows['stock_code'] = np.asarray(codes, dtype="U9")
+        rows['UpStopPrice'][missing] = 99999.0
+        rows['PriceTick'][missing] = 0.01
+        rows['board_type'][missing] = BoardType.Unknown
+        return {name: rows[name] for name in DTYPE_REF.names}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """索引为stock_code，列与`before_market_open`的结果兼容"""
+        return pd.DataFrame(self.arr).set_index('stock_code')
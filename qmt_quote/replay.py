@@ -0,0 +1,148 @@
+"""
+多天回放
+
+按日期顺序读取归档的tick(`archive.py`生成的目录或`d1t.npy`备份)，按本地接收时间切成一分钟一批，
+模拟实盘中`subscribe_minute.py`更新K线、`strategy_runner.py`每分钟触发的过程。不需要QMT
+
+1. 日期范围内逐天回放，跨日由K线引擎自动重新开始当天的累计量
+2. 每批tick之后给出触发时间，即实盘中处理完这些tick后下一次分钟切换的时间
+3. `speed=0`时尽快回放，用于回归测试和测速；`speed=1`按实际间隔等待；大于1时加速
+4. 只依赖tick本身，同样的输入每次输出相同
+
+"""
+import os
+import time
+from datetime import datetime, date
+from pathlib import Path
+from typing import List, Tuple, Union, Iterator, Optional
+
+import numpy as np
+from npyt import NPYT
+
+from qmt_quote.dtypes import DTYPE_STOCK_1t
+from qmt_quote.tick_archive import ArchiveReader
+
+
+def find_archives(root: Union[str, Path], start: Union[str, date], end: Union[str, date]) -> List[Tuple[date, Path]]:
+    """备份目录中日期在[start, end]内的tick
+
+    Parameters
+    ----------
+    root: str
+        备份目录，其下为`YYYYMMDD/d1t`(归档目录)或`YYYYMMDD/d1t.npy`
+    start: str or date
+        起始日期，如"20250226"
+    end: str or date
+        结束日期，含
+
+    Returns
+    -------
+    list
+        (日期, 路径)，按日期排序。同一天两种都有时取归档目录
+
+    """
+    if isinstance(start, str):
+        start = datetime.strptime(start, "%Y%m%d").date()
+    if isinstance(end, str):
+        end = datetime.strptime(end, "%Y%m%d").date()
+    out = []
+    for p in sorted(Path(root).iterdir()):
+        try:
+            day = datetime.strptime(p.name, "%Y%m%d").date()
+        except ValueError:
+            continue
+        if not (start <= day <= end):
+            continue
+        for name in ("d1t", "d1t.npy"):
+            if (p / name).exists():
+                out.append((day, p / name))
+                break
+    return out
+
+
+def open_ticks(path: Union[str, Path]):
+    """打开归档目录或npy文件，都有`read`/`tell`/`capacity`"""
+    if os.path.isdir(path):
+        return ArchiveReader(path)
+    return NPYT(path, dtype=DTYPE_STOCK_1t).load(mmap_mode="r")
+
+
+class TickReplay:
+    """逐分钟回放多天的tick
+
+    Examples
+    --------
+    >>> replay = TickReplay(find_archives(BACKUP_DIR, "20250224", "20250228"), speed=0)
+    >>> for day, ticks, curr_time in replay:
+    ...     bm.extend(ticks, 3600 * 8)
+    ...     main(curr_time)
+
+    """
+
+    def __init__(self, files: List[Tuple[date, Union[str, Path]]], step: int = 60, speed: float = 0.0,
+                 batch: int = 1024 * 1024, max_wait: float = 60.0):
+        """
+
+        Parameters
+        ----------
+        files: list
+            (日期, 路径)，一般由`find_archives`得到
+        step: int
+            触发间隔，秒。同`strategy_runner.py`，默认1分钟
+        speed: float
+            回放速度。0为不等待，1为实际速度，大于1为加速
+        batch: int
+            每次从文件读取的行数
+        max_wait: float
+            两批之间最多等待的秒数(回放时间)。午休、跨日时不会真的等上几个小时
+
+        """
+        self.files = list(files)
+        self.step: int = step
+        self.speed: float = speed
+        self.batch: int = batch
+        self.max_wait: float = max_wait
+        # 回放进度，(日期, 已读tick数)
+        self.day: Optional[date] = None
+        self.count: int = 0
+
+    def _split(self, reader) -> Iterator[Tuple[np.ndarray, int]]:
+        """一个文件按接收时间切成一分钟一批。返回(tick, 触发时间秒)"""
+        pending = []
+        # 当前批次的分钟
+        minute = -1
+        while len(arr := reader.read(n=self.batch)) > 0:
+            # 接收时间偶尔回退一点，不能让触发时间倒退
+            m = np.maximum.accumulate(np.maximum(arr['now'] // 1000 // self.step, max(minute, 0)))
+            starts = np.r_[0, np.flatnonzero(np.diff(m)) + 1]
+            for a, b in zip(starts, np.r_[starts[1:], len(arr)]):
+                if minute >= 0 and m[a] != minute:
+                    yield np.concatenate(pending), (minute + 1) * self.step
+                    pending = []
+                pending.append(arr[a:b])
+                minute = int(m[a])
+        if len(pending) > 0:
+            yield np.concatenate(pending), (minute + 1) * self.step
+
+    def _wait(self, last: Optional[float], curr_time: int, clock: float) -> float:
+        """按回放速度等到curr_time。返回新的墙上时间基准"""
+        if self.speed <= 0 or last is None:
+            return time.perf_counter()
+        gap = min(curr_time - last, self.max_wait) / self.speed
+        remain = clock + gap - time.perf_counter()
+        if remain > 0:
+            time.sleep(remain)
+        return time.perf_counter()
+
+    def __iter__(self) -> Iterator[Tuple[date, np.ndarray, int]]:
+        """依次返回(日期, 一批tick, 触发时间秒)。先处理tick，再以触发时间调用策略"""
+        last = None
+        clock = time.perf_counter()
+        for day, path in self.files:
+            self.day = day
+            self.count = 0
+            for ticks, curr_time in self._split(open_ticks(path)):
+                clock = self._wait(last, curr_time, clock)
+                last = curr_time
+                self.count += len(ticks)
+                yield day, ticks, curr_time
@@ -0,0 +1,128 @@
+"""
+滚动存储
+
+`NPYT`只在尾部追加，写满后K线引擎会越界。原来只能每天开盘前清空文件，并预留足够大的空间。
+这里在开盘前剩余空间放不下一天时丢弃最早的整天数据，其余行移到开头，文件大小不变，可一直保留最近N天
+
+1. 按整天丢弃，最后一天不丢
+2. 行号整体前移，K线引擎的状态、行号索引、列式副本需同步调整，见`MultiBarManager.maintain`和`sync_rolled`
+3. 读取方通过已有的检查发现数据被重写，如`IncrementalFactor`会全量重建
+
+Notes
+-----
+`NPYT`的`start`固定为0，不支持真正的首尾相接。首尾相接后`data()`/`tail()`要拼接两段，
+下游按行号切片的代码都要改，所以这里用整体前移代替，代价是一次整个文件的内存移动。K线文件只在盘前移动，盘中不会卡住
+
+"""
+import time
+from typing import Sequence
+
+import numpy as np
+from npyt import NPYT
+
+
+def drop_head(a: np.ndarray, t: np.ndarray, n: int) -> int:
+    """丢弃前n行，其余行移到开头
+
+    Parameters
+    ----------
+    a: np.ndarray
+        数据，NPYT._a
+    t: np.ndarray
+        位置记录，NPYT._t
+    n: int
+        丢弃行数
+
+    Returns
+    -------
+    int
+        实际丢弃的行数
+
+    """
+    end = int(t[1])
+    n = max(min(n, end), 0)
+    if n == 0:
+        return 0
+    # 有重叠时numpy会先复制
+    a[:end - n] = a[n:end]
+    t[1] = end - n
+    t[2] = time.time_ns()
+    return n
+
+
+def rows_to_drop(times: np.ndarray, n: int, tz: int = 3600 * 8) -> int:
+    """按整天丢弃，至少丢弃n行时需丢弃的行数
+
+    Parameters
+    ----------
+    times: np.ndarray
+        已有数据的时间，ms，按天有序
+    n: int
+        至少丢弃的行数
+    tz: int
+        时区，秒
+
+    Returns
+    -------
+    int
+        需丢弃的行数。最后一天不丢，不够时为除最后一天外的全部行数
+
+    """
+    if n <= 0 or len(times) == 0:
+        return 0
+    day = (times.astype(np.int64) // 1000 + tz) // 86400
+    # 每天第一行的位置
+    starts = np.flatnonzero(np.diff(day) != 0) + 1
+    if len(starts) == 0:
+        return 0
+    ok = starts[starts >= n]
+    return int(ok[0]) if len(ok) > 0 else int(starts[-1])
+
+
+def make_room(npyt: NPYT, n: int) -> bool:
+    """空间不够时丢弃已读过的行，用于一边写一边`read`的文件，如信号
+
+    Parameters
+    ----------
+    npyt: NPYT
+        文件，需以r+打开
+    n: int
+        将要追加的行数
+
+    Returns
+    -------
+    bool
+        是否有足够空间
+
+    """
+    if npyt.end() + n <= npyt.capacity():
+        return True
+    tell = npyt.tell()
+    drop_head(npyt._a, npyt._t, tell)
+    npyt.seek(0)
+    return npyt.end() + n <= npyt.capacity()
+
+
+def sync_rolled(rolled: Sequence[int], datas: Sequence[NPYT], indexes: Sequence, columns: Sequence = ()) -> None:
+    """K线文件丢弃前几行后，同步行号索引和列式副本
+
+    Parameters
+    ----------
+    rolled: list of int
+        每个文件丢弃的行数，一般为`MultiBarManager.maintain`的返回值
+    datas: list of NPYT
+        K线文件
+    indexes: list of RowIndex
+        行号索引，顺序同datas
+    columns: list of ColumnStore
+        列式副本，顺序同datas。没有启用列式副本时为空，只同步行号索引
+
+    """
+    for j, (n, d, i) in enumerate(zip(rolled, datas, indexes)):
+        if n == 0:
+            continue
+        # 时间索引和最新行索引一起前移
+        i.drop_head(n)
+        if j < len(columns):
+            # 行号整体前移，全部重写
+            columns[j].clear().write(d._a, 0, d.end())
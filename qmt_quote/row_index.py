@@ -0,0 +1,244 @@
+"""
+行号索引
+
+`tail(TAIL_N)`要猜一个足够大的行数再按时间过滤，`tail(TOTAL_ASSET)`+`drop_duplicates`才能得到每只股票最新的K线。
+这里由写入进程在数据文件旁维护两个索引，读取时只取需要的行
+
+1. 时间索引：每个时间段(默认1分钟)一行，记录该时间段的首行和尾行，只扫描新追加的行
+2. 最新行索引：每只股票最新一根K线的行号，由K线引擎分配行号时得到
+
+"""
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from numba import njit
+
+from qmt_quote.dtypes import DTYPE_TIME_INDEX
+
+
+@njit(cache=True)
+def _update_time_index(times: np.ndarray, start: int, end: int, bucket: int, tidx: np.ndarray, n: int) -> int:
+    """新行加入时间索引
+
+    Returns
+    -------
+    int
+        索引的新长度
+
+    """
+    for i in range(start, end):
+        t = times[i] // bucket * bucket
+        if n > 0 and tidx[n - 1]['time'] == t:
+            # 绝大部分情况
+            j = n - 1
+        elif n == 0 or tidx[n - 1]['time'] < t:
+            if n >= len(tidx):
+                raise IndexError("time index is full")
+            tidx[n]['time'] = t
+            tidx[n]['first'] = i
+            tidx[n]['last'] = i + 1
+            n += 1
+            continue
+        else:
+            # 迟到的行，时间比最后一段早
+            j = np.searchsorted(tidx['time'][:n], t)
+            if tidx[j]['time'] != t:
+                if n >= len(tidx):
+                    raise IndexError("time index is full")
+                tidx[j + 1:n + 1] = tidx[j:n].copy()
+                tidx[j]['time'] = t
+                tidx[j]['first'] = i
+                tidx[j]['last'] = i + 1
+                n += 1
+                continue
+        tidx[j]['first'] = min(tidx[j]['first'], i)
+        tidx[j]['last'] = max(tidx[j]['last'], i + 1)
+    return n
+
+
+class RowIndex:
+    """数据文件的行号索引，一个目录
+
+    Examples
+    --------
+    写入进程
+
+    >>> i1m = RowIndex(FILE_i1m).save().load(mmap_mode="r+")
+    >>> i1m.update_time(d1m._a, start, end)
+    >>> i1m.update_latest(bm.state.valid[2], bm.state.index[2])
+
+    读取进程
+
+    >>> i1m = RowIndex(FILE_i1m).load(mmap_mode="r")
+    >>> arr = d1m._a[i1m.rows_for_time(t0, t1)]
+    >>> arr = d1m._a[i1m.latest()]
+
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+
+        Parameters
+        ----------
+        path: str
+            目录，如：`M:\\i1m`
+
+        """
+        self.path: Path = Path(path)
+        self._time: np.ndarray = np.zeros(0, dtype=DTYPE_TIME_INDEX)
+        self._latest: np.ndarray = np.zeros(0, dtype=np.int64)
+        # [时间索引长度, 最新行索引长度, 时间段长度]
+        self._meta: np.ndarray = np.zeros(4, dtype=np.uint64)
+
+    def save(self, capacity_time: int = 65536, capacity_symbols: int = 65536) -> "RowIndex":
+        """创建文件。已存在且大小相同时不做任何事
+
+        Parameters
+        ----------
+        capacity_time: int
+            时间段数量。1分钟一段，一天240段，65536段够用270天
+        capacity_symbols: int
+            股票数量
+
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        for name, dtype, capacity in [("time", DTYPE_TIME_INDEX, capacity_time),
+                                      ("latest", np.int64, capacity_symbols),
+                                      ("_meta", np.uint64, 4)]:
+            file = self.path / f"{name}.npy"
+            if file.exists():
+                old = np.load(file, mmap_mode="r")
+                if old.dtype == dtype and len(old) == capacity:
+                    continue
+            np.lib.format.open_memmap(file, mode="w+", dtype=dtype, shape=(capacity,))
+        return self
+
+    def load(self, mmap_mode: str = "r") -> "RowIndex":
+        self._time = np.load(self.path / "time.npy", mmap_mode=mmap_mode)
+        self._latest = np.load(self.path / "latest.npy", mmap_mode=mmap_mode)
+        self._meta = np.load(self.path / "_meta.npy", mmap_mode=mmap_mode)
+        return self
+
+    def clear(self, time: bool = True, latest: bool = True) -> "RowIndex":
+        """清空索引
+
+        Parameters
+        ----------
+        time: bool
+            清空时间索引
+        latest: bool
+            清空最新行索引。股票编号换了一套时(如新建了K线引擎)需要清空
+
+        """
+        if time:
+            self._meta[0] = 0
+        if latest:
+            self._meta[1] = 0
+        return self
+
+    def update_time(self, arr: np.ndarray, start: int, end: int, bucket: int = 60000) -> None:
+        """[start, end)行加入时间索引。行的时间写入后不能再变
+
+        Parameters
+        ----------
+        arr: np.ndarray
+            数据，一般为`NPYT._a`
+        start: int
+            起始行
+        end: int
+            结束行，不含
+        bucket: int
+            时间段长度，ms。K线的时间本就是标签，1分钟即可
+
+        """
+        if end <= start:
+            return
+        self._meta[2] = bucket
+        self._meta[0] = _update_time_index(arr['time'], start, end, bucket, self._time, int(self._meta[0]))
+
+    def _grow_latest(self, n: int) -> np.ndarray:
+        """最新行索引扩充到n只股票，新位置为-1"""
+        assert n <= len(self._latest), f"latest index is full, capacity={len(self._latest)}, n={n}"
+        m = int(self._meta[1])
+        if n > m:
+            self._latest[m:n] = -1
+            self._meta[1] = n
+        return self._latest[:max(n, m)]
+
+    def update_latest(self, valid: np.ndarray, index: np.ndarray) -> None:
+        """由K线引擎的状态更新每只股票最新一根K线的行号，没有K线的股票保持原值
+
+        Parameters
+        ----------
+        valid: np.ndarray
+            是否有K线，一般为`state.valid[j]`
+        index: np.ndarray
+            K线行号，一般为`state.index[j]`
+
+        """
+        # 状态按需成倍扩充，尾部大多是空位
+        n = np.flatnonzero(valid)
+        n = int(n[-1]) + 1 if len(n) > 0 else 0
+        rows = self._grow_latest(n)
+        np.copyto(rows[:n], index[:n], casting='unsafe', where=valid[:n])
+
+    def update_latest_rows(self, ids: np.ndarray, start: int = 0) -> None:
+        """由已有数据更新最新行索引，用于历史数据
+
+        Parameters
+        ----------
+        ids: np.ndarray
+            [start, start+len(ids))行对应的股票编号，需与K线引擎的编号相同
+        start: int
+            起始行
+
+        """
+        if len(ids) == 0:
+            return
+        rows = self._grow_latest(int(ids.max()) + 1)
+        np.maximum.at(rows, ids, np.arange(start, start + len(ids), dtype=np.int64))
+
+    def truncate(self, end: int) -> None:
+        """丢弃end及之后的行。从检查点恢复时，这些行会被重新生成"""
+        tidx = self._time[:int(self._meta[0])]
+        keep = tidx[tidx['first'] < end]
+        keep['last'] = np.minimum(keep['last'], end)
+        self._time[:len(keep)] = keep
+        self._meta[0] = len(keep)
+        rows = self._latest[:int(self._meta[1])]
+        rows[rows >= end] = -1
+
+    def drop_head(self, n: int) -> None:
+        """数据丢弃了前n行，其余行前移，索引同步前移"""
+        if n <= 0:
+            return
+        tidx = self._time[:int(self._meta[0])]
+        keep = tidx[tidx['last'] > n]
+        keep['first'] = np.maximum(keep['first'], n) - n
+        keep['last'] -= n
+        self._time[:len(keep)] = keep
+        self._meta[0] = len(keep)
+        rows = self._latest[:int(self._meta[1])]
+        rows[rows >= 0] -= n
+        rows[rows < 0] = -1
+
+    def rows_for_time(self, t0: int, t1: int) -> slice:
+        """时间在[t0, t1)内的行号范围，ms
+
+        只查索引不扫描数据。范围内可能夹杂少量其他时间的行，需要精确时再按time过滤
+        """
+        n = int(self._meta[0])
+        tidx = self._time[:n]
+        # t0所在的时间段也要包含
+        bucket = max(int(self._meta[2]), 1)
+        i0 = int(np.searchsorted(tidx['time'], t0 // bucket * bucket, side='left'))
+        i1 = int(np.searchsorted(tidx['time'], t1, side='left'))
+        if i0 >= i1:
+            return slice(0, 0)
+        return slice(int(tidx['first'][i0:i1].min()), int(tidx['last'][i0:i1].max()))
+
+    def latest(self) -> np.ndarray:
+        """每只股票最新一根K线的行号"""
+        rows = self._latest[:int(self._meta[1])]
+        return rows[rows >= 0]
@@ -0,0 +1,144 @@
+"""
+最新快照
+
+下单前要取每只股票最新的价格和盘口。原来从日线`tail(TOTAL_ASSET)`后转pandas、去重、设索引。
+这里由K线引擎在更新日线的同时，把日线状态写入一张按编号存放的定长表，原地更新
+
+1. 一只股票固定一行，行号即K线引擎中的编号，不追加
+2. 读取时直接取`data()`，不去重、不排序
+3. 开盘前由历史日线补上每只股票最后一根，保持与原来取日线尾部一致
+4. 涨跌停价tick中没有，开盘前由盘前参考数据写入。盘中新出现的股票没有涨跌停价，为0
+
+"""
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import polars as pl
+
+from qmt_quote.dtypes import DTYPE_SNAPSHOT
+
+
+class Snapshot:
+    """最新快照，一个目录
+
+    Examples
+    --------
+    写入进程
+
+    >>> snapshot = Snapshot(FILE_snapshot).save().load(mmap_mode="r+")
+    >>> snapshot.update_limits(RefData(REF_DIR).load())
+    >>> bm = MultiBarManager([d1d._a, d5m._a, d1m._a], [d1d._t, d5m._t, d1m._t], [86400, 300, 60], snapshot=snapshot)
+
+    读取进程
+
+    >>> snapshot = Snapshot(FILE_snapshot).load(mmap_mode="r")
+    >>> arr = snapshot.data()
+
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+
+        Parameters
+        ----------
+        path: str
+            目录，如：`M:\\snapshot`
+
+        """
+        self.path: Path = Path(path)
+        self.arr: np.ndarray = np.zeros(0, dtype=DTYPE_SNAPSHOT)
+        # [已用行数]
+        self._meta: np.ndarray = np.zeros(4, dtype=np.uint64)
+
+    def save(self, capacity: int = 65536, dtype: np.dtype = DTYPE_SNAPSHOT) -> "Snapshot":
+        """创建文件。已存在且格式相同时不做任何事
+
+        Parameters
+        ----------
+        capacity: int
+            股票数量
+        dtype: np.dtype
+            tick为整数编号格式时用`with_stock_id(DTYPE_SNAPSHOT)`
+
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = self.path / "snapshot.npy"
+        if file.exists():
+            old = np.load(file, mmap_mode="r")
+            if old.dtype == dtype and len(old) == capacity:
+                return self
+        np.lib.format.open_memmap(file, mode="w+", dtype=dtype, shape=(capacity,))
+        np.lib.format.open_memmap(self.path / "_meta.npy", mode="w+", dtype=np.uint64, shape=(4,))
+        return self
+
+    def load(self, mmap_mode: str = "r") -> "Snapshot":
+        self.arr = np.load(self.path / "snapshot.npy", mmap_mode=mmap_mode)
+        self._meta = np.load(self.path / "_meta.npy", mmap_mode=mmap_mode)
+        return self
+
+    def clear(self) -> "Snapshot":
+        """清空。K线引擎的编号换了一套时(如新建了K线引擎)需要清空"""
+        self.arr[:int(self._meta[0])] = np.zeros(1, dtype=self.arr.dtype)
+        self._meta[0] = 0
+        return self
+
+    def grow(self, n: int) -> None:
+        """已用行数扩充到n"""
+        assert n <= len(self.arr), f"Snapshot is full, capacity={len(self.arr)}, n={n}"
+        if n > self._meta[0]:
+            self._meta[0] = n
+
+    def update_bars(self, arr: np.ndarray, ids: np.ndarray) -> None:
+        """由日线写入每只股票最后一根，用于开盘前
+
+        Parameters
+        ----------
+        arr: np.ndarray
+            日线，一般为`d1d.data()`
+        ids: np.ndarray
+            每行对应的编号，需与K线引擎的编号相同
+
+        """
+        if len(ids) == 0:
+            return
+        # 倒序后第一次出现的就是最后一根
+        ids, pos = np.unique(ids[::-1], return_index=True)
+        rows = arr[len(arr) - 1 - pos]
+        self.grow(int(ids.max()) + 1)
+        out = self.arr
+        out['stock_code'][ids] = rows['stock_code']
+        # 历史日线没有close_dt，用K线时间。否则开盘前data()为空
+        out['time'][ids] = np.maximum(rows['close_dt'], rows['time'])
+        out['type'][ids] = rows['type']
+        out['lastPrice'][ids] = rows['close']
+        out['lastClose'][ids] = rows['preClose']
+        for name in ['open', 'high', 'low', 'amount', 'volume', 'avg_price',
+                     'askPrice_1', 'bidPrice_1', 'askVol_1', 'bidVol_1', 'askVol_2', 'bidVol_2']:
+            out[name][ids] = rows[name]
+
+    def update_limits(self, ref, codes: Optional[np.ndarray] = None) -> None:
+        """由盘前参考数据写入涨跌停价
+
+        Parameters
+        ----------
+        ref: RefData
+            盘前参考数据，需已加载
+        codes: np.ndarray
+            每行的代码。整数编号格式时传`symbols.codes()`，默认取stock_code列
+
+        """
+        n = int(self._meta[0])
+        if codes is None:
+            codes = self.arr['stock_code'][:n]
+        cols = ref.take(np.asarray(codes[:n]).astype("U9"))
+        self.arr['UpStopPrice'][:n] = cols['UpStopPrice']
+        self.arr['DownStopPrice'][:n] = cols['DownStopPrice']
+
+    def data(self) -> np.ndarray:
+        """已有数据的行。复制一份，之后不受写入进程影响"""
+        arr = self.arr[:int(self._meta[0])]
+        return arr[arr['time'] > 0]
+
+    def to_polars(self) -> pl.DataFrame:
+        return pl.from_numpy(self.data())
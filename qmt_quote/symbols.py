@@ -0,0 +1,191 @@
+"""
+代码表
+
+股票代码与整数编号的相互转换。代码表保存成NPYT文件，放在数据文件旁边，行号即编号。
+
+1. 只有一个进程写入(一般是`subscribe_tick.py`)，新代码追加到末尾，已有编号永远不变
+2. 其他进程只读加载，内存映射能直接看到新追加的代码
+
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Union, Optional, List
+
+import numpy as np
+import polars as pl
+from npyt import NPYT
+from numba import njit
+
+from qmt_quote.dtypes import DTYPE_SYMBOL
+
+
+@njit(cache=True)
+def _code_keys(chars: np.ndarray) -> np.ndarray:
+    """`U9`代码转uint64键。每个字符只取低7位，9个字符正好63位，ASCII代码不会冲突
+
+    Parameters
+    ----------
+    chars: np.ndarray
+        `U9`数组按uint32查看后的二维数组，shape为(n, 9)
+
+    """
+    out = np.empty(chars.shape[0], dtype=np.uint64)
+    for i in range(chars.shape[0]):
+        k = np.uint64(0)
+        for j in range(chars.shape[1]):
+            k = (k << np.uint64(7)) | np.uint64(chars[i, j] & 127)
+        out[i] = k
+    return out
+
+
+def code_keys(codes: np.ndarray) -> np.ndarray:
+    """`U9`数组转uint64键。结构化数组中的字段不连续，需先复制一份"""
+    codes = np.ascontiguousarray(codes, dtype="U9")
+    return _code_keys(codes.view(np.uint32).reshape(len(codes), 9))
+
+
+class SymbolTable:
+
+    def __init__(self, filename: Optional[Union[str, Path]] = None, capacity: int = 65536):
+        """
+
+        Parameters
+        ----------
+        filename: str
+            代码表文件。建议与d1t等文件放在一起，例如：`M:\\symbols.npy`
+
+            None时只在内存中维护，用于单进程内的临时编号
+        capacity: int
+            最大代码数量。编号用uint16时不能超过65536
+
+        """
+        self._npyt: Optional[NPYT] = None if filename is None else NPYT(filename, dtype=DTYPE_SYMBOL)
+        self._capacity: int = capacity
+        self._ids: Dict[str, int] = {}
+        self._codes: List[str] = []
+        # 有序键与对应编号，用于数组批量查表
+        self._keys: np.ndarray = np.empty(0, dtype=np.uint64)
+        self._keys_id: np.ndarray = np.empty(0, dtype=np.int64)
+
+    def load(self, mmap_mode: str = "r") -> "SymbolTable":
+        """加载文件，不存在时创建
+
+        Parameters
+        ----------
+        mmap_mode
+            r: 只读，用于读取编号
+            r+: 读写，用于分配编号
+
+        """
+        if self._npyt is not None:
+            self._npyt.save(capacity=self._capacity).load(mmap_mode=mmap_mode)
+        self._ids.clear()
+        self._codes.clear()
+        self.refresh()
+        return self
+
+    def clear(self) -> "SymbolTable":
+        """清空代码表。之前生成的编号全部失效，只能在清空数据文件时一起使用"""
+        if self._npyt is not None:
+            self._npyt.clear()
+        self._ids.clear()
+        self._codes.clear()
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._keys_id = np.empty(0, dtype=np.int64)
+        return self
+
+    def __len__(self) -> int:
+        if self._npyt is None:
+            return len(self._codes)
+        return self._npyt.end()
+
+    def codes(self) -> np.ndarray:
+        """全部代码，下标即编号"""
+        if self._npyt is None:
+            return np.array(self._codes, dtype="U9")
+        return self._npyt.data()['stock_code']
+
+    def refresh(self) -> None:
+        """同步其他进程新追加的代码"""
+        n = len(self._codes)
+        end = len(self)
+        if n < end:
+            self._codes.extend(str(c) for c in self.codes()[n:end])
+            self._ids.update({c: i for i, c in enumerate(self._codes[n:end], start=n)})
+            self._rebuild_keys()
+
+    def _rebuild_keys(self) -> None:
+        keys = code_keys(np.array(self._codes, dtype="U9"))
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self._keys_id = order.astype(np.int64)
+
+    def get_id(self, code: str) -> int:
+        """代码转编号，不存在时分配新编号"""
+        i = self._ids.get(code)
+        if i is None:
+            self.refresh()
+            i = self._ids.get(code)
+        if i is None:
+            i = len(self._codes)
+            if self._npyt is not None:
+                arr = np.empty(1, dtype=DTYPE_SYMBOL)
+                arr['stock_code'] = code
+                assert self._npyt.append(arr) == 0, f"symbol table is full, capacity={self._capacity}"
+            else:
+                assert i < self._capacity, f"symbol table is full, capacity={self._capacity}"
+            self._codes.append(code)
+            self._ids[code] = i
+            self._keys = np.empty(0, dtype=np.uint64)
+        return i
+
+    def encode(self, codes: Union[np.ndarray, Iterable[str]], dtype=np.uint32) -> np.ndarray:
+        """批量代码转编号
+
+        Parameters
+        ----------
+        codes
+            代码列表，或`U9`数组
+        dtype
+            编号类型
+
+        """
+        if not isinstance(codes, np.ndarray):
+            return np.array([self.get_id(c) for c in codes], dtype=dtype)
+        if len(codes) == 0:
+            return np.empty(0, dtype=dtype)
+
+        keys = code_keys(codes)
+        if len(self._keys) != len(self._codes):
+            self._rebuild_keys()
+        pos = np.searchsorted(self._keys, keys)
+        pos[pos >= len(self._keys)] = 0
+        missing = len(self._keys) == 0 or not np.array_equal(self._keys[pos], keys)
+        if missing:
+            # 出现新代码，分配编号后重新查表
+            for c in np.unique(np.asarray(codes, dtype="U9")):
+                self.get_id(str(c))
+            self._rebuild_keys()
+            pos = np.searchsorted(self._keys, keys)
+        return self._keys_id[pos].astype(dtype)
+
+    def decode(self, ids: np.ndarray) -> np.ndarray:
+        """批量编号转代码"""
+        if ids.size > 0 and ids.max() >= len(self._codes):
+            # 其他进程刚刚追加的代码
+            self.refresh()
+        return self.codes()[ids]
+
+    def decode_frame(self, df: pl.DataFrame, col: str = 'stock_code') -> pl.DataFrame:
+        """DataFrame中的编号列转代码
+
+        Parameters
+        ----------
+        df : pl.DataFrame
+            polars DataFrame
+        col : str
+            编号列。转换后列名不变
+
+        """
+        if not df.schema[col].is_integer():
+            return df
+        return df.with_columns(pl.Series(col, self.decode(df[col].to_numpy()), dtype=pl.String))
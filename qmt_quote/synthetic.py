@@ -0,0 +1,123 @@
+"""
+合成行情数据
+
+没有QMT环境时，用于测试和性能评估。生成的是一整天的全推tick，格式与`subscribe_tick.py`录制的一致
+
+1. 9点25集合竞价推送一次
+2. 9点30到11点30，13点00到15点00，每`interval`秒所有股票各推送一次
+3. 价格随机游走，成交量和成交额是累计值
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Iterator
+
+import numpy as np
+
+from qmt_quote.dtypes import DTYPE_STOCK_1t
+from qmt_quote.enums import InstrumentType
+
+
+def session_times(date: str = "2025-02-28", interval: int = 3) -> np.ndarray:
+    """一天内的推送时间，ms时间戳
+
+    Parameters
+    ----------
+    date: str
+        交易日
+    interval: int
+        推送间隔，秒
+
+    """
+    tz = timezone(timedelta(hours=8))
+    day = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=tz)
+    t0 = int(day.timestamp())
+    am = np.arange(t0 + 34200, t0 + 41400 + 1, interval)  # 9:30-11:30
+    pm = np.arange(t0 + 46800, t0 + 54000 + 1, interval)  # 13:00-15:00
+    return np.concatenate([[t0 + 33900], am, pm]).astype(np.uint64) * 1000  # 9:25
+
+
+def make_codes(n_assets: int) -> List[str]:
+    """生成股票代码，沪深各半"""
+    return [f"{600000 + i // 2:06d}.SH" if i % 2 == 0 else f"{i // 2:06d}.SZ" for i in range(n_assets)]
+
+
+def iter_ticks(n_assets: int = 5000, date: str = "2025-02-28", interval: int = 3, seed: int = 0,
+               codes: Optional[List[str]] = None, dtype: np.dtype = DTYPE_STOCK_1t) -> Iterator[np.ndarray]:
+    """按推送逐批生成tick，每批是所有股票的一次推送
+
+    Parameters
+    ----------
+    n_assets: int
+        股票数量
+    date: str
+        交易日
+    interval: int
+        推送间隔，秒
+    seed: int
+        随机种子
+    codes: list
+        股票代码。None时自动生成
+    dtype: np.dtype
+        数据格式。代码为整数编号时，编号即为codes中的下标
+
+    """
+    rng = np.random.default_rng(seed)
+    if codes is None:
+        codes = make_codes(n_assets)
+    n_assets = len(codes)
+
+    pre_close = np.round(rng.uniform(3, 100, n_assets), 2).astype(np.float32)
+    price = pre_close.copy()
+    open_ = np.zeros(n_assets, dtype=np.float32)
+    high = np.zeros(n_assets, dtype=np.float32)
+    low = np.zeros(n_assets, dtype=np.float32)
+    volume = np.zeros(n_assets, dtype=np.uint64)
+    amount = np.zeros(n_assets, dtype=np.float64)
+
+    if dtype['stock_code'].kind in 'iu':
+        stock_code = np.arange(n_assets)
+    else:
+        stock_code = np.array(codes, dtype="U9")
+
+    for i, t in enumerate(session_times(date, interval)):
+        price = np.maximum(np.round(price * (1 + rng.normal(0, 0.001, n_assets)), 2), 0.01).astype(np.float32)
+        vol = rng.integers(0, 50, n_assets).astype(np.uint64)
+        if i == 0:
+            open_[:] = price
+            high[:] = price
+            low[:] = price
+        high = np.maximum(high, price)
+        low = np.minimum(low, price)
+        volume += vol
+        amount += vol * 100 * price.astype(np.float64)
+
+        arr = np.zeros(n_assets, dtype=dtype)
+        arr['stock_code'] = stock_code
+        arr['time'] = t + np.arange(n_assets, dtype=np.uint64) % 3000
+        arr['now'] = arr['time'] + 50
+        arr['lastPrice'] = price
+        arr['open'] = open_
+        arr['high'] = high
+        arr['low'] = low
+        arr['lastClose'] = pre_close
+        arr['amount'] = amount
+        arr['volume'] = volume
+        arr['type'] = InstrumentType.Stock
+        for j in range(1, 6):
+            arr[f'askPrice_{j}'] = price + 0.01 * j
+            arr[f'bidPrice_{j}'] = price - 0.01 * (j - 1)
+            arr[f'askVol_{j}'] = rng.integers(1, 1000, n_assets)
+            arr[f'bidVol_{j}'] = rng.integers(1, 1000, n_assets)
+        yield arr
+
+
+def generate_ticks(n_assets: int = 5000, date: str = "2025-02-28", interval: int = 3, seed: int = 0,
+                   codes: Optional[List[str]] = None, dtype: np.dtype = DTYPE_STOCK_1t) -> np.ndarray:
+    """生成一整天的tick。参数同`iter_ticks`
+
+    Notes
+    -----
+    5000只股票3秒一推，一天约2400万行，注意内存
+
+    """
+    return np.concatenate(list(iter_ticks(n_assets, date, interval, seed, codes, dtype)))
@@ -0,0 +1,194 @@
+"""
+tick归档
+
+原来收盘后把`d1t.npy`原样复制到备份目录，一天几个GB，回放时即使只要一只股票也要全部读入。
+这里转换成按列压缩的Parquet文件：
+
+1. 按到达顺序每`chunk_rows`行切成一个文件，文件内按 (代码, 时间) 排序，zstd压缩
+2. 同一股票的行连在一起，价格、成交量变化小，压缩率高
+3. 每个文件带行组统计信息，按代码或时间过滤时跳过无关的行组和文件
+4. 保留到达顺序`seq`，读回时按原顺序排列，回放结果与原文件完全一致
+5. 价格可按`PRICE_SCALE`转为整数保存，压缩率更高
+
+读取时`ArchiveReader`模仿`NPYT`的`read`/`tell`接口，`subscribe_minute.do`可直接回放归档目录
+
+"""
+from pathlib import Path
+from typing import Optional, Sequence, Union, Iterator, List
+
+import numpy as np
+import polars as pl
+
+from qmt_quote.dtypes import PRICE_SCALE
+
+
+def _price_columns(dtype: np.dtype) -> List[str]:
+    """浮点价格列。紧凑格式的价格已是整数，原样保存"""
+    return [n for n in dtype.names
+            if (n in ("lastPrice", "open", "high", "low", "lastClose") or "Price_" in n) and dtype[n].kind == "f"]
+
+
+def write_archive(arr: np.ndarray, path: Union[str, Path], chunk_rows: int = 4_000_000,
+                  row_group_size: int = 256 * 1024, compression_level: int = 3, scale_prices: bool = True) -> int:
+    """tick写成归档目录
+
+    Parameters
+    ----------
+    arr: np.ndarray
+        tick，一般为`d1t.data()`
+    path: str
+        归档目录，如：`D:\\backup\\20250228\\d1t`
+    chunk_rows: int
+        每个文件的行数。按到达顺序切分，回放时逐个文件读取，决定了回放时的内存占用
+    row_group_size: int
+        行组行数。越小按代码过滤时跳过的越多，但压缩率略低
+    compression_level: int
+        zstd压缩等级
+    scale_prices: bool
+        价格乘以PRICE_SCALE后存为int32
+
+    Returns
+    -------
+    int
+        文件数量
+
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for f in path.glob("part-*.parquet"):
+        f.unlink()
+    prices = _price_columns(arr.dtype) if scale_prices else []
+    n = 0
+    for n, start in enumerate(range(0, len(arr), chunk_rows)):
+        chunk = arr[start:start + chunk_rows]
+        df = pl.DataFrame({name: chunk[name] for name in arr.dtype.names})
+        df = (
+            df
+            .with_columns(
+                seq=pl.int_range(start, start + len(chunk), dtype=pl.UInt64),
+                *[(pl.col(c).cast(pl.Float64) * PRICE_SCALE).round().cast(pl.Int32) for c in prices],
+            )
+            .sort('stock_code', 'time', 'seq')
+        )
+        df.write_parquet(path / f"part-{n:05d}.parquet", compression="zstd", compression_level=compression_level,
+                         statistics=True, row_group_size=row_group_size)
+    # 保存格式，读回时还原
+    np.save(path / "_dtype.npy", np.empty(0, dtype=arr.dtype))
+    np.save(path / "_meta.npy", np.array([len(arr), int(scale_prices)], dtype=np.uint64))
+    return n + 1 if len(arr) > 0 else 0
+
+
+class ArchiveReader:
+    """按到达顺序读取归档，接口同`NPYT.read`
+
+    Examples
+    --------
+    >>> reader = ArchiveReader(r"D:\\backup\\20250228\\d1t", symbols=['000001.SZ'])
+    >>> while len(a1t := reader.read(n=TICKS_PER_MINUTE)) > 0:
+    ...     bm.extend(a1t, 3600 * 8)
+
+    """
+
+    def __init__(self, path: Union[str, Path], symbols: Optional[Sequence[str]] = None,
+                 start: Optional[int] = None, end: Optional[int] = None):
+        """
+
+        Parameters
+        ----------
+        path: str
+            归档目录
+        symbols: list of str
+            只读这些股票。None时全部
+        start: int
+            起始时间，ms，含
+        end: int
+            结束时间，ms，不含
+
+        """
+        self.path: Path = Path(path)
+        self.dtype: np.dtype = np.load(self.path / "_dtype.npy").dtype
+        meta = np.load(self.path / "_meta.npy")
+        self.total: int = int(meta[0])
+        self.scale_prices: bool = bool(meta[1])
+        self.files: List[Path] = sorted(self.path.glob("part-*.parquet"))
+        self.symbols = None if symbols is None else list(symbols)
+        self.start: Optional[int] = start
+        self.end: Optional[int] = end
+        self._file: int = 0
+        self._buf: np.ndarray = np.empty(0, dtype=self.dtype)
+        self._pos: int = 0
+        self._tell: int = 0
+
+    def _filter(self) -> Optional[pl.Expr]:
+        exprs = []
+        if self.symbols is not None:
+            exprs.append(pl.col('stock_code').is_in(self.symbols))
+        if self.start is not None:
+            exprs.append(pl.col('time') >= self.start)
+        if self.end is not None:
+            exprs.append(pl.col('time') < self.end)
+        if len(exprs) == 0:
+            return None
+        return pl.all_horizontal(exprs)
+
+    def _load(self, file: Path) -> np.ndarray:
+        """读一个文件，过滤后按到达顺序排列"""
+        lf = pl.scan_parquet(file)
+        expr = self._filter()
+        if expr is not None:
+            # 行组统计信息用于跳过无关的行组
+            lf = lf.filter(expr)
+        df = lf.sort('seq').collect()
+        out = np.empty(len(df), dtype=self.dtype)
+        prices = _price_columns(self.dtype) if self.scale_prices else []
+        for name in self.dtype.names:
+            col = df[name]
+            if name in prices:
+                out[name] = col.to_numpy() / PRICE_SCALE
+            elif col.dtype == pl.String:
+                out[name] = col.to_numpy().astype(self.dtype[name])
+            else:
+                out[name] = col.to_numpy()
+        return out
+
+    def capacity(self) -> int:
+        """归档的总行数，过滤前"""
+        return self.total
+
+    def tell(self) -> int:
+        """已读行数，过滤后"""
+        return self._tell
+
+    def read(self, n: int = 1024, prefetch: int = 0) -> np.ndarray:
+        """读取n行。读完返回空数组
+
+        Parameters
+        ----------
+        n: int
+            读取行数
+        prefetch: int
+            不支持，只为与NPYT接口相同
+
+        """
+        while self._pos >= len(self._buf):
+            if self._file >= len(self.files):
+                return self._buf[:0]
+            self._buf = self._load(self.files[self._file])
+            self._pos = 0
+            self._file += 1
+        arr = self._buf[self._pos:self._pos + n]
+        self._pos += len(arr)
+        self._tell += len(arr)
+        return arr
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while len(arr := self.read(1024 * 1024)) > 0:
+            yield arr
+
+
+def read_archive(path: Union[str, Path], symbols: Optional[Sequence[str]] = None,
+                 start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+    """一次读入归档中符合条件的全部行，按到达顺序排列。参数同`ArchiveReader`"""
+    reader = ArchiveReader(path, symbols, start, end)
+    parts = [reader._load(f) for f in reader.files]
+    return np.concatenate(parts) if len(parts) > 0 else np.empty(0, dtype=reader.dtype)
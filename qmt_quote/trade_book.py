@@ -0,0 +1,244 @@
+"""
+本地交易状态
+
+原来每次撤单、下单前都要`query_stock_orders`/`query_stock_positions`/`query_stock_asset`查一次柜台，
+再转成DataFrame，调仓时来回要几百毫秒。这里由交易回调维护一份本地的委托、成交、持仓、资金，
+下单前直接读本地状态
+
+1. 委托按order_id，成交按traded_id，持仓按stock_code索引
+2. 委托推送更新委托；卖出委托第一次出现时冻结可用数量，买入委托第一次出现时按委托价冻结资金，
+   结束(撤单、废单、全部成交)时释放未成交部分
+3. 成交推送按traded_id去重，买入加持仓，卖出减持仓。买入从该委托冻结的资金中扣，不够的部分才扣可用资金，
+   与柜台一致(柜台的可用资金已扣除冻结)；卖出加可用资金。不计手续费
+4. 增量更新难免有偏差(手续费、送股、手工交易等)，`reconcile`全量查询后覆盖，可用`start`定时对账
+5. 推送可能乱序，已结束的委托或已成交数量变少的委托推送视为过期，忽略
+
+Examples
+--------
+>>> book = TradeBook()
+>>> callback = MyXtQuantTraderCallback(book=book)
+>>> ...
+>>> book.start(xt_trader, acc, interval=60)
+>>> df = send_orders_1(xt_trader, acc, details, d1d, i1d, snapshot, book=book)
+
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from loguru import logger
+
+from qmt_quote.enums import OrderStatus
+from qmt_quote.xt_records import to_dict
+
+# 与xtconstant.STOCK_BUY/STOCK_SELL相同
+STOCK_BUY = 23
+STOCK_SELL = 24
+
+# 可撤的委托状态
+CANCELABLE = (OrderStatus.Unreported, OrderStatus.WaitReporting, OrderStatus.Reported,
+              OrderStatus.ReportedCancel, OrderStatus.PartSuccCancel, OrderStatus.PartSucc)
+# 已结束的委托状态
+FINISHED = (OrderStatus.PartCancel, OrderStatus.Canceled, OrderStatus.Succeeded, OrderStatus.Junk)
+
+
+class TradeBook:
+    """委托、成交、持仓、资金的本地副本，线程安全"""
+
+    def __init__(self):
+        # order_id -> XtOrder字段
+        self.orders: Dict[int, Dict[str, Any]] = {}
+        # traded_id -> XtTrade字段
+        self.trades: Dict[str, Dict[str, Any]] = {}
+        # stock_code -> XtPosition字段
+        self.positions: Dict[str, Dict[str, Any]] = {}
+        # XtAsset字段
+        self.asset: Dict[str, Any] = {}
+        # order_id -> 买入委托还冻结着的资金
+        self.frozen: Dict[int, float] = {}
+        # 异步下单的seq -> order_id
+        self.seqs: Dict[int, int] = {}
+        self._lock = threading.RLock()
+        # 对账期间到达的推送，覆盖后重放。None表示不在对账
+        self._recording: Optional[List[Tuple[str, Any]]] = None
+        # 同一时间只做一次对账
+        self._reconcile_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _query_orders_trades(trader, account) -> Tuple[Dict[int, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        orders = {o.order_id: to_dict(o) for o in trader.query_stock_orders(account)}
+        trades = {t.traded_id: to_dict(t) for t in trader.query_stock_trades(account)}
+        return orders, trades
+
+    @staticmethod
+    def _frozen_of(orders: Dict[int, Dict[str, Any]]) -> Dict[int, float]:
+        """未结束的买入委托按委托价冻结的资金，与查询到的可用资金、冻结资金对应"""
+        return {k: max(o['order_volume'] - o['traded_volume'], 0) * o['price'] for k, o in orders.items()
+                if o['order_type'] == STOCK_BUY and o['order_status'] not in FINISHED}
+
+    @staticmethod
+    def _same(a: Tuple[dict, dict], b: Tuple[dict, dict]) -> bool:
+        """两次查询之间没有新的委托、成交，也没有委托状态变化"""
+        return (a[1].keys() == b[1].keys() and
+                {k: (v['order_status'], v['traded_volume']) for k, v in a[0].items()} ==
+                {k: (v['order_status'], v['traded_volume']) for k, v in b[0].items()})
+
+    def reconcile(self, trader, account, max_retry: int = 3) -> "TradeBook":
+        """全量查询柜台，覆盖本地状态
+
+        1. 查询在锁外进行，不阻塞交易回调和下单前的读取
+        2. 先查委托、成交，再查持仓、资金，然后再查一次委托、成交。两次相同说明中间没有新的成交，
+           持仓与成交是一致的；不同时重试，最多max_retry次
+        3. 查询期间到达的推送照常更新本地状态，同时记下来，覆盖后再重放一次。
+           成交按traded_id去重，委托只在状态变化时冻结、释放，已在查询结果中的推送不会重复计算
+
+        """
+        with self._reconcile_lock:
+            with self._lock:
+                self._recording = []
+            try:
+                before = self._query_orders_trades(trader, account)
+                for i in range(max_retry):
+                    positions = {p.stock_code: to_dict(p) for p in trader.query_stock_positions(account)}
+                    asset = to_dict(trader.query_stock_asset(account))
+                    after = self._query_orders_trades(trader, account)
+                    if self._same(before, after):
+                        break
+                    before = after
+                else:
+                    logger.warning("对账期间委托、成交一直在变化，持仓可能与成交不一致，下次对账时修正")
+                with self._lock:
+                    pushes, self._recording = self._recording, None
+                    self.asset = asset
+                    self.positions = positions
+                    self.orders, self.trades = after
+                    self.frozen = self._frozen_of(self.orders)
+                    for kind, obj in pushes:
+                        if kind == "order":
+                            self.on_stock_order(obj)
+                        else:
+                            self.on_stock_trade(obj)
+            finally:
+                with self._lock:
+                    self._recording = None
+        return self
+
+    def start(self, trader, account, interval: float = 60) -> "TradeBook":
+        """先对账一次，然后在后台线程中每interval秒对账一次"""
+        self.reconcile(trader, account)
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reconcile(trader, account)
+                except Exception as e:
+                    # 对账失败不影响增量更新，下次再试
+                    logger.warning("对账失败：{}", e)
+
+        self._thread = threading.Thread(target=run, name="trade_book", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _position(self, stock_code: str) -> Dict[str, Any]:
+        p = self.positions.get(stock_code)
+        if p is None:
+            p = self.positions[stock_code] = {'stock_code': stock_code, 'volume': 0, 'can_use_volume': 0}
+        return p
+
+    def _unfreeze(self, amount: float) -> None:
+        """冻结资金转回可用资金。amount为负时表示冻结"""
+        if 'cash' in self.asset:
+            self.asset['cash'] += amount
+        if 'frozen_cash' in self.asset:
+            self.asset['frozen_cash'] -= amount
+
+    # ===== 以下由MyXtQuantTraderCallback转发 =====
+    def on_stock_order(self, order) -> None:
+        d = to_dict(order)
+        with self._lock:
+            if self._recording is not None:
+                self._recording.append(("order", order))
+            old = self.orders.get(order.order_id)
+            if old is not None and (old['order_status'] in FINISHED and order.order_status not in FINISHED or
+                                    old['traded_volume'] > order.traded_volume):
+                # 过期的推送
+                return
+            self.orders[order.order_id] = d
+            if order.order_type == STOCK_BUY:
+                if old is None and order.order_status not in FINISHED:
+                    # 新的买入委托，冻结资金。先到的成交已从可用资金中扣过，只冻结未成交部分
+                    amount = max(order.order_volume - order.traded_volume, 0) * order.price
+                    self.frozen[order.order_id] = amount
+                    self._unfreeze(-amount)
+                elif old is not None and old['order_status'] not in FINISHED and order.order_status in FINISHED:
+                    # 结束时释放剩余的冻结资金。成交价低于委托价时也有剩余
+                    self._unfreeze(self.frozen.pop(order.order_id, 0.0))
+                return
+            if order.order_type != STOCK_SELL:
+                return
+            p = self._position(order.stock_code)
+            if old is None and order.order_status not in FINISHED:
+                # 新的卖出委托，冻结可用数量
+                p['can_use_volume'] = max(p['can_use_volume'] - order.order_volume, 0)
+            elif old is not None and old['order_status'] not in FINISHED and order.order_status in FINISHED:
+                # 结束时释放未成交部分
+                p['can_use_volume'] += order.order_volume - order.traded_volume
+
+    def on_stock_trade(self, trade) -> None:
+        d = to_dict(trade)
+        with self._lock:
+            if self._recording is not None:
+                self._recording.append(("trade", trade))
+            if trade.traded_id in self.trades:
+                return
+            self.trades[trade.traded_id] = d
+            p = self._position(trade.stock_code)
+            if trade.order_type == STOCK_BUY:
+                # T+1，当天买入的不可卖
+                p['volume'] += trade.traded_volume
+                # 先用委托时冻结的资金，委托推送还没到时没有冻结，直接扣可用资金
+                used = min(self.frozen.get(trade.order_id, 0.0), trade.traded_amount)
+                if trade.order_id in self.frozen:
+                    self.frozen[trade.order_id] -= used
+                self._unfreeze(used)
+                if 'cash' in self.asset:
+                    self.asset['cash'] -= trade.traded_amount
+            elif trade.order_type == STOCK_SELL:
+                # 可用数量已在委托时冻结
+                p['volume'] = max(p['volume'] - trade.traded_volume, 0)
+                if 'cash' in self.asset:
+                    self.asset['cash'] += trade.traded_amount
+
+    def on_order_stock_async_response(self, response) -> None:
+        with self._lock:
+            self.seqs[response.seq] = response.order_id
+
+    # ===== 以下供下单前读取 =====
+    def get_position(self, stock_code: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.positions.get(stock_code, {'stock_code': stock_code, 'volume': 0, 'can_use_volume': 0}))
+
+    def positions_dataframe(self) -> pd.DataFrame:
+        """持仓，列与`objs_to_dataframe(query_stock_positions())`相同"""
+        with self._lock:
+            return pd.DataFrame.from_records([dict(p) for p in self.positions.values()])
+
+    def orders_dataframe(self, cancelable_only: bool = False) -> pd.DataFrame:
+        """委托，列与`objs_to_dataframe(query_stock_orders())`相同"""
+        with self._lock:
+            orders = [dict(o) for o in self.orders.values()
+                      if not cancelable_only or o['order_status'] in CANCELABLE]
+        return pd.DataFrame.from_records(orders)
+
+    def trades_dataframe(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame.from_records([dict(t) for t in self.trades.values()])
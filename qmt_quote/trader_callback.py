@@ -3,6 +3,15 @@ from xtquant.xttrader import XtQuantTraderCallback
 
 
 class MyXtQuantTraderCallback(XtQuantTraderCallback):
+    def __init__(self, dispatcher=None, book=None):
+        """
+        :param dispatcher: OrderDispatcher，异步回报和失败推送转发给它，用于对应seq和重试
+        :param book: TradeBook，委托、成交推送转发给它，维护本地交易状态
+        """
+        super().__init__()
+        self.dispatcher = dispatcher
+        self.book = book
+
     def on_disconnected(self):
         """
         连接断开
@@ -24,6 +33,8 @@ class MyXtQuantTraderCallback(XtQuantTraderCallback):
         :return:
         """
         logger.info("on_stock_order:{},order_status={},order_sysid={}", order.stock_code, order.order_status, order.order_sysid)
+        if self.book is not None:
+            self.book.on_stock_order(order)
 
     def on_stock_trade(self, trade):
         """
@@ -32,6 +43,8 @@ class MyXtQuantTraderCallback(XtQuantTraderCallback):
         :return:
         """
         logger.info("on_stock_trade:{},{},{}", trade.account_id, trade.stock_code, trade.order_id)
+        if self.book is not None:
+            self.book.on_stock_trade(trade)
 
     def on_order_error(self, order_error):
         """
@@ -40,6 +53,8 @@ class MyXtQuantTraderCallback(XtQuantTraderCallback):
         :return:
         """
         logger.info("on_order_error:{},{},{}", order_error.order_id, order_error.error_id, order_error.error_msg)
+        if self.dispatcher is not None:
+            self.dispatcher.on_order_error(order_error)
 
     def on_cancel_error(self, cancel_error):
         """
@@ -48,6 +63,8 @@ class MyXtQuantTraderCallback(XtQuantTraderCallback):
         :return:
         """
         logger.info("on_cancel_error:{},{},{}", cancel_error.order_id, cancel_error.error_id, cancel_error.error_msg)
+        if self.dispatcher is not None:
+            self.dispatcher.on_cancel_error(cancel_error)
 
     def on_order_stock_async_response(self, response):
         """
@@ -56,6 +73,10 @@ class MyXtQuantTraderCallback(XtQuantTraderCallback):
         :return:
         """
         logger.info("on_order_stock_async_response:{},order_id={},seq={}", response.account_id, response.order_id, response.seq)
+        if self.book is not None:
+            self.book.on_order_stock_async_response(response)
+        if self.dispatcher is not None:
+            self.dispatcher.on_order_stock_async_response(response)
 
     def on_cancel_order_stock_async_response(self, response):
         """
@@ -64,3 +85,5 @@ class MyXtQuantTraderCallback(XtQuantTraderCallback):
         """
         # print(to_dict(response))
         logger.info("on_cancel_order_stock_async_response:{},order_id={},seq={}", response.account_id, response.order_id, response.seq)
+        if self.dispatcher is not None:
+            self.dispatcher.on_cancel_order_stock_async_response(response)
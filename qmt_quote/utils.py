@@ -88,7 +88,7 @@ def cast_datetime(df: pl.DataFrame, col: pl.Expr = pl.col('time')) -> pl.DataFra
     return df.with_columns(col.cast(pl.Datetime(time_unit="ms", time_zone="Asia/Shanghai")))
 
 
-def arr_to_pl(arr: np.ndarray, col: Expr = pl.col('time')) -> pl.DataFrame:
+def arr_to_pl(arr: np.ndarray, col: Expr = pl.col('time'), symbols=None) -> pl.DataFrame:
     """numpy数组转polars DataFrame
 
     Parameters
@@ -97,9 +97,14 @@ def arr_to_pl(arr: np.ndarray, col: Expr = pl.col('time')) -> pl.DataFrame:
         numpy数组
     col : pl.Expr
         时间列。可以同时转换多个列，如：pl.col('time', 'open_dt', 'close_dt')
+    symbols: SymbolTable
+        代码表。数据为整数编号格式时，将编号转回代码
 
     """
-    return cast_datetime(pl.from_numpy(arr), col)
+    df = pl.from_numpy(arr)
+    if symbols is not None:
+        df = symbols.decode_frame(df)
+    return cast_datetime(df, col)
 
 
 def concat_intraday(df1: Optional[pl.DataFrame], df2: pl.DataFrame,
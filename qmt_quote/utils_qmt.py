@@ -1,17 +1,21 @@
 """
 依赖于QMT的工具函数
+
+行情函数经由`qmt_quote.quote_source`，没有QMT时可换成本地回放
 """
 import time
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Union
 
 import numpy as np
 import pandas as pd
 import polars as pl
 from tqdm import tqdm
-from xtquant import xtdata
 
 from qmt_quote.enums import InstrumentType
+from qmt_quote.factor_cache import FactorCache
+from qmt_quote.quote_source import xtdata
+from qmt_quote.symbols import SymbolTable
 from qmt_quote.utils import cast_datetime, concat_dataframes_from_dict, ticks_to_dataframe, calc_factor1
 
 
@@ -108,31 +112,48 @@ def load_history_data(path: str, type: int = InstrumentType.Stock) -> pl.DataFra
     return df
 
 
-def last_factor(arr: np.ndarray, func=None, filter_label1: float = 0, filter_label2: float = 0) -> pl.DataFrame:
+def last_factor(arr: Union[np.ndarray, pl.DataFrame], func=None, filter_label1: float = 0, filter_label2: float = 0,
+                symbols: Optional[SymbolTable] = None, factors: Optional[FactorCache] = None) -> pl.DataFrame:
     """获取最终因子值
 
     Parameters
     ----------
     arr:
-        当日分钟数据
+        当日分钟数据。可以是结构化数组，也可以是`ColumnStore`读出的DataFrame(零拷贝，省去行转列)
     filter_label1:int
         只取已经完成的K线数据。底层需要*1000转ms
     filter_label2:int
         只取指定K线。底层需要*1000转ms
     func
         因子计算函数
+    symbols: SymbolTable
+        代码表。数据为整数编号格式时，计算完成后再将编号转回代码，只转换最后留下的行
+    factors: FactorCache
+        复权因子缓存。不为None时查表得到factor2，不再调用calc_factor1全表排序
+
+    Notes
+    -----
+    整数编号格式时，因子计算过程中`stock_code`是整数，分组排序都不受影响
 
     """
-    arr = arr[arr['type'] == InstrumentType.Stock]  # 过滤掉指数，只处理股票
+    if not isinstance(arr, pl.DataFrame):
+        arr = pl.from_numpy(arr)
+    # 过滤掉指数，只处理股票。类型与时间合并成一次过滤，只复制一次
+    cond = pl.col('type') == InstrumentType.Stock
     if filter_label1 > 0:
-        arr = arr[arr['time'] <= filter_label1]
-    df = pl.from_numpy(arr)
+        cond = cond & (pl.col('time') <= filter_label1)
+    df = arr.filter(cond)
     # 注意：时间没有转换成datetime类型
-    df = calc_factor1(df)
+    if factors is None:
+        df = calc_factor1(df)
+    else:
+        df = factors.apply(df)
     if func is not None:
         df = func(df)
     if filter_label2 > 0:
         # df = df.filter(pl.col('time').dt.timestamp(time_unit='ms') == filter_label2)
         df = df.filter(pl.col('time') >= filter_label2)
+    if symbols is not None:
+        df = symbols.decode_frame(df)
     df = cast_datetime(df, col=pl.col('time', 'open_dt', 'close_dt'))
     return df
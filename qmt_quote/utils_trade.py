@@ -9,18 +9,14 @@ from xtquant.xtconstant import *  # noqa
 
 from examples.config import TOTAL_ASSET
 from qmt_quote.enums import SizeType, BoardType
+from qmt_quote.order_dispatcher import OrderDispatcher
+from qmt_quote.ref_data import RefData
+from qmt_quote.row_index import RowIndex
+from qmt_quote.snapshot import Snapshot
+from qmt_quote.trade_book import TradeBook
 from qmt_quote.utils import get_board_type
 from qmt_quote.utils_qmt import get_instrument_detail_wrap
-
-
-def to_dict(obj):
-    """将xtquant对象转换为字典，排除私有属性和以m_开头的属性"""
-    return {attr: getattr(obj, attr) for attr in dir(obj) if not attr.startswith(("__", "m_"))}
-
-
-def objs_to_dataframe(objs):
-    """对象列表转换为DataFrame"""
-    return pd.DataFrame.from_records([to_dict(o) for o in objs])
+from qmt_quote.xt_records import to_dict, objs_to_dataframe  # noqa
 
 
 @njit
@@ -253,10 +249,72 @@ def adjust_quantity(is_buy: bool, board_type: BoardType, quantity: int,
     return quantity
 
 
+# 标量版的numba版本，供数组版在循环中调用。标量版保持纯Python，返回int
+_adjust_quantity = njit(adjust_quantity)
+
+
+@njit(cache=True)
+def adjust_price_1_array(is_buy: np.ndarray, priority: int, offset: int,
+                         bid_1: np.ndarray, ask_1: np.ndarray,
+                         last_price: np.ndarray, pre_close: np.ndarray,
+                         tick: float = 0.01) -> np.ndarray:
+    """`adjust_price_1`的数组版，一次处理整列
+
+    DataFrame.apply(axis=1)每行都要装箱成Series再调用，几百只股票就要几百毫秒。这里直接传入各列的numpy数组
+    """
+    out = np.empty(len(is_buy), dtype=np.float64)
+    for i in range(len(is_buy)):
+        out[i] = adjust_price_1(is_buy[i], priority, offset, bid_1[i], ask_1[i], last_price[i], pre_close[i], tick)
+    return out
+
+
+@njit(cache=True)
+def adjust_price_2_array(is_buy: np.ndarray, board_type: np.ndarray, price: np.ndarray,
+                         bid_1: np.ndarray, ask_1: np.ndarray,
+                         last_price: np.ndarray, pre_close: np.ndarray,
+                         tick: float = 0.01) -> np.ndarray:
+    """`adjust_price_2`的数组版，一次处理整列"""
+    out = np.empty(len(is_buy), dtype=np.float64)
+    for i in range(len(is_buy)):
+        out[i] = adjust_price_2(is_buy[i], board_type[i], price[i], bid_1[i], ask_1[i], last_price[i], pre_close[i],
+                                tick)
+    return out
+
+
+@njit(cache=True)
+def adjust_price_3_array(is_buy: np.ndarray, price: np.ndarray,
+                         limit_down: np.ndarray, limit_up: np.ndarray,
+                         ndigits: int = 100) -> np.ndarray:
+    """`adjust_price_3`的数组版，一次处理整列"""
+    out = np.empty(len(is_buy), dtype=np.float64)
+    for i in range(len(is_buy)):
+        out[i] = adjust_price_3(is_buy[i], price[i], limit_down[i], limit_up[i], ndigits)
+    return out
+
+
+@njit(cache=True)
+def adjust_quantity_array(is_buy: np.ndarray, board_type: np.ndarray, quantity: np.ndarray,
+                          can_use_volume: np.ndarray, tolerance: int = 10) -> np.ndarray:
+    """`adjust_quantity`的数组版，一次处理整列
+
+    Returns
+    -------
+    np.ndarray
+        调整后的数量，int64
+
+    """
+    out = np.empty(len(is_buy), dtype=np.int64)
+    for i in range(len(is_buy)):
+        out[i] = int(_adjust_quantity(is_buy[i], board_type[i], float(quantity[i]), float(can_use_volume[i]),
+                                      tolerance))
+    return out
+
+
 def cancel_orders(trader, account, orders: Optional[pd.DataFrame] = None,
                   direction: int = 0,
                   strategy_name: str = None, order_remark: str = None,
-                  do_async: bool = False) -> pd.DataFrame:
+                  do_async: bool = False, dispatcher: Optional[OrderDispatcher] = None,
+                  timeout: float = 30, book: Optional[TradeBook] = None) -> pd.DataFrame:
     """撤单
 
     Parameters
@@ -278,6 +336,12 @@ def cancel_orders(trader, account, orders: Optional[pd.DataFrame] = None,
         备注
     do_async:bool
         是否异步撤单。异步撤单可能会引发流控
+    dispatcher: OrderDispatcher
+        调度器。有它时由调度器限速并发撤单，并等待完成，do_async不再起作用
+    timeout: float
+        使用调度器时最多等待的秒数
+    book: TradeBook
+        本地交易状态。orders为None时从它取可撤委托，不再查询柜台
 
     Returns
     -------
@@ -295,7 +359,9 @@ def cancel_orders(trader, account, orders: Optional[pd.DataFrame] = None,
 
 
     """
-    if orders is None:
+    if orders is None and book is not None:
+        orders = book.orders_dataframe(cancelable_only=True)
+    elif orders is None:
         orders = trader.query_stock_orders(account, cancelable_only=True)
         orders = objs_to_dataframe(orders)
     else:
@@ -319,6 +385,11 @@ def cancel_orders(trader, account, orders: Optional[pd.DataFrame] = None,
     # 记录请求序列号
     if 'seq' not in orders.columns:
         orders['seq'] = 0
+    if dispatcher is not None:
+        reqs = [dispatcher.submit_cancel(order_id) for order_id in orders['order_id'].tolist()]
+        dispatcher.wait(timeout, reqs)
+        orders['seq'] = [r.seq for r in reqs]
+        return orders
     for i, row in orders.iterrows():
         if do_async:
             # TODO 不能撤太快，会引发流控
@@ -329,13 +400,19 @@ def cancel_orders(trader, account, orders: Optional[pd.DataFrame] = None,
     return orders
 
 
-def before_market_open(G):
+def before_market_open(G, ref: Optional[RefData] = None, force: bool = False, after: str = ""):
     """下载板块数据，获取当天涨跌停价
 
     Parameters
     ----------
     G: object
         全局变量对象。此函数中用于记录板块数据
+    ref: RefData
+        参考数据缓存。当天已生成时直接加载，不再下载板块数据、逐只查询详情，盘中重启很快
+    force: bool
+        强制重新生成参考数据
+    after: str
+        `HHMM`，参考数据早于此时刻生成的视为过期，重新生成
 
     Returns
     -------
@@ -351,6 +428,17 @@ def before_market_open(G):
     遇到风险股票时，公告出来了，但更名还是晚一步。所以需要使用其他手段获取并标记
 
     """
+    if ref is not None:
+        def stock_list():
+            xtdata.download_sector_data()
+            return xtdata.get_stock_list_in_sector("沪深A股")
+
+        details = ref.get_or_build(stock_list, force=force, after=after).to_dataframe()
+        G.沪深A股 = details.index.tolist()
+        G.科创板 = details.index[details['board_type'] == BoardType.KCB].tolist()
+        G.创业板 = details.index[details['board_type'] == BoardType.CYB].tolist()
+        return details
+
     # 先下载板块数据
     xtdata.download_sector_data()
     # 没有 京市A股 沪深风险警示 沪深退市整理
@@ -368,7 +456,8 @@ def before_market_open(G):
     return details
 
 
-def send_orders_1(trader, account, details, npyt_obj: NPYT):
+def send_orders_1(trader, account, details, npyt_obj: Optional[NPYT] = None, index: Optional[RowIndex] = None,
+                  snapshot: Optional[Snapshot] = None, book: Optional[TradeBook] = None):
     """下单前准备工作第1步
 
     1. 获取可卖出持仓数量
@@ -383,6 +472,14 @@ def send_orders_1(trader, account, details, npyt_obj: NPYT):
         - board_type:int (required)
         - DownStopPrice:float (required)
         - UpStopPrice:float (required)
+    npyt_obj: NPYT
+        日线
+    index: RowIndex
+        日线的行号索引。有时直接取每只股票最新一行，不用tail后去重
+    snapshot: Snapshot
+        最新快照。有时优先使用，不再读日线
+    book: TradeBook
+        本地交易状态。有时从它取持仓，不再查询柜台
 
     Returns
     -------
@@ -398,24 +495,39 @@ def send_orders_1(trader, account, details, npyt_obj: NPYT):
     返回的是全部股票，使用前需要过滤
 
     """
-    # 从内存映射文件中读取日线数据，内有买卖一价
-    end = npyt_obj.end()
-    assert end > 0, 'No data in memory mapping file.'
+    if snapshot is not None:
+        # 快照已是每只股票一行，字段名与get_full_tick相同
+        arr = snapshot.data()
+        assert len(arr) > 0, 'No data in snapshot.'
+        ticks = pd.DataFrame(arr).set_index('stock_code')
+    else:
+        # 从内存映射文件中读取日线数据，内有买卖一价
+        end = npyt_obj.end()
+        assert end > 0, 'No data in memory mapping file.'
 
-    ticks = pd.DataFrame(npyt_obj.tail(TOTAL_ASSET)).drop_duplicates(
-        subset=['stock_code'], keep='last').set_index('stock_code')
+        if index is None:
+            ticks = pd.DataFrame(npyt_obj.tail(TOTAL_ASSET)).drop_duplicates(
+                subset=['stock_code'], keep='last').set_index('stock_code')
+        else:
+            ticks = pd.DataFrame(npyt_obj._a[index.latest()]).set_index('stock_code')
+        ticks.rename(columns={'close': 'lastPrice', 'preClose': 'lastClose'}, inplace=True)
     # volume与Position中重名，所以改一下。其他名字与get_full_tick相同
-    ticks.rename(columns={'close': 'lastPrice', 'preClose': 'lastClose', 'volume': 'VOLUME'}, inplace=True)
-    # 合并涨跌停
+    ticks.rename(columns={'volume': 'VOLUME'}, inplace=True)
+    # 合并涨跌停。快照中也有涨跌停价，以details为准，避免重名
+    ticks = ticks.drop(columns=ticks.columns.intersection(details.columns))
     df = pd.merge(details, ticks, left_index=True, right_index=True, how='left')
     # 获取可卖出持仓数量
-    if (trader is not None) and (account is not None):
-        positions = trader.query_stock_positions(account)
-        if len(positions) > 0:
-            positions = objs_to_dataframe(positions).set_index('stock_code')
-            df = pd.merge(df, positions, left_index=True, right_index=True, how='left')
-            df['can_use_volume'] = df['can_use_volume'].fillna(0).astype(int)
-            df['volume'] = df['volume'].fillna(0).astype(int)
+    if book is not None:
+        positions = book.positions_dataframe()
+    elif (trader is not None) and (account is not None):
+        positions = objs_to_dataframe(trader.query_stock_positions(account))
+    else:
+        positions = pd.DataFrame()
+    if len(positions) > 0:
+        positions = positions.set_index('stock_code')
+        df = pd.merge(df, positions, left_index=True, right_index=True, how='left')
+        df['can_use_volume'] = df['can_use_volume'].fillna(0).astype(int)
+        df['volume'] = df['volume'].fillna(0).astype(int)
 
     # position为空，将重要地方补全，后面会用到
     if 'can_use_volume' not in df.columns:
@@ -455,7 +567,8 @@ def send_orders_2(orders: pd.DataFrame, new_orders: pd.DataFrame, size: float =
     return orders
 
 
-def send_orders_3(trader, account, orders: pd.DataFrame, size_type: SizeType) -> pd.DataFrame:
+def send_orders_3(trader, account, orders: pd.DataFrame, size_type: SizeType,
+                  book: Optional[TradeBook] = None) -> pd.DataFrame:
     """下单前准备工作第3步。没有第2步，因为第2步是用户自己设置的
 
     1. 委托量计算
@@ -473,6 +586,8 @@ def send_orders_3(trader, account, orders: pd.DataFrame, size_type: SizeType) ->
         - quantity:int (required)
         - is_buy:bool (required)
     size_type:str
+    book: TradeBook
+        本地交易状态。有时从它取总资产，不再查询柜台
 
     
     Returns
@@ -496,7 +611,7 @@ def send_orders_3(trader, account, orders: pd.DataFrame, size_type: SizeType) ->
         return orders
 
     # 查可用资金
-    asset = to_dict(trader.query_stock_asset(account))
+    asset = book.asset if book is not None and len(book.asset) > 0 else to_dict(trader.query_stock_asset(account))
     total_asset = asset['total_asset']
 
     orders['size'] = orders['size'].fillna(0)
@@ -553,6 +668,7 @@ def send_orders_4(orders: pd.DataFrame, priority: int, offset: int, is_auction:
         - lastPrice:float (required)
         - lastClose:float (required)
         - is_buy:bool (required)
+        - board_type:int (required)
     priority:int
         报价激进或保守
     offset:int
@@ -571,23 +687,74 @@ def send_orders_4(orders: pd.DataFrame, priority: int, offset: int, is_auction:
 
     # orders = orders[orders['stock_code'] == '002750.SZ'].copy()
 
+    # 一次取出各列，不再逐行apply
+    is_buy = orders['is_buy'].to_numpy(dtype=np.bool_)
+    bid_1 = orders['bidPrice_1'].to_numpy(dtype=np.float64)
+    ask_1 = orders['askPrice_1'].to_numpy(dtype=np.float64)
+    last_price = orders['lastPrice'].to_numpy(dtype=np.float64)
+    pre_close = orders['lastClose'].to_numpy(dtype=np.float64)
+
     # 根据需求设置下单价格
-    orders['price'] = orders.apply(
-        lambda x: adjust_price_1(x.is_buy, priority, offset, x.bidPrice_1, x.askPrice_1, x.lastPrice, x.lastClose,
-                                 tick=0.01), axis=1)
+    price = adjust_price_1_array(is_buy, priority, offset, bid_1, ask_1, last_price, pre_close, 0.01)
     if not is_auction:
         # 价格笼子调整
-        orders['price'] = orders.apply(
-            lambda x: adjust_price_2(x.is_buy, x.board_type, x.price, x.bidPrice_1, x.askPrice_1, x.lastPrice,
-                                     x.lastClose, tick=0.01), axis=1)
+        price = adjust_price_2_array(is_buy, orders['board_type'].to_numpy(dtype=np.int64), price,
+                                     bid_1, ask_1, last_price, pre_close, 0.01)
     # 涨跌停调整
-    orders['price'] = orders.apply(
-        lambda x: adjust_price_3(x.is_buy, x.price, x.DownStopPrice, x.UpStopPrice, ndigits=100), axis=1)
+    orders['price'] = adjust_price_3_array(is_buy, price,
+                                           orders['DownStopPrice'].to_numpy(dtype=np.float64),
+                                           orders['UpStopPrice'].to_numpy(dtype=np.float64), 100)
 
     return orders
 
 
-def send_orders_5(trader, account, orders: pd.DataFrame, order_remark: str, debug: bool = True) -> pd.DataFrame:
+def snapshot_reprice(snapshot: Snapshot, details: pd.DataFrame, priority: int = -1, offset: int = 0,
+                     is_auction: bool = False):
+    """下单调度器重试前的重新报价，规则同`send_orders_4`，价格取自最新快照
+
+    Parameters
+    ----------
+    snapshot: Snapshot
+        最新快照
+    details: pd.DataFrame
+        `before_market_open`的结果，取涨跌停价
+    priority:int
+        报价激进或保守
+    offset:int
+        报价偏移
+    is_auction:bool
+        是否集合竞价时段
+
+    Returns
+    -------
+    callable
+        传给`OrderDispatcher(reprice=...)`。快照或涨跌停价中没有此股票时返回None，放弃重试
+
+    """
+
+    def reprice(req) -> Optional[float]:
+        if req.stock_code not in details.index:
+            return None
+        arr = snapshot.data()
+        rows = arr[arr['stock_code'] == req.stock_code]
+        if len(rows) == 0:
+            return None
+        r = rows[-1]
+        is_buy = req.order_type == xtconstant.STOCK_BUY
+        bid_1, ask_1 = float(r['bidPrice_1']), float(r['askPrice_1'])
+        last_price, pre_close = float(r['lastPrice']), float(r['lastClose'])
+        price = adjust_price_1(is_buy, priority, offset, bid_1, ask_1, last_price, pre_close, 0.01)
+        if not is_auction:
+            price = adjust_price_2(is_buy, get_board_type(req.stock_code), price,
+                                   bid_1, ask_1, last_price, pre_close, 0.01)
+        d = details.loc[req.stock_code]
+        return float(adjust_price_3(is_buy, price, float(d['DownStopPrice']), float(d['UpStopPrice']), 100))
+
+    return reprice
+
+
+def send_orders_5(trader, account, orders: pd.DataFrame, order_remark: str, debug: bool = True,
+                  dispatcher: Optional[OrderDispatcher] = None, timeout: float = 30) -> pd.DataFrame:
     """下单第5步
 
     1. 委托量调整
@@ -610,6 +777,10 @@ def send_orders_5(trader, account, orders: pd.DataFrame, order_remark: str, debu
         备注
     debug:bool
         调试，只打印不下单
+    dispatcher: OrderDispatcher
+        调度器。有它时由调度器限速并发下单，失败自动重试，并等待完成
+    timeout: float
+        使用调度器时最多等待的秒数
 
     Returns
     -------
@@ -626,8 +797,10 @@ def send_orders_5(trader, account, orders: pd.DataFrame, order_remark: str, debu
 
     orders['order_type'] = np.where(orders['is_buy'], xtconstant.STOCK_BUY, xtconstant.STOCK_SELL)
     # 委托量调整
-    orders['order_volume'] = orders.apply(
-        lambda x: adjust_quantity(x.is_buy, x.board_type, x['size'], x.can_use_volume, tolerance=10), axis=1)
+    orders['order_volume'] = adjust_quantity_array(orders['is_buy'].to_numpy(dtype=np.bool_),
+                                                   orders['board_type'].to_numpy(dtype=np.int64),
+                                                   orders['size'].to_numpy(dtype=np.float64),
+                                                   orders['can_use_volume'].to_numpy(dtype=np.float64), 10)
     # 过滤掉不交易的
     orders = orders[orders['order_volume'] > 0].copy()
     if orders.empty:
@@ -635,13 +808,23 @@ def send_orders_5(trader, account, orders: pd.DataFrame, order_remark: str, debu
 
     orders['seq'] = 0
     orders.reset_index(inplace=True)
+    reqs = {}
     for i, v in orders.iterrows():
         strategy_name = str(v['strategy_id'])
         value = v.price * v.order_volume
         print(
             f'stock_code={v.stock_code},is_buy={v.is_buy},price={v.price},order_volume={v.order_volume},{strategy_name=},{order_remark=},{value=}')
 
-        if not debug:
+        if debug:
+            continue
+        if dispatcher is not None:
+            reqs[i] = dispatcher.submit_order(v.stock_code, v.order_type, v.order_volume,
+                                              xtconstant.FIX_PRICE, v.price, strategy_name, order_remark)
+        else:
             orders.loc[i, 'seq'] = trader.order_stock_async(account, v.stock_code, v.order_type, v.order_volume,
                                                             xtconstant.FIX_PRICE, v.price, strategy_name, order_remark)
+    if len(reqs) > 0:
+        dispatcher.wait(timeout, reqs.values())
+        for i, r in reqs.items():
+            orders.loc[i, 'seq'] = r.seq
     return orders
@@ -0,0 +1,125 @@
+"""
+xtquant对象转记录
+
+原来`to_dict`对每个委托、持仓对象都调用一次`dir()`再逐个`getattr`，收盘前委托多时查一次要转很久。
+同一类对象的字段相同，这里按类型缓存字段列表，批量转换时用`attrgetter`一次取出一行，再按列组装
+
+1. 字段规则与原`to_dict`基本相同：排除`_`开头和`m_`开头的属性。xtquant对象没有`_`开头的字段
+2. `objs_to_columns`返回按列的list，`objs_to_dataframe`/`objs_to_polars`在此基础上构造
+3. `FakeXtOrder`等与xtquant中的对象字段相同，没有QMT时用于测试
+
+"""
+from operator import attrgetter
+from typing import Any, Dict, List, Sequence, Tuple
+
+import pandas as pd
+import polars as pl
+
+# (类型, 实例属性个数) -> (字段名, 取值函数)
+_CACHE: Dict[Tuple[type, int], Tuple[Tuple[str, ...], Any]] = {}
+
+
+def field_names(obj) -> Tuple[str, ...]:
+    """对象的字段名，每个类型只计算一次"""
+    return _fields(obj)[0]
+
+
+def _key(obj) -> Tuple[type, int]:
+    # 同一类型的字段一般相同。SimpleNamespace等实例字段可能不同，再按实例属性个数区分
+    d = getattr(obj, '__dict__', None)
+    return type(obj), -1 if d is None else len(d)
+
+
+def _fields(obj, refresh: bool = False) -> Tuple[Tuple[str, ...], Any]:
+    key = _key(obj)
+    cached = _CACHE.get(key)
+    if cached is None or refresh:
+        # xtquant的字段是实例属性，只能由实例得到
+        names = tuple(attr for attr in dir(obj) if not attr.startswith(("_", "m_")))
+        if len(names) > 1:
+            # 多个字段时attrgetter返回tuple
+            getter = attrgetter(*names)
+        elif len(names) == 1:
+            getter = (lambda o, g=attrgetter(names[0]): (g(o),))
+        else:
+            getter = (lambda o: ())
+        cached = _CACHE[key] = (names, getter)
+    return cached
+
+
+def _get(obj) -> Tuple[Tuple[str, ...], tuple]:
+    """字段名和值。同类对象的字段不同时(如SimpleNamespace)，按此对象重新计算"""
+    names, getter = _fields(obj)
+    try:
+        return names, getter(obj)
+    except AttributeError:
+        names, getter = _fields(obj, refresh=True)
+        return names, getter(obj)
+
+
+def to_dict(obj) -> Dict[str, Any]:
+    """将xtquant对象转换为字典，排除私有属性和以m_开头的属性"""
+    names, values = _get(obj)
+    return dict(zip(names, values))
+
+
+def objs_to_columns(objs: Sequence) -> Dict[str, List[Any]]:
+    """对象列表转换为按列的字典。对象需为同一类型"""
+    if len(objs) == 0:
+        return {}
+    key = _key(objs[0])
+    names, getter = _fields(objs[0])
+    try:
+        if any(_key(o) != key for o in objs):
+            raise AttributeError
+        rows = [getter(o) for o in objs]
+    except AttributeError:
+        # 字段不一致，逐个转换
+        return pd.DataFrame.from_records([to_dict(o) for o in objs]).to_dict(orient='list')
+    return {name: list(col) for name, col in zip(names, zip(*rows))}
+
+
+def objs_to_dataframe(objs: Sequence) -> pd.DataFrame:
+    """对象列表转换为DataFrame"""
+    return pd.DataFrame(objs_to_columns(objs))
+
+
+def objs_to_polars(objs: Sequence) -> pl.DataFrame:
+    """对象列表转换为polars DataFrame"""
+    return pl.DataFrame(objs_to_columns(objs))
+
+
+class FakeXtObject:
+    """模拟xtquant对象，字段由子类的_FIELDS指定，未传入的为默认值。_开头的类属性不会被当成字段"""
+    _FIELDS: Dict[str, Any] = {}
+
+    def __init__(self, **kwargs):
+        for name, default in self._FIELDS.items():
+            setattr(self, name, kwargs.pop(name, default))
+        if kwargs:
+            raise TypeError(f"unknown fields: {list(kwargs)}")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({to_dict(self)})"
+
+
+class FakeXtOrder(FakeXtObject):
+    _FIELDS = dict(account_type=2, account_id="", stock_code="", order_id=0, order_sysid="", order_time=0,
+                   order_type=0, order_volume=0, price_type=0, price=0.0, traded_volume=0, traded_price=0.0,
+                   order_status=0, status_msg="", strategy_name="", order_remark="", direction=0, offset_flag=0)
+
+
+class FakeXtTrade(FakeXtObject):
+    _FIELDS = dict(account_type=2, account_id="", stock_code="", order_type=0, traded_id="", traded_time=0,
+                   traded_price=0.0, traded_volume=0, traded_amount=0.0, order_id=0, order_sysid="",
+                   strategy_name="", order_remark="", direction=0, offset_flag=0)
+
+
+class FakeXtPosition(FakeXtObject):
+    _FIELDS = dict(account_type=2, account_id="", stock_code="", volume=0, can_use_volume=0, open_price=0.0,
+                   market_value=0.0, frozen_volume=0, on_road_volume=0, yesterday_volume=0, avg_price=0.0,
+                   direction=0)
+
+
+class FakeXtAsset(FakeXtObject):
+    _FIELDS = dict(account_type=2, account_id="", cash=0.0, frozen_cash=0.0, market_value=0.0, total_asset=0.0)
@@ -0,0 +1,50 @@
+"""
+列式K线文件：按时间索引取行号范围，代码列只转换新追加的行，清空后缓存作废
+
+python -m pytest tests/test_columnar.py
+"""
+import numpy as np
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from qmt_quote.columnar import ColumnStore
+from qmt_quote.dtypes import DTYPE_STOCK_1m
+from qmt_quote.row_index import RowIndex
+
+T0 = 1_700_000_040_000
+
+
+def make_bars(n: int, codes: list, t0: int = T0) -> np.ndarray:
+    arr = np.zeros(n, dtype=DTYPE_STOCK_1m)
+    # 每分钟len(codes)根
+    arr['time'] = t0 + np.arange(n) // len(codes) * 60000
+    arr['stock_code'] = np.array(codes)[np.arange(n) % len(codes)]
+    arr['close'] = np.arange(n)
+    return arr
+
+
+def test_between_and_cache(tmp_path):
+    w = ColumnStore(tmp_path / "c1m").save(DTYPE_STOCK_1m, capacity=1000).load(mmap_mode="r+")
+    i = RowIndex(tmp_path / "i1m").save(256, 64).load(mmap_mode="r+")
+    r = ColumnStore(tmp_path / "c1m").load(mmap_mode="r")
+    arr = make_bars(300, ["000001.SZ", "600000.SH", "000300.SH"])
+    w.write(arr, 0, 200)
+    i.update_time(arr, 0, 200)
+
+    df = r.between(i, T0 + 10 * 60000, T0 + 20 * 60000)
+    assert_frame_equal(df, pl.from_numpy(arr[30:60]))
+    # 只取最后n行
+    assert_frame_equal(r.between(i, 0, T0 + 20 * 60000, 10), pl.from_numpy(arr[50:60]))
+
+    # 追加新代码，只转换新行
+    arr[200:]['stock_code'] = "000002.SZ"
+    w.write(arr, 200, 300)
+    i.update_time(arr, 200, 300)
+    assert_frame_equal(r.to_polars(40), pl.from_numpy(arr[40:300]))
+    _, s0, cached = r._cache['stock_code']
+    assert s0 == 30 and len(cached) == 270 and cached.n_chunks() == 2
+
+    # 清空后同一行号换成了别的代码
+    other = make_bars(100, ["300750.SZ"])
+    w.clear().write(other, 0, 100)
+    assert_frame_equal(r.to_polars(), pl.from_numpy(other))
@@ -0,0 +1,64 @@
+"""
+紧凑tick格式：5档、1档无损往返，K线引擎收到紧凑格式时结果与标准格式相同
+
+python -m pytest tests/test_compact.py
+"""
+import numpy as np
+
+from qmt_quote.bars.labels import get_label_stock_1m
+from qmt_quote.bars.tick_array import MinuteBarManager
+from qmt_quote.compact import to_compact, from_compact, is_compact
+from qmt_quote.dtypes import DTYPE_STOCK_1t_ID, DTYPE_STOCK_1t_COMPACT, DTYPE_STOCK_1t_COMPACT1, DTYPE_STOCK_1m_ID
+
+TZ = 3600 * 8
+LEVEL_FIELDS = [f"{d}{k}_{i}" for d in ("ask", "bid") for k in ("Price", "Vol") for i in range(1, 6)]
+
+
+def make_ticks(n: int = 5000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    ticks = np.zeros(n, dtype=DTYPE_STOCK_1t_ID)
+    # 东八区两天，9:30起
+    t0 = (1_700_000_000_000 // 86400000) * 86400000 + int(1.5 * 3600000)
+    ticks['time'] = np.sort(t0 + rng.integers(0, 2, n) * 86400000 + rng.integers(0, 3600_000, n))
+    ticks['now'] = ticks['time'] + rng.integers(0, 500, n)
+    ticks['stock_code'] = rng.integers(0, 50, n)
+    for f in ['lastPrice', 'open', 'high', 'low', 'lastClose'] + [f for f in LEVEL_FIELDS if 'Price' in f]:
+        # 最小变动0.001元
+        ticks[f] = rng.integers(1000, 200000, n) / 1000
+    for f in [f for f in LEVEL_FIELDS if 'Vol' in f]:
+        ticks[f] = rng.integers(0, 100000, n)
+    ticks['amount'] = rng.random(n) * 1e8
+    ticks['volume'] = rng.integers(0, 10 ** 9, n)
+    ticks['type'] = rng.integers(0, 3, n)
+    return ticks
+
+
+def test_round_trip_5():
+    ticks = make_ticks()
+    arr = to_compact(ticks, DTYPE_STOCK_1t_COMPACT, TZ)
+    assert is_compact(arr.dtype) and not is_compact(ticks.dtype)
+    assert arr.itemsize < ticks.itemsize
+    assert np.array_equal(from_compact(arr, tz=TZ), ticks)
+
+
+def test_round_trip_1():
+    ticks = make_ticks()
+    out = from_compact(to_compact(ticks, DTYPE_STOCK_1t_COMPACT1, TZ), tz=TZ)
+    # 只保留第1档，其余档位为0
+    for name in ticks.dtype.names:
+        if name in LEVEL_FIELDS and not name.endswith("_1"):
+            assert (out[name] == 0).all(), name
+        else:
+            assert np.array_equal(out[name], ticks[name]), name
+
+
+def test_bar_manager_accepts_compact():
+    ticks = make_ticks()
+    bars = []
+    for data in [ticks, to_compact(ticks, DTYPE_STOCK_1t_COMPACT, TZ)]:
+        arr1, arr2 = np.zeros(len(ticks), dtype=DTYPE_STOCK_1m_ID), np.zeros(3, dtype=np.uint64)
+        bm = MinuteBarManager(arr1, arr2)
+        for i in range(0, len(data), 1000):
+            bm.extend(data[i:i + 1000], get_label_stock_1m, TZ)
+        bars.append(arr1[:bm.index])
+    assert len(bars[0]) > 0 and np.array_equal(bars[0], bars[1])
@@ -0,0 +1,52 @@
+"""
+复权因子缓存：查表结果与calc_factor1一致
+
+python -m pytest tests/test_factor_cache.py
+"""
+import numpy as np
+import polars as pl
+
+from qmt_quote.bars.tick_array import MultiBarManager
+from qmt_quote.dtypes import DTYPE_STOCK_1m
+from qmt_quote.factor_cache import FactorCache
+from qmt_quote.synthetic import generate_ticks
+from qmt_quote.utils import calc_factor1
+
+N = 50
+DAYS = ['2025-02-24', '2025-02-25', '2025-02-26', '2025-02-27', '2025-02-28']
+
+
+def test_apply_equals_calc_factor1(tmp_path):
+    sizes = [86400, 60]
+    arr1s = [np.zeros(N * 2000, DTYPE_STOCK_1m) for _ in sizes]
+    arr2s = [np.zeros(5, np.uint64) for _ in sizes]
+    bm = MultiBarManager(arr1s, arr2s, sizes)
+    for i, d in enumerate(DAYS[:4]):
+        bm.extend(generate_ticks(N, date=d, interval=30, seed=i), 3600 * 8)
+    # 开盘前由历史日线生成
+    FactorCache.from_bars(arr1s[0][:int(arr2s[0][1])]).save(tmp_path / "factor.npy")
+    factors = FactorCache().load(tmp_path / "factor.npy")
+
+    # 盘中补上当天
+    ticks = generate_ticks(N, date=DAYS[4], interval=30, seed=9)
+    half = len(ticks) // 2
+    for part in (ticks[:half], ticks[half:]):
+        bm.extend(part, 3600 * 8)
+        factors.update(arr1s[0][:int(arr2s[0][1])])
+
+    d1d = pl.from_numpy(arr1s[0][:int(arr2s[0][1])])
+    expected = calc_factor1(d1d).sort('stock_code', 'time')
+    got = factors.apply(d1d).sort('stock_code', 'time')
+    assert got.columns == expected.columns
+    assert np.allclose(got['factor1'].to_numpy(), expected['factor1'].to_numpy(), rtol=1e-6)
+    assert np.allclose(got['factor2'].to_numpy(), expected['factor2'].to_numpy(), rtol=1e-5)
+    assert (got['factor1'] != 1).sum() > 0
+
+    # 分钟线：只取尾部时，每只股票第一行为1，换日行为当天的除权比例
+    d1m = pl.from_numpy(arr1s[1][:int(arr2s[1][1])])
+    for df in (d1m, d1m.tail(N * 300)):
+        got = factors.apply(df)
+        assert got['factor2'].null_count() == 0 and got.height == df.height
+        ratio = (pl.col('factor2') / pl.col('factor2').shift(1)).over('stock_code', order_by='time')
+        expected = got.with_columns(_f1=ratio.fill_null(1).round(8))
+        assert np.allclose(expected['factor1'].to_numpy(), expected['_f1'].to_numpy(), rtol=1e-8)
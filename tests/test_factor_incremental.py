@@ -0,0 +1,64 @@
+"""
+增量因子与全量因子结果一致
+
+`factor_incremental.py`是`factor_calc.py`的手写增量版，修改公式后需运行此检查
+
+python -m pytest tests/test_factor_incremental.py
+"""
+import numpy as np
+import polars as pl
+
+from examples.factor_calc import main as factor_func
+from examples.factor_incremental import main as factor_inc, WINDOW
+from qmt_quote.bars.labels import get_label
+from qmt_quote.bars.tick_array import MultiBarManager
+from qmt_quote.dtypes import DTYPE_STOCK_1m
+from qmt_quote.incremental import IncrementalFactor
+from qmt_quote.synthetic import generate_ticks
+from qmt_quote.utils_qmt import last_factor
+
+N = 100
+BAR_SIZES = [86400, 300, 60]
+
+
+def _compare(full: pl.DataFrame, inc: pl.DataFrame) -> None:
+    columns = ['stock_code', 'time', 'MA5', 'MA10', 'A', 'OUT']
+    a = full.sort('stock_code').select(columns)
+    b = inc.sort('stock_code').select(columns)
+    assert a.shape == b.shape
+    assert a['stock_code'].equals(b['stock_code'])
+    assert a['time'].equals(b['time'])
+    # 全量计算时K线中的close为float32，增量版为float64，只能近似相等
+    for c in ('MA5', 'MA10', 'A'):
+        assert np.allclose(a[c].to_numpy().astype(float), b[c].to_numpy().astype(float), rtol=1e-4, atol=1e-6,
+                           equal_nan=True), c
+    assert a['OUT'].fill_null(False).equals(b['OUT'].fill_null(False))
+
+
+def test_incremental_equals_full():
+    # 两天，第二天换日时复权因子会变化
+    ticks = np.concatenate([generate_ticks(N, date='2025-02-27', interval=6),
+                            generate_ticks(N, date='2025-02-28', interval=6, seed=1)])
+    arr1s = [np.zeros(N * 600, dtype=DTYPE_STOCK_1m) for _ in BAR_SIZES]
+    arr2s = [np.zeros(5, dtype=np.uint64) for _ in BAR_SIZES]
+    bm = MultiBarManager(arr1s, arr2s, BAR_SIZES)
+    incs = [IncrementalFactor(factor_inc, WINDOW) for _ in BAR_SIZES]
+
+    batch = N * 10  # 1分钟的tick数量
+    checked = 0
+    for i, start in enumerate(range(0, len(ticks), batch)):
+        bm.extend(ticks[start:start + batch], 3600 * 8)
+        if i % 7 != 0:
+            continue
+        now = int(ticks[min(start + batch, len(ticks)) - 1]['time']) // 1000
+        for arr1, arr2, bar_size, inc in zip(arr1s, arr2s, BAR_SIZES, incs):
+            arr = arr1[:int(arr2[1])]
+            # 同strategy_runner，分钟线取已经不变化的K线，其他取变化中的K线
+            label = (get_label(now, bar_size, tz=3600 * 8) - (60 if bar_size == 60 else 0)) * 1000
+            _compare(last_factor(arr, factor_func, label, label), inc.last_factor(arr, label))
+            checked += 1
+    assert checked > 0
+
+
+if __name__ == "__main__":
+    test_incremental_equals_full()
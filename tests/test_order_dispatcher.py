@@ -0,0 +1,147 @@
+"""
+下单调度：只重试暂时性错误、重新报价、回报超时、提前到达的错误、按批等待、清理
+
+python -m pytest tests/test_order_dispatcher.py
+"""
+import itertools
+import time
+from types import SimpleNamespace
+
+from qmt_quote.enums import DispatchStatus
+from qmt_quote.order_dispatcher import OrderDispatcher, TIMEOUT_ERROR
+
+FLOW_CONTROL = -61
+REJECTED = -1
+
+
+class FakeTrader:
+    """柜台。errors[代码]为依次返回的错误号，silent中的代码不回报，early时错误先于seq返回"""
+
+    def __init__(self):
+        self.dispatcher = None
+        self.seqs = itertools.count(1)
+        self.order_ids = itertools.count(1000)
+        self.errors = {}
+        self.silent = set()
+        self.early = False
+        self.prices = []
+
+    def order_stock_async(self, account, stock_code, order_type, order_volume, price_type, price,
+                          strategy_name, order_remark):
+        seq, order_id = next(self.seqs), next(self.order_ids)
+        self.prices.append((stock_code, price))
+        if stock_code in self.silent:
+            return seq
+        errors = self.errors.get(stock_code, [])
+        error_id = errors.pop(0) if errors else 0
+        error = SimpleNamespace(seq=seq, order_id=order_id, error_id=error_id,
+                                error_msg="委托过于频繁" if error_id == FLOW_CONTROL else "资金不足")
+        if error_id and self.early:
+            # 回调线程比order_stock_async先返回
+            self.dispatcher.on_order_error(error)
+            return seq
+        self.dispatcher.on_order_stock_async_response(SimpleNamespace(seq=seq, order_id=order_id))
+        if error_id:
+            self.dispatcher.on_order_error(error)
+        return seq
+
+    def cancel_order_stock_async(self, account, order_id):
+        seq = next(self.seqs)
+        self.dispatcher.on_cancel_order_stock_async_response(
+            SimpleNamespace(seq=seq, order_id=order_id, cancel_result=0))
+        return seq
+
+
+def make(trader: FakeTrader, **kwargs) -> OrderDispatcher:
+    kwargs = dict(dict(order_rate=1000, order_burst=100, backoff=0.01, response_timeout=0.2,
+                       retry_error_ids=(FLOW_CONTROL,)), **kwargs)
+    trader.dispatcher = OrderDispatcher(trader, "acc", **kwargs)
+    return trader.dispatcher.start()
+
+
+def test_retry_transient_only():
+    trader = FakeTrader()
+    trader.errors = {"000001.SZ": [FLOW_CONTROL], "000002.SZ": [REJECTED]}
+    d = make(trader)
+    try:
+        ok = d.submit_order("000001.SZ", 23, 100, 11, 10.0)
+        bad = d.submit_order("000002.SZ", 23, 100, 11, 10.0)
+        assert d.wait(5, [ok, bad])
+    finally:
+        d.stop()
+    assert ok.status == DispatchStatus.Done and ok.attempts == 2
+    # 拒单不重试
+    assert bad.status == DispatchStatus.Failed and bad.attempts == 1
+
+
+def test_reprice_before_retry():
+    trader = FakeTrader()
+    trader.errors = {"000001.SZ": [FLOW_CONTROL, FLOW_CONTROL], "000002.SZ": [FLOW_CONTROL]}
+
+    def reprice(req):
+        return None if req.stock_code == "000002.SZ" else req.price + 0.01
+
+    d = make(trader, reprice=reprice)
+    try:
+        a = d.submit_order("000001.SZ", 23, 100, 11, 10.0)
+        b = d.submit_order("000002.SZ", 23, 100, 11, 10.0)
+        assert d.wait(5, [a, b])
+    finally:
+        d.stop()
+    assert a.status == DispatchStatus.Done and a.attempts == 3
+    assert [round(p, 2) for c, p in trader.prices if c == "000001.SZ"] == [10.0, 10.01, 10.02]
+    # 无法重新报价时放弃
+    assert b.status == DispatchStatus.Failed and b.attempts == 1
+
+
+def test_early_error():
+    trader = FakeTrader()
+    trader.early = True
+    trader.errors = {"000001.SZ": [FLOW_CONTROL], "000002.SZ": [REJECTED]}
+    d = make(trader)
+    try:
+        a = d.submit_order("000001.SZ", 23, 100, 11, 10.0)
+        b = d.submit_order("000002.SZ", 23, 100, 11, 10.0)
+        assert d.wait(5, [a, b])
+    finally:
+        d.stop()
+    assert a.status == DispatchStatus.Done and a.attempts == 2
+    assert b.status == DispatchStatus.Failed and b.attempts == 1
+    assert len(d._early_errors) == 0
+
+
+def test_response_timeout_and_wait_batch():
+    trader = FakeTrader()
+    trader.silent = {"000001.SZ"}
+    d = make(trader)
+    try:
+        lost = d.submit_order("000001.SZ", 23, 100, 11, 10.0)
+        batch = [d.submit_order("000002.SZ", 23, 100, 11, 10.0), d.submit_cancel(1)]
+        # 只等本批，不受没有回报的请求影响
+        assert d.wait(0.1, batch)
+        assert lost.status == DispatchStatus.Sent
+        assert d.wait(5)
+    finally:
+        d.stop()
+    # 可能已下单，不重发
+    assert lost.status == DispatchStatus.Failed and lost.error == TIMEOUT_ERROR and lost.attempts == 1
+    # 超时后回报才到，说明已下单
+    d.on_order_stock_async_response(SimpleNamespace(seq=lost.seq, order_id=999))
+    assert lost.status == DispatchStatus.Done and lost.order_id == 999
+
+
+def test_prune_and_bounded_early():
+    trader = FakeTrader()
+    d = make(trader, keep_finished=0.0, max_early=5)
+    try:
+        reqs = [d.submit_order(f"{i:06d}.SZ", 23, 100, 11, 10.0) for i in range(10)]
+        assert d.wait(5, reqs)
+        for seq in range(10000, 10020):
+            d.on_order_stock_async_response(SimpleNamespace(seq=seq, order_id=seq))
+        assert len(d._early) == 5
+        deadline = time.monotonic() + 5
+        while (d.requests or d._by_seq or d._orders or d._early) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        d.stop()
+    assert d.requests == [] and d._by_seq == {} and d._orders == {} and d._early == {}
@@ -0,0 +1,69 @@
+"""
+盘前参考数据：按日期缓存，太早生成的视为过期，可强制重新生成
+
+python -m pytest tests/test_ref_data.py
+"""
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from qmt_quote.ref_data import RefData, details_to_ref
+
+CODES = ["600000.SH", "000001.SZ"]
+
+
+def make_ref(path, pre_close: float) -> RefData:
+    """build不查询QMT，记下调用次数"""
+    ref = RefData(path)
+    ref.n_builds = 0
+
+    def build(stock_list, date=None):
+        ref.n_builds += 1
+        details = pd.DataFrame({'InstrumentName': ["浦发银行", "平安银行"], 'PreClose': pre_close,
+                                'UpStopPrice': pre_close * 1.1, 'DownStopPrice': pre_close * 0.9}, index=stock_list)
+        return ref.save(details_to_ref(details), date)
+
+    ref.build = build
+    return ref
+
+
+def set_built_at(ref: RefData, date: str, t: datetime) -> None:
+    os.utime(ref._file(date), (t.timestamp(), t.timestamp()))
+
+
+def test_load_cached(tmp_path):
+    make_ref(tmp_path, 10.0).get_or_build(CODES)
+    ref = make_ref(tmp_path, 11.0)
+    ref.get_or_build(lambda: CODES)
+    assert ref.n_builds == 0
+    assert (ref.arr['PreClose'] == 10.0).all()
+
+
+def test_stale_and_force(tmp_path):
+    today = datetime.now().strftime("%Y%m%d")
+    now = datetime.now()
+    make_ref(tmp_path, 10.0).get_or_build(CODES)
+    # 现在之前一分钟为分界，文件在分界之前生成，过期
+    set_built_at(RefData(tmp_path), today, now - timedelta(minutes=2))
+    after = (now - timedelta(minutes=1)).strftime("%H%M")
+    if now.hour == 0 and now.minute < 2:
+        # 刚过零点，分界在昨天，跳过
+        return
+    ref = make_ref(tmp_path, 11.0)
+    assert ref.is_stale(today, after) and not ref.is_stale(today)
+    ref.get_or_build(CODES, after=after)
+    assert ref.n_builds == 1 and (ref.arr['PreClose'] == 11.0).all()
+    # 重新生成后不再过期
+    assert not ref.is_stale(today, after)
+
+    ref = make_ref(tmp_path, 12.0)
+    ref.get_or_build(CODES, force=True)
+    assert ref.n_builds == 1 and (ref.arr['PreClose'] == 12.0).all()
+
+
+def test_not_stale_before_threshold(tmp_path):
+    """还没到分界时刻，早上生成的照常加载"""
+    ref = make_ref(tmp_path, 10.0).get_or_build(CODES, date="20991231")
+    assert not ref.is_stale("20991231", "0900")
+    assert ref.is_stale("20991230", "0900")
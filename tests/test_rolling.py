@@ -0,0 +1,66 @@
+"""
+盘前滚动：丢弃最早的整天数据后，行号索引与K线文件一致。不启用列式副本时也要同步
+
+python -m pytest tests/test_rolling.py
+"""
+import numpy as np
+from npyt import NPYT
+
+from qmt_quote.bars.tick_array import MultiBarManager
+from qmt_quote.dtypes import DTYPE_STOCK_1m, DTYPE_STOCK_1t
+from qmt_quote.rolling import sync_rolled
+from qmt_quote.row_index import RowIndex
+
+N_SYMBOLS = 20
+TZ = 3600 * 8
+
+
+def make_ticks(day: int, rng, n: int = 4000) -> np.ndarray:
+    ticks = np.zeros(n, dtype=DTYPE_STOCK_1t)
+    # 东八区9:30开始的1小时
+    t0 = (1_700_000_000_000 // 86400000 + day) * 86400000 + int(1.5 * 3600000)
+    ticks['time'] = np.sort(rng.integers(0, 3600_000, n)) + t0
+    ticks['stock_code'] = np.array([f"{i:06d}.SH" for i in rng.integers(0, N_SYMBOLS, n)])
+    for f in ['lastPrice', 'open', 'high', 'low', 'lastClose']:
+        ticks[f] = 10 + rng.random(n)
+    ticks['volume'] = np.arange(n)
+    ticks['amount'] = np.arange(n)
+    return ticks
+
+
+def check_index(i: RowIndex, d: NPYT, bm: MultiBarManager) -> None:
+    arr = d.data()
+    tidx = i._time[:int(i._meta[0])]
+    assert len(tidx) > 0 and tidx[0]['first'] == 0 and tidx[-1]['last'] == len(arr)
+    for t, first, last in tidx.tolist():
+        assert (arr['time'][first:last] // 60000 * 60000 == t).all()
+    # 每只股票最后一根
+    ids = bm.symbols.encode(arr['stock_code'], dtype=np.int64)
+    expected = np.full(N_SYMBOLS, -1, dtype=np.int64)
+    np.maximum.at(expected, ids, np.arange(len(arr)))
+    assert np.array_equal(i.latest()[:N_SYMBOLS], expected)
+
+
+def test_maintain_without_columns(tmp_path):
+    rng = np.random.default_rng(0)
+    # 一天 20只 * 60根1分钟，文件放得下两天多一点
+    per_day = [N_SYMBOLS, N_SYMBOLS * 13, N_SYMBOLS * 61]
+    datas = [NPYT(tmp_path / f"{name}.npy", dtype=DTYPE_STOCK_1m).save(capacity=n * 2 + n // 2).load(mmap_mode="r+")
+             for name, n in zip(["d1d", "d5m", "d1m"], per_day)]
+    indexes = [RowIndex(tmp_path / f"i{name}").save(1024, 64).load(mmap_mode="r+") for name in ["1d", "5m", "1m"]]
+    bm = MultiBarManager([d._a for d in datas], [d._t for d in datas], [86400, 300, 60])
+    total = [0, 0, 0]
+    for day in range(4):
+        rolled = bm.maintain(per_day, TZ)
+        # 同subscribe_minute，COLUMNAR=False时columns为空
+        sync_rolled(rolled, datas, indexes, [])
+        total = [a + b for a, b in zip(total, rolled)]
+        ticks = make_ticks(day, rng)
+        for s in range(0, len(ticks), 500):
+            out = bm.extend(ticks[s:s + 500], TZ)
+            for j, (i, d, (last_index, index, _)) in enumerate(zip(indexes, datas, out)):
+                i.update_time(d._a, last_index, index)
+                i.update_latest(bm.state.valid[j], bm.state.index[j])
+    assert all(total)
+    for i, d in zip(indexes, datas):
+        check_index(i, d, bm)
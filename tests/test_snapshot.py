@@ -0,0 +1,47 @@
+"""
+最新快照：开盘前由历史日线补上，涨跌停价由盘前参考数据写入
+
+python -m pytest tests/test_snapshot.py
+"""
+import numpy as np
+import pandas as pd
+
+from qmt_quote.dtypes import DTYPE_STOCK_1m
+from qmt_quote.ref_data import RefData, details_to_ref
+from qmt_quote.snapshot import Snapshot
+
+CODES = ["000001.SZ", "600000.SH", "688001.SH"]
+
+
+def history_bars() -> np.ndarray:
+    """同load_history_data，历史日线的close_dt为0"""
+    arr = np.zeros(6, dtype=DTYPE_STOCK_1m)
+    arr['stock_code'] = CODES * 2
+    arr['time'] = np.repeat([1_700_000_000_000, 1_700_086_400_000], 3)
+    arr['close'] = np.arange(6) + 10
+    arr['preClose'] = np.arange(6) + 9
+    return arr
+
+
+def test_update_bars_before_open(tmp_path):
+    snapshot = Snapshot(tmp_path).save(capacity=16).load(mmap_mode="r+")
+    arr = history_bars()
+    snapshot.update_bars(arr, np.array([0, 1, 2, 0, 1, 2]))
+    data = snapshot.data()
+    # 没有close_dt时用K线时间，开盘前也能取到
+    assert data['stock_code'].tolist() == CODES
+    assert (data['time'] == 1_700_086_400_000).all()
+    assert data['lastPrice'].tolist() == [13, 14, 15]
+    assert data['lastClose'].tolist() == [12, 13, 14]
+
+
+def test_update_limits(tmp_path):
+    snapshot = Snapshot(tmp_path / "snapshot").save(capacity=16).load(mmap_mode="r+")
+    snapshot.update_bars(history_bars(), np.array([0, 1, 2, 0, 1, 2]))
+    details = pd.DataFrame({'InstrumentName': ["平安银行", "浦发银行"], 'PreClose': [10.0, 8.0],
+                            'UpStopPrice': [11.0, 8.8], 'DownStopPrice': [9.0, 7.2]}, index=CODES[:2])
+    ref = RefData(tmp_path / "ref").save(details_to_ref(details), "20231115")
+    snapshot.update_limits(ref)
+    data = snapshot.data()
+    assert data['UpStopPrice'].tolist() == [11.0, 8.8, 99999.0]
+    assert data['DownStopPrice'].tolist() == [9.0, 7.2, 0.0]
@@ -0,0 +1,66 @@
+"""
+单周期K线引擎：文件放不下时在改动状态前报错，状态与位置都不变
+
+python -m pytest tests/test_tick_array.py
+"""
+import numpy as np
+import pytest
+
+from qmt_quote.bars.labels import get_label_stock_1m
+from qmt_quote.bars.tick_array import MinuteBarManager, DayBarManager
+from qmt_quote.dtypes import DTYPE_STOCK_1m, DTYPE_STOCK_1t
+
+TZ = 3600 * 8
+
+
+def make_ticks(n: int, n_symbols: int, day: int = 0) -> np.ndarray:
+    ticks = np.zeros(n, dtype=DTYPE_STOCK_1t)
+    # 东八区9:30开始，每秒一条
+    t0 = (1_700_000_000_000 // 86400000 + day) * 86400000 + int(1.5 * 3600000)
+    ticks['time'] = t0 + np.arange(n) * 1000
+    ticks['stock_code'] = np.array([f"{i:06d}.SH" for i in np.arange(n) % n_symbols])
+    for f in ['lastPrice', 'open', 'high', 'low', 'lastClose']:
+        ticks[f] = 10.0
+    ticks['volume'] = np.arange(n)
+    ticks['amount'] = np.arange(n)
+    return ticks
+
+
+def _snapshot(bm):
+    return bm.index, int(bm.arr2[1]), bm.state.time.copy(), bm.arr1.copy()
+
+
+def _assert_unchanged(bm, before):
+    index, end, time, arr1 = before
+    assert bm.index == index and int(bm.arr2[1]) == end
+    assert np.array_equal(bm.state.time, time) and np.array_equal(bm.arr1, arr1)
+
+
+def test_minute_full():
+    arr1, arr2 = np.zeros(30, dtype=DTYPE_STOCK_1m), np.zeros(3, dtype=np.uint64)
+    bm = MinuteBarManager(arr1, arr2, n_symbols=10)
+    # 10只，第1分钟
+    bm.extend(make_ticks(60, 10), get_label_stock_1m, TZ)
+    assert bm.index == 10
+    before = _snapshot(bm)
+    # 第2~4分钟要新建30根，只剩20行
+    ticks = make_ticks(240, 10)[60:]
+    with pytest.raises(IndexError):
+        bm.extend(ticks, get_label_stock_1m, TZ)
+    _assert_unchanged(bm, before)
+    # 放得下的部分照常处理
+    bm.extend(ticks[:120], get_label_stock_1m, TZ)
+    assert bm.index == 30
+
+
+def test_day_full():
+    arr1, arr2 = np.zeros(15, dtype=DTYPE_STOCK_1m), np.zeros(3, dtype=np.uint64)
+    bm = DayBarManager(arr1, arr2, n_symbols=10)
+    bm.extend(make_ticks(100, 10), TZ)
+    # tick多于剩余行数，但同一天不新建K线
+    bm.extend(make_ticks(100, 10), TZ)
+    assert bm.index == 10
+    before = _snapshot(bm)
+    with pytest.raises(IndexError):
+        bm.extend(make_ticks(100, 10, day=1), TZ)
+    _assert_unchanged(bm, before)
@@ -0,0 +1,214 @@
+"""
+本地交易状态：冻结、释放、去重，以及对账时的推送重放
+
+python -m pytest tests/test_trade_book.py
+"""
+import threading
+
+from qmt_quote.enums import OrderStatus
+from qmt_quote.trade_book import TradeBook, STOCK_BUY, STOCK_SELL
+from qmt_quote.xt_records import FakeXtOrder, FakeXtTrade, FakeXtPosition, FakeXtAsset
+
+CODE = "600000.SH"
+
+
+class FakeTrader:
+    """柜台。hooks[(方法名, 第几次调用)]在返回查询结果前调用，用于模拟查询期间到达的推送"""
+
+    def __init__(self):
+        self.orders = []
+        self.trades = []
+        self.positions = [FakeXtPosition(stock_code=CODE, volume=1000, can_use_volume=1000)]
+        self.asset = FakeXtAsset(cash=100000.0)
+        self.calls = {}
+        self.hooks = {}
+
+    def _call(self, name, result):
+        n = self.calls[name] = self.calls.get(name, 0) + 1
+        hook = self.hooks.get((name, n))
+        if hook is not None:
+            hook()
+        return list(result) if isinstance(result, list) else result
+
+    def query_stock_orders(self, account):
+        return self._call("query_stock_orders", self.orders)
+
+    def query_stock_trades(self, account):
+        return self._call("query_stock_trades", self.trades)
+
+    def query_stock_positions(self, account):
+        return self._call("query_stock_positions", self.positions)
+
+    def query_stock_asset(self, account):
+        return self._call("query_stock_asset", self.asset)
+
+
+def sell_order(status: int, traded_volume: int = 0, order_id: int = 1, volume: int = 300) -> FakeXtOrder:
+    return FakeXtOrder(stock_code=CODE, order_id=order_id, order_type=STOCK_SELL, order_volume=volume,
+                       price=10.0, traded_volume=traded_volume, order_status=status)
+
+
+def trade(traded_id: str, volume: int, order_type: int = STOCK_SELL, order_id: int = 1) -> FakeXtTrade:
+    return FakeXtTrade(stock_code=CODE, order_id=order_id, order_type=order_type, traded_id=traded_id,
+                       traded_volume=volume, traded_price=10.0, traded_amount=volume * 10.0)
+
+
+def new_book() -> TradeBook:
+    return TradeBook().reconcile(FakeTrader(), None)
+
+
+def test_freeze_release():
+    book = new_book()
+    book.on_stock_order(sell_order(OrderStatus.Reported))
+    assert book.get_position(CODE)['can_use_volume'] == 700
+    # 同一委托再次推送，不重复冻结
+    book.on_stock_order(sell_order(OrderStatus.Reported))
+    assert book.get_position(CODE)['can_use_volume'] == 700
+
+    book.on_stock_trade(trade("t1", 100))
+    book.on_stock_order(sell_order(OrderStatus.PartSucc, 100))
+    p = book.get_position(CODE)
+    assert (p['volume'], p['can_use_volume']) == (900, 700)
+    assert book.asset['cash'] == 101000.0
+
+    # 撤单，释放未成交的200
+    book.on_stock_order(sell_order(OrderStatus.PartCancel, 100))
+    assert book.get_position(CODE)['can_use_volume'] == 900
+    # 结束后再推送，不重复释放
+    book.on_stock_order(sell_order(OrderStatus.PartCancel, 100))
+    assert book.get_position(CODE)['can_use_volume'] == 900
+
+
+def test_finished_at_first_sight():
+    # 第一次看到就已结束(如废单)，不冻结
+    book = new_book()
+    book.on_stock_order(sell_order(OrderStatus.Junk))
+    assert book.get_position(CODE)['can_use_volume'] == 1000
+
+
+def test_stale_order_push():
+    book = new_book()
+    book.on_stock_order(sell_order(OrderStatus.Reported))
+    book.on_stock_order(sell_order(OrderStatus.Canceled))
+    # 乱序到达的旧推送不能把已撤的委托改回去，也不能再冻结
+    book.on_stock_order(sell_order(OrderStatus.Reported))
+    assert book.orders[1]['order_status'] == OrderStatus.Canceled
+    assert book.get_position(CODE)['can_use_volume'] == 1000
+
+    book.on_stock_order(sell_order(OrderStatus.PartSucc, 200, order_id=2))
+    book.on_stock_order(sell_order(OrderStatus.PartSucc, 100, order_id=2))
+    assert book.orders[2]['traded_volume'] == 200
+
+
+def test_trade_dedup():
+    book = new_book()
+    book.on_stock_trade(trade("t1", 100, STOCK_BUY))
+    book.on_stock_trade(trade("t1", 100, STOCK_BUY))
+    p = book.get_position(CODE)
+    assert (p['volume'], p['can_use_volume']) == (1100, 1000)
+    assert book.asset['cash'] == 99000.0
+    assert len(book.trades_dataframe()) == 1
+
+
+def test_reconcile_replays_push_after_queries():
+    # 最后一次查询成交之后才成交，查询结果中没有，推送在对账期间到达，覆盖后要重放
+    trader = FakeTrader()
+    book = TradeBook()
+    trader.hooks[("query_stock_trades", 2)] = lambda: book.on_stock_trade(trade("t1", 100, STOCK_BUY))
+    book.reconcile(trader, None)
+    assert book.get_position(CODE)['volume'] == 1100
+    assert "t1" in book.trades
+    assert book.asset['cash'] == 99000.0
+
+
+def test_reconcile_trade_between_queries():
+    # 查完成交、还没查持仓时成交了：持仓已含这笔成交，第一次的成交查询中却没有。
+    # 两次查询不同，重试后成交与持仓一致，推送重放时去重，不重复计算
+    trader = FakeTrader()
+    book = TradeBook()
+
+    def fill():
+        trader.trades.append(trade("t1", 100, STOCK_BUY))
+        trader.positions = [FakeXtPosition(stock_code=CODE, volume=1100, can_use_volume=1000)]
+        trader.asset = FakeXtAsset(cash=99000.0)
+        book.on_stock_trade(trade("t1", 100, STOCK_BUY))
+
+    trader.hooks[("query_stock_positions", 1)] = fill
+    book.reconcile(trader, None)
+    assert trader.calls["query_stock_positions"] == 2
+    p = book.get_position(CODE)
+    assert (p['volume'], p['can_use_volume']) == (1100, 1000)
+    assert book.asset['cash'] == 99000.0
+
+
+def test_reconcile_replays_sell_order():
+    # 查询之后才下的卖单，重放时冻结；查询结果中已有的卖单不重复冻结
+    trader = FakeTrader()
+    trader.orders = [sell_order(OrderStatus.Reported, order_id=1, volume=100)]
+    trader.positions = [FakeXtPosition(stock_code=CODE, volume=1000, can_use_volume=900)]
+    book = TradeBook()
+
+    def push():
+        book.on_stock_order(sell_order(OrderStatus.Reported, order_id=1, volume=100))
+        book.on_stock_order(sell_order(OrderStatus.Reported, order_id=2, volume=200))
+
+    trader.hooks[("query_stock_orders", 2)] = push
+    book.reconcile(trader, None)
+    assert book.get_position(CODE)['can_use_volume'] == 700
+
+
+def test_reconcile_does_not_block_readers():
+    trader = FakeTrader()
+    book = TradeBook()
+    done = []
+
+    def read():
+        # 在另一个线程中读取，查询期间不持锁才能读到
+        t = threading.Thread(target=lambda: done.append(book.get_position(CODE)))
+        t.start()
+        t.join(5)
+
+    trader.hooks[("query_stock_positions", 1)] = read
+    book.reconcile(trader, None)
+    assert len(done) == 1
+
+
+def buy_order(status: int, traded_volume: int = 0, order_id: int = 3, volume: int = 100) -> FakeXtOrder:
+    return FakeXtOrder(stock_code=CODE, order_id=order_id, order_type=STOCK_BUY, order_volume=volume,
+                       price=10.0, traded_volume=traded_volume, order_status=status)
+
+
+def test_buy_freeze_cash():
+    book = new_book()
+    book.on_stock_order(buy_order(OrderStatus.Reported))
+    assert book.asset['cash'] == 99000.0 and book.asset['frozen_cash'] == 1000.0
+    # 成交从冻结资金中扣，可用资金不变
+    book.on_stock_trade(trade("t1", 100, STOCK_BUY, order_id=3))
+    book.on_stock_order(buy_order(OrderStatus.Succeeded, 100))
+    assert book.asset['cash'] == 99000.0 and book.asset['frozen_cash'] == 0.0
+    assert book.frozen == {}
+
+
+def test_reconcile_then_fill():
+    # 对账时柜台的可用资金已扣除未成交买单的冻结，之后的成交不能再扣一次
+    trader = FakeTrader()
+    trader.orders = [buy_order(OrderStatus.Reported)]
+    trader.asset = FakeXtAsset(cash=99000.0, frozen_cash=1000.0)
+    book = TradeBook().reconcile(trader, None)
+    assert book.frozen == {3: 1000.0}
+
+    # 成交价低于委托价，结束时退回差价
+    book.on_stock_trade(FakeXtTrade(stock_code=CODE, order_id=3, order_type=STOCK_BUY, traded_id="t1",
+                                    traded_volume=100, traded_price=9.9, traded_amount=990.0))
+    assert book.asset['cash'] == 99000.0 and book.asset['frozen_cash'] == 10.0
+    book.on_stock_order(buy_order(OrderStatus.Succeeded, 100))
+    assert book.asset['cash'] == 99010.0 and book.asset['frozen_cash'] == 0.0
+    assert book.get_position(CODE)['volume'] == 1100
+
+
+def test_buy_cancel_releases_cash():
+    book = new_book()
+    book.on_stock_order(buy_order(OrderStatus.Reported))
+    book.on_stock_trade(trade("t1", 40, STOCK_BUY, order_id=3))
+    book.on_stock_order(buy_order(OrderStatus.PartCancel, 40))
+    assert book.asset['cash'] == 99600.0 and book.asset['frozen_cash'] == 0.0
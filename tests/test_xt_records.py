@@ -0,0 +1,75 @@
+"""
+xtquant对象转记录，与原来逐个dir()的结果一致
+
+python -m pytest tests/test_xt_records.py
+"""
+from types import SimpleNamespace
+
+import pandas as pd
+import polars as pl
+
+from qmt_quote.xt_records import (FakeXtOrder, FakeXtTrade, FakeXtPosition, FakeXtAsset,
+                                  to_dict, objs_to_columns, objs_to_dataframe, objs_to_polars)
+
+
+def old_to_dict(obj):
+    """原utils_trade.to_dict。Fake对象多了类属性_FIELDS，真实的xtquant对象没有，这里去掉"""
+    return {attr: getattr(obj, attr) for attr in dir(obj) if not attr.startswith(("__", "m_")) and attr != '_FIELDS'}
+
+
+def old_objs_to_dataframe(objs):
+    """原utils_trade.objs_to_dataframe"""
+    return pd.DataFrame.from_records([old_to_dict(o) for o in objs])
+
+
+def make_orders(n: int = 100):
+    return [FakeXtOrder(account_id="1000", stock_code=f"{600000 + i:06d}.SH", order_id=i + 1, order_type=23 + i % 2,
+                        order_volume=100 * (i + 1), price=10.0 + i / 100, order_status=48 + i % 10,
+                        order_remark=f"r{i}") for i in range(n)]
+
+
+def test_to_dict():
+    for obj in [make_orders(1)[0], FakeXtTrade(traded_id="t1", traded_volume=100), FakeXtPosition(volume=200),
+                FakeXtAsset(cash=1.5)]:
+        assert to_dict(obj) == old_to_dict(obj)
+        # 类属性_FIELDS不是字段
+        assert '_FIELDS' not in to_dict(obj)
+
+
+def test_objs_to_dataframe():
+    orders = make_orders()
+    expected = old_objs_to_dataframe(orders)
+    got = objs_to_dataframe(orders)
+    # 字段顺序相同，都是dir()的顺序
+    pd.testing.assert_frame_equal(got, expected)
+    assert objs_to_polars(orders).equals(pl.from_pandas(expected))
+
+
+def test_empty():
+    assert objs_to_columns([]) == {}
+    assert objs_to_dataframe([]).empty
+    assert objs_to_polars([]).is_empty()
+
+
+def test_different_fields():
+    # 同一类型字段不同时，逐个转换，缺少的字段为空
+    objs = [SimpleNamespace(a=1, b=2), SimpleNamespace(a=3)]
+    assert to_dict(objs[1]) == {'a': 3}
+    assert to_dict(objs[0]) == {'a': 1, 'b': 2}
+    # 前面的对象字段较少时，后面的字段也不能丢
+    df = objs_to_dataframe(objs[::-1])
+    assert df['a'].tolist() == [3, 1]
+    assert df['b'].tolist()[1] == 2
+    df = objs_to_dataframe(objs)
+    assert list(df.columns) == ['a', 'b']
+    assert df['a'].tolist() == [1, 3]
+    assert df['b'].isna().tolist() == [False, True]
+
+
+def test_unknown_field():
+    try:
+        FakeXtOrder(foo=1)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("unknown field should raise TypeError")